@@ -0,0 +1,640 @@
+""" Headless benchmark of the whole multicast pipeline: GraphBuilder, MemberStateBuilder, StreamerStateBuilder and
+  MulticastTrafficManager, without Mininet and without a running POX.
+
+  The POX core, the openflow and discovery components and the recoco timers are replaced by local stand-ins, the rest of
+  pox.lib (revent, addresses, libopenflow_01) is the real one, so POX has to be on the python path:
+      PYTHONPATH=~/pox python benchmark_harness.py --topology fat-tree --size 8 --groups 1000 --members 20
+
+  The stand-in switches answer every barrier at once, and every injected event is handled to the end, with the deferred
+  calls (core.callLater) of the components, before the next one is injected. The stand-in timers run on the wall clock, they
+  are fired between the events when they are due, and the pending one-shot timers (like the settle window of the link events)
+  are fired at the end of every phase. The workload phases are:
+    links   - a LinkEvent for both directions of every switch link
+    joins   - IGMPv2 and IGMPv3 membership reports on the host ports
+    streams - the first PacketIn of every stream on the ingress switch of its source
+    churn   - refreshes, leaves and new joins
+    repair  - link failures and recoveries
+  For every phase the events/sec, the per event latency percentiles and the emitted flow mods are reported, and the peak
+  memory of the process at the end. With --sweep one parameter is scaled, every value in its own process:
+      python benchmark_harness.py --topology waxman --sweep groups=100,1000,10000
+
+  Topologies: fat-tree (size: k), waxman (size: switches), ring (size: switches), and customupg and loop_topo, the two
+  Mininet topologies of the repository.
+  """
+import argparse
+import json
+import math
+import random
+import resource
+import struct
+import subprocess
+import sys
+import time
+import types
+from collections import deque
+
+""" OpenFlow 1.0 message types which are counted """
+OFPT_PACKET_OUT = 13
+OFPT_FLOW_MOD = 14
+OFPT_BARRIER_REQUEST = 18
+
+IGMP_REPORTS = "224.0.0.22"
+
+""" The pipeline options which are keyword arguments of the components """
+MEMBER_OPTIONS = ("membership_interval","query_interval","query_response_time")
+STREAMER_OPTIONS = ("temporary_timeout","rate_limit")
+MANAGER_OPTIONS = ("stream_idle_timeout","barrier_timeout","aggregate_min_prefix")
+
+
+class Topology(object):
+    """ links: [(dpid1,port1,dpid2,port2)], host_ports: {dpid:[ports]} """
+    def __init__(self, name, links, host_ports):
+        self.name = name
+        self.links = links
+        self.host_ports = host_ports
+        self.switches = sorted(host_ports.keys())
+
+    def all_host_ports(self):
+        return [(dpid,port) for dpid in self.switches for port in self.host_ports[dpid]]
+
+
+class _TopologyBuilder(object):
+    """ Numbers the switch ports in the order of the links, like Mininet """
+    def __init__(self):
+        self.next_port = {}
+        self.links = []
+        self.host_ports = {}
+
+    def add_switch(self, dpid):
+        self.next_port.setdefault(dpid, 1)
+        self.host_ports.setdefault(dpid, [])
+
+    def _port(self, dpid):
+        self.add_switch(dpid)
+        port = self.next_port[dpid]
+        self.next_port[dpid] += 1
+        return port
+
+    def add_link(self, dpid1, dpid2):
+        self.links.append((dpid1,self._port(dpid1),dpid2,self._port(dpid2)))
+
+    def add_host(self, dpid):
+        port = self._port(dpid)
+        self.host_ports[dpid].append(port)
+
+    def build(self, name):
+        return Topology(name, self.links, self.host_ports)
+
+def ring_topology(switches, hosts_per_switch=2):
+    builder = _TopologyBuilder()
+    for dpid in xrange(1, switches + 1):
+        builder.add_switch(dpid)
+    for dpid in xrange(1, switches + 1):
+        builder.add_link(dpid, dpid % switches + 1)
+    for dpid in xrange(1, switches + 1):
+        for host in xrange(hosts_per_switch):
+            builder.add_host(dpid)
+    return builder.build("ring")
+
+def fat_tree_topology(k=4):
+    """ k pods of k/2 aggregation and k/2 edge switches, (k/2)^2 core switches, k/2 hosts on every edge switch """
+    half = k / 2
+    core_switches = range(1, half * half + 1)
+    builder = _TopologyBuilder()
+    next_dpid = len(core_switches) + 1
+    for pod in xrange(k):
+        aggregation = range(next_dpid, next_dpid + half)
+        edge = range(next_dpid + half, next_dpid + k)
+        next_dpid += k
+        for index,aggregation_switch in enumerate(aggregation):
+            for core_switch in core_switches[index * half:(index + 1) * half]:
+                builder.add_link(core_switch, aggregation_switch)
+            for edge_switch in edge:
+                builder.add_link(aggregation_switch, edge_switch)
+        for edge_switch in edge:
+            for host in xrange(half):
+                builder.add_host(edge_switch)
+    return builder.build("fat-tree")
+
+def waxman_topology(switches, alpha=0.4, beta=0.2, hosts_per_switch=2, seed=1):
+    """ Waxman random graph on the unit square, made connected by linking every switch to its nearest earlier switch """
+    rand = random.Random(seed)
+    points = dict((dpid,(rand.random(),rand.random())) for dpid in xrange(1, switches + 1))
+    def distance(a, b):
+        return math.hypot(points[a][0] - points[b][0], points[a][1] - points[b][1])
+
+    builder = _TopologyBuilder()
+    linked = set()
+    for dpid in xrange(1, switches + 1):
+        builder.add_switch(dpid)
+        if dpid > 1:
+            nearest = min(xrange(1, dpid), key=lambda other: distance(dpid, other))
+            builder.add_link(nearest, dpid)
+            linked.add((nearest,dpid))
+    max_distance = math.sqrt(2)
+    for a in xrange(1, switches + 1):
+        for b in xrange(a + 1, switches + 1):
+            if (a,b) not in linked and rand.random() < beta * math.exp(-distance(a, b) / (alpha * max_distance)):
+                builder.add_link(a, b)
+    for dpid in xrange(1, switches + 1):
+        for host in xrange(hosts_per_switch):
+            builder.add_host(dpid)
+    return builder.build("waxman")
+
+def _mininet_topology(name, links):
+    """ links: the addLink calls of the Mininet topology, hosts are the strings """
+    builder = _TopologyBuilder()
+    for node1,node2 in links:
+        if isinstance(node2, str):
+            builder.add_host(node1)
+        else:
+            builder.add_link(node1, node2)
+    return builder.build(name)
+
+CUSTOMUPG_LINKS = [(9,"h1"), (9,"h2"), (9,10), (9,12), (10,"h3"), (10,11), (11,"h4"), (11,"h5"), (12,"h6"), (12,13),
+                   (13,"h7"), (13,"h8")]
+LOOP_TOPO_LINKS = CUSTOMUPG_LINKS + [(11,13)]
+
+def make_topology(name, size):
+    if name == "ring":
+        return ring_topology(size)
+    if name == "fat-tree":
+        return fat_tree_topology(size)
+    if name == "waxman":
+        return waxman_topology(size)
+    if name == "customupg":
+        return _mininet_topology(name, CUSTOMUPG_LINKS)
+    if name == "loop_topo":
+        return _mininet_topology(name, LOOP_TOPO_LINKS)
+    raise ValueError("Unknown topology: " + name)
+
+
+class _Record(object):
+    """ Stand-in for the events, links and parsed packets, with the attributes the components use """
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class StandInTimer(object):
+    """ The timers are fired by Harness.fire_timers, between the injected events. A recurring timer stops when its callback
+     returns False, like the recoco one. """
+    timers = []
+
+    def __init__(self, timeToWake, callback, absoluteTime=False, recurring=False, args=(), kw={}, scheduler=None, started=True, selfStoppable=True):
+        self.interval = timeToWake
+        self.deadline = timeToWake if absoluteTime else time.time() + timeToWake
+        self.callback = callback
+        self.args = args
+        self.kw = kw
+        self.recurring = recurring
+        self.self_stoppable = selfStoppable
+        self.cancelled = False
+        StandInTimer.timers.append(self)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def fire(self):
+        result = self.callback(*self.args, **self.kw)
+        if self.recurring and not (self.self_stoppable and result is False):
+            self.deadline = time.time() + self.interval
+        else:
+            self.cancelled = True
+
+
+class StandInConnection(object):
+    def __init__(self, harness, dpid):
+        self.harness = harness
+        self.dpid = dpid
+
+    def send(self, data):
+        flow_mod_sink = self.harness.flow_mod_sink
+        if isinstance(data, bytes):
+            offset = 0
+            while offset + 8 <= len(data):
+                version,message_type,length,xid = struct.unpack_from("!BBHL", data, offset)
+                self.harness.count_message(self, message_type, xid)
+                if flow_mod_sink is not None and message_type == OFPT_FLOW_MOD:
+                    flow_mod_sink(self.dpid, data[offset:offset + length])
+                offset += length
+        else:
+            self.harness.count_message(self, data.header_type, data.xid)
+            if flow_mod_sink is not None and data.header_type == OFPT_FLOW_MOD:
+                flow_mod_sink(self.dpid, data.pack())
+
+
+class StandInOpenFlow(object):
+    """ Dispatches the openflow (and discovery) events by handler name, in the order of the listener priorities """
+    EVENTS = ["ConnectionUp","ConnectionDown","PacketIn","BarrierIn","FlowRemoved","FlowStatsReceived","PortStatsReceived","LinkEvent"]
+
+    def __init__(self):
+        self.handlers = dict((name,[]) for name in self.EVENTS)
+        self.connections = {}
+
+    def addListeners(self, sink, priority=0, **kw):
+        for name in self.EVENTS:
+            handler = getattr(sink, "_handle_" + name, None)
+            if handler is not None:
+                self.handlers[name].append((priority,len(self.handlers[name]),handler))
+                self.handlers[name].sort(key=lambda item: (-item[0],item[1]))
+
+    def raiseEvent(self, name, event):
+        from pox.lib.revent import EventHalt
+        for priority,order,handler in self.handlers[name]:
+            if handler(event) is EventHalt:
+                break
+
+    def getConnection(self, dpid):
+        return self.connections.get(dpid)
+
+    def sendToDPID(self, dpid, msg):
+        connection = self.connections.get(dpid)
+        if connection is None:
+            return False
+        connection.send(msg)
+        return True
+
+    def __iter__(self):
+        return iter(self.connections.values())
+
+
+class StandInCore(object):
+    def __init__(self):
+        import logging
+        self.logging = logging
+        self.components = {}
+        self.dependencies = []
+        self.later = deque()
+        self.openflow = StandInOpenFlow()
+        self.openflow_discovery = self.openflow
+
+    def getLogger(self, name=None):
+        return self.logging.getLogger(name or "harness")
+
+    def addListeners(self, sink, *args, **kw):
+        pass
+
+    def register(self, name, component):
+        self.components[name] = component
+        setattr(self, name, component)
+        for dependency in list(self.dependencies):
+            self._bind(dependency)
+
+    def hasComponent(self, name):
+        return name in self.components
+
+    def listen_to_dependencies(self, sink, components=None, *args, **kw):
+        dependency = [sink,list(components or []),False]
+        self.dependencies.append(dependency)
+        self._bind(dependency)
+
+    def _bind(self, dependency):
+        """ Like the POX core, only the components which raise events get the handlers of the sink """
+        sink,names,bound = dependency
+        if bound or not all(name in self.components for name in names):
+            return
+        for name in names:
+            component = self.components[name]
+            if not hasattr(component, '_eventMixin_events'):
+                continue
+            for event_type in component._eventMixin_events:
+                handler = getattr(sink, "_handle_%s_%s" % (name,event_type.__name__), None)
+                if handler is not None:
+                    component.addListener(event_type, handler)
+        dependency[2] = True
+        self.dependencies.remove(dependency)
+        if hasattr(sink, "_all_dependencies_met"):
+            sink._all_dependencies_met()
+
+    def callLater(self, function, *args, **kw):
+        self.later.append((function,args,kw))
+
+    def run_later(self):
+        while len(self.later) != 0:
+            function,args,kw = self.later.popleft()
+            function(*args, **kw)
+
+def install_stand_ins():
+    """ Puts the stand-in core into sys.modules as pox.core and the stand-in timer into pox.lib.recoco, before the components
+     are imported. When the stand-ins are installed already, the stand-in core is reset instead of replaced, because the
+     imported components keep their reference to it. """
+    import pox
+    import pox.lib.recoco
+    core_module = sys.modules.get("pox.core")
+    if core_module is not None and isinstance(getattr(core_module, "core", None), StandInCore):
+        core_module.core.__dict__.clear()
+        core_module.core.__init__()
+    else:
+        core_module = types.ModuleType("pox.core")
+        core_module.core = StandInCore()
+        sys.modules["pox.core"] = core_module
+    pox.core = core_module
+    pox.lib.recoco.Timer = StandInTimer
+    del StandInTimer.timers[:]
+    return core_module.core
+
+
+class Harness(object):
+    def __init__(self, topology, options):
+        from pipeline_stats import Histogram
+        self.Histogram = Histogram
+        self.topology = topology
+        self.options = options
+        self.core = install_stand_ins()
+
+        import pox.lib.packet as pkt
+        import pox.openflow.libopenflow_01 as of
+        from pox.lib.addresses import IPAddr
+        self.pkt = pkt
+        self.of = of
+        self.IPAddr = IPAddr
+        self.message_counts = {}
+        self.barrier_replies = deque()
+        self.phase_results = []
+        """ Called with the dpid and the packed message of every flow mod, when set """
+        self.flow_mod_sink = None
+
+        import routing_engines
+        from graph_builder import GraphBuilder
+        from member_state_builder import MemberStateBuilder
+        from streamer_state_builder import StreamerStateBuilder
+        from multicast_traffic_manager import MulticastTrafficManager
+
+        route_computer = None
+        if options.workers > 0:
+            from parallel_routes import ParallelRouteComputer
+            route_computer = ParallelRouteComputer(options.workers, options.parallel_threshold)
+        self.graph_builder = GraphBuilder()
+        self.graph_builder.routing_engine = routing_engines.get_engine(options.engine)
+        if options.settle_window is not None:
+            self.graph_builder.settle_window = options.settle_window
+        self.core.register("GraphBuilder", self.graph_builder)
+        self.member_state_builder = MemberStateBuilder(**self.component_options(MEMBER_OPTIONS))
+        self.core.register("MemberStateBuilder", self.member_state_builder)
+        streamer_options = {"temporary_timeout":0, "rate_limit":1.0}
+        streamer_options.update(self.component_options(STREAMER_OPTIONS))
+        self.streamer_state_builder = StreamerStateBuilder(**streamer_options)
+        self.core.register("StreamerStateBuilder", self.streamer_state_builder)
+        self.multicast_traffic_manager = MulticastTrafficManager(options.route_cache_size, route_computer,
+                                                                 aggregate=not options.no_aggregate,
+                                                                 **self.component_options(MANAGER_OPTIONS))
+        self.core.register("MulticastTrafficManager", self.multicast_traffic_manager)
+        self.core.register("FlowProgrammer", self.multicast_traffic_manager.flow_programmer)
+
+        for dpid in topology.switches:
+            self.core.openflow.connections[dpid] = StandInConnection(self, dpid)
+
+    def component_options(self, names):
+        """ The keyword arguments of the options which are set, the components keep their defaults for the others """
+        return dict((name,getattr(self.options, name)) for name in names if getattr(self.options, name, None) is not None)
+
+    def count_message(self, connection, message_type, xid):
+        self.message_counts[message_type] = self.message_counts.get(message_type, 0) + 1
+        if message_type == OFPT_BARRIER_REQUEST:
+            self.barrier_replies.append(_Record(connection=connection, dpid=connection.dpid, xid=xid))
+
+    def handle(self, name, event):
+        """ Injects one event, and runs the deferred calls and the barrier replies it caused """
+        self.core.openflow.raiseEvent(name, event)
+        self.settle()
+
+    def settle(self):
+        """ Runs the deferred calls and answers the barriers, until none of them is left """
+        while True:
+            self.core.run_later()
+            if len(self.barrier_replies) == 0:
+                break
+            while len(self.barrier_replies) != 0:
+                self.core.openflow.raiseEvent("BarrierIn", self.barrier_replies.popleft())
+
+    def fire_timers(self, drain=False):
+        """ Fires the due timers, with drain every pending one-shot timer too, and settles what they caused """
+        while True:
+            now = time.time()
+            due = [timer for timer in StandInTimer.timers if not timer.cancelled and (timer.deadline <= now or (drain and not timer.recurring))]
+            for timer in due:
+                if not timer.cancelled:
+                    timer.fire()
+                    self.settle()
+            StandInTimer.timers[:] = [timer for timer in StandInTimer.timers if not timer.cancelled]
+            if not drain or len(due) == 0:
+                return
+
+    def wait_until(self, due):
+        """ Sleeps until the due time, and fires the timers which are due meanwhile """
+        while True:
+            self.fire_timers()
+            now = time.time()
+            if now >= due:
+                return
+            wake = min([timer.deadline for timer in StandInTimer.timers] + [due])
+            if wake > now:
+                time.sleep(wake - now)
+
+    def run_phase(self, name, events, offsets=None):
+        """ offsets: the seconds from the phase start when the events are due, by default they are injected back to back """
+        histogram = self.Histogram()
+        flow_mods = self.message_counts.get(OFPT_FLOW_MOD, 0)
+        start = time.time()
+        for index,(event_name,event) in enumerate(events):
+            if offsets is not None:
+                self.wait_until(start + offsets[index])
+            else:
+                self.fire_timers()
+            event_start = time.time()
+            self.handle(event_name, event)
+            histogram.add(time.time() - event_start)
+        self.fire_timers(drain=True)
+        duration = time.time() - start
+        result = {"phase":name, "events":histogram.count, "seconds":duration,
+                  "events_per_sec":histogram.count / duration if duration > 0 else 0.0,
+                  "flow_mods":self.message_counts.get(OFPT_FLOW_MOD, 0) - flow_mods}
+        result.update(histogram.summary())
+        self.phase_results.append(result)
+        return result
+
+    def link_event(self, added, dpid1, port1, dpid2, port2):
+        return ("LinkEvent",_Record(added=added, removed=not added, link=_Record(dpid1=dpid1, port1=port1, dpid2=dpid2, port2=port2)))
+
+    def igmp_event(self, dpid, port, igmp_packet):
+        ip_packet = _Record(protocol=self.pkt.ipv4.IGMP_PROTOCOL, IGMP_PROTOCOL=self.pkt.ipv4.IGMP_PROTOCOL, dstip=self.IPAddr(IGMP_REPORTS),
+                            next=igmp_packet, payload=igmp_packet)
+        packet = _Record(type=self.pkt.ethernet.IP_TYPE, payload=ip_packet, next=ip_packet)
+        return ("PacketIn",_Record(dpid=dpid, port=port, parsed=packet, connection=self.core.openflow.connections[dpid], ofp=None))
+
+    def report_v2(self, dpid, port, address, leave=False):
+        from member_state_builder import MEMBERSHIP_REPORT_V2,LEAVE_GROUP_V2
+        return self.igmp_event(dpid, port, _Record(ver_and_type=LEAVE_GROUP_V2 if leave else MEMBERSHIP_REPORT_V2, address=address))
+
+    def report_v3(self, dpid, port, records):
+        """ records: [(record type,group address,[sources])] """
+        from member_state_builder import MEMBERSHIP_REPORT_V3
+        group_records = [_Record(type=record_type, address=address, src_addr=list(sources)) for record_type,address,sources in records]
+        return self.igmp_event(dpid, port, _Record(ver_and_type=MEMBERSHIP_REPORT_V3, grp_num=len(group_records), grp_rec=group_records))
+
+    def stream_event(self, dpid, port, address, source):
+        ip_packet = _Record(protocol=self.pkt.ipv4.UDP_PROTOCOL, IGMP_PROTOCOL=self.pkt.ipv4.IGMP_PROTOCOL, dstip=address, srcip=source)
+        packet = _Record(type=self.pkt.ethernet.IP_TYPE, payload=ip_packet, next=ip_packet)
+        return ("PacketIn",_Record(dpid=dpid, port=port, parsed=packet, connection=self.core.openflow.connections[dpid], ofp=None))
+
+    def raw_packet_event(self, dpid, port, data):
+        """ PacketIn of a captured packet, parsed by the real pox.lib.packet """
+        return ("PacketIn",_Record(dpid=dpid, port=port, data=data, parsed=self.pkt.ethernet(data),
+                                   connection=self.core.openflow.connections[dpid], ofp=None))
+
+    def close(self):
+        if self.multicast_traffic_manager.route_computer is not None:
+            self.multicast_traffic_manager.route_computer.close()
+
+    def run(self):
+        from member_state_builder import MODE_IS_INCLUDE,CHANGE_TO_EXCLUDE_MODE
+        options = self.options
+        rand = random.Random(options.seed)
+        host_ports = self.topology.all_host_ports()
+
+        events = []
+        for dpid1,port1,dpid2,port2 in self.topology.links:
+            events.append(self.link_event(True, dpid1, port1, dpid2, port2))
+            events.append(self.link_event(True, dpid2, port2, dpid1, port1))
+        self.run_phase("links", events)
+
+        addresses = [self.IPAddr("232.%d.%d.%d" % (index / 65536 % 256,index / 256 % 256,index % 256 + 1 if index % 256 < 255 else 1))
+                     for index in xrange(options.groups)]
+        sources = [(self.IPAddr("10.1.%d.%d" % (index / 250,index % 250 + 1)),rand.choice(host_ports))
+                   for index in xrange(max(1, options.groups * options.sources))]
+        group_sources = dict((address,[sources[(index * options.sources + offset) % len(sources)] for offset in xrange(options.sources)])
+                             for index,address in enumerate(addresses))
+
+        memberships = []
+        events = []
+        for index in xrange(options.groups * options.members):
+            address = addresses[index % options.groups]
+            dpid,port = rand.choice(host_ports)
+            memberships.append((dpid,port,address))
+            if rand.random() < options.v3_include:
+                source_set = [source for source,location in rand.sample(group_sources[address], 1)]
+                events.append(self.report_v3(dpid, port, [(MODE_IS_INCLUDE,address,source_set)]))
+            elif rand.random() < 0.5:
+                events.append(self.report_v3(dpid, port, [(CHANGE_TO_EXCLUDE_MODE,address,[])]))
+            else:
+                events.append(self.report_v2(dpid, port, address))
+        self.run_phase("joins", events)
+
+        events = []
+        for address in addresses:
+            for source,(dpid,port) in group_sources[address]:
+                events.append(self.stream_event(dpid, port, address, source))
+        self.run_phase("streams", events)
+
+        events = []
+        for index in xrange(options.churn):
+            dpid,port,address = rand.choice(memberships)
+            choice = rand.random()
+            if choice < 0.6:
+                events.append(self.report_v2(dpid, port, address))
+            elif choice < 0.8:
+                events.append(self.report_v2(dpid, port, address, leave=True))
+            else:
+                dpid,port = rand.choice(host_ports)
+                events.append(self.report_v2(dpid, port, rand.choice(addresses)))
+        self.run_phase("churn", events)
+
+        events = []
+        for index in xrange(options.link_failures):
+            dpid1,port1,dpid2,port2 = rand.choice(self.topology.links)
+            events.append(self.link_event(False, dpid1, port1, dpid2, port2))
+            events.append(self.link_event(False, dpid2, port2, dpid1, port1))
+            events.append(self.link_event(True, dpid1, port1, dpid2, port2))
+            events.append(self.link_event(True, dpid2, port2, dpid1, port1))
+        self.run_phase("repair", events)
+        self.close()
+
+        return {"topology":self.topology.name, "switches":len(self.topology.switches), "links":len(self.topology.links),
+                "groups":options.groups, "members":options.members, "sources":options.sources, "engine":options.engine,
+                "phases":self.phase_results, "flow_mods":self.message_counts.get(OFPT_FLOW_MOD, 0),
+                "rules":self.multicast_traffic_manager.flow_aggregator.get_stats()["rules"],
+                "peak_memory_mb":resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0}
+
+
+def print_result(result):
+    print("%s: %d switches, %d links, %d groups x %d members, %d sources per group, %s engine" %
+          (result["topology"],result["switches"],result["links"],result["groups"],result["members"],result["sources"],result["engine"]))
+    print("  %-8s %8s %10s %9s %9s %9s %9s %9s" % ("phase","events","events/s","p50 ms","p90 ms","p99 ms","max ms","flow mods"))
+    for phase in result["phases"]:
+        if phase["events"] == 0:
+            continue
+        print("  %-8s %8d %10.0f %9.3f %9.3f %9.3f %9.3f %9d" % (phase["phase"],phase["events"],phase["events_per_sec"],
+              phase["p50_ms"],phase["p90_ms"],phase["p99_ms"],phase["max_ms"],phase["flow_mods"]))
+    print("  flow mods: %d, installed rules: %d, peak memory: %.1f MB" % (result["flow_mods"],result["rules"],result["peak_memory_mb"]))
+
+def add_pipeline_arguments(parser):
+    """ The options of the components, which are read by the Harness. The ones without a default are passed to the component
+     only when they are given (see the launch functions of the components), the harness turns the temporary flows off. """
+    parser.add_argument("--engine", default="prim")
+    parser.add_argument("--route_cache_size", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--parallel_threshold", type=int, default=64)
+    parser.add_argument("--no_aggregate", action="store_true")
+    parser.add_argument("--settle_window", type=float, default=None,
+                        help="coalesce the link events for this many seconds, 0 until the event queue is idle")
+    parser.add_argument("--membership_interval", type=float, default=None)
+    parser.add_argument("--query_interval", type=float, default=None)
+    parser.add_argument("--query_response_time", type=float, default=None)
+    parser.add_argument("--temporary_timeout", type=int, default=None)
+    parser.add_argument("--rate_limit", type=float, default=None)
+    parser.add_argument("--stream_idle_timeout", type=int, default=None)
+    parser.add_argument("--barrier_timeout", type=float, default=None)
+    parser.add_argument("--aggregate_min_prefix", type=int, default=None)
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(description="Headless benchmark of the multicast controller pipeline")
+    parser.add_argument("--topology", default="fat-tree", choices=["fat-tree","waxman","ring","customupg","loop_topo"])
+    parser.add_argument("--size", type=int, default=4, help="k of the fat-tree, switch count of the waxman and ring topologies")
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--members", type=int, default=10, help="memberships per group")
+    parser.add_argument("--sources", type=int, default=1, help="streams per group")
+    parser.add_argument("--v3_include", type=float, default=0.2, help="part of the joins which are IGMPv3 INCLUDE records")
+    parser.add_argument("--churn", type=int, default=1000, help="refresh, leave and join reports after the streams started")
+    parser.add_argument("--link_failures", type=int, default=5)
+    add_pipeline_arguments(parser)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the result as one JSON line")
+    parser.add_argument("--sweep", default=None, help="PARAMETER=value,value,... run once per value, each in its own process")
+    return parser.parse_args(arguments)
+
+def sweep(arguments, options):
+    parameter,values = options.sweep.split("=")
+    base = []
+    skip = False
+    for argument in arguments:
+        if skip:
+            skip = False
+            continue
+        if argument == "--sweep" or argument == "--" + parameter:
+            skip = True
+            continue
+        if argument.startswith("--sweep=") or argument.startswith("--" + parameter + "="):
+            continue
+        base.append(argument)
+
+    for value in values.split(","):
+        output = subprocess.check_output([sys.executable, __file__] + base + ["--" + parameter, value, "--json"])
+        print_result(json.loads(output.strip().splitlines()[-1]))
+
+def main(arguments):
+    options = parse_arguments(arguments)
+    if options.sweep is not None:
+        sweep(arguments, options)
+        return
+
+    harness = Harness(make_topology(options.topology, options.size), options)
+    result = harness.run()
+    if options.json:
+        print(json.dumps(result))
+    else:
+        print_result(result)
+
+if __name__ == "__main__":
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    main(sys.argv[1:])
@@ -0,0 +1,96 @@
+""" Structured event journal of the multicast components, used instead of logging the whole state at INFO on every event.
+
+  The components record their events with a category and a format string with arguments:
+      journal.record("igmp", "Report v2 on %s:%s for %s", dpid, port, address)
+  The string is only formatted when the journal is dumped (or when DEBUG logging is on), so the arguments should be small
+  values which don't change later, like addresses, keys and counts, not the state dicts themselves.
+
+  Records go to an in-memory ring buffer which keeps the last <size> records. Every category can be sampled: with a rate of
+  n only every n-th record of the category is kept (0 drops all of them), the number of seen and dropped records is counted.
+
+  The full state dumps (groups, flow entries, distances ...) are only taken when dump_state is on, the state function is
+  called at that moment and its result is formatted at once, because the state changes later.
+
+  With the event_journal component the journal is available as core.EventJournal from the POX py console:
+  print_dump(), dump(category, last), write(path), clear().
+  """
+import logging
+import time
+from collections import deque
+from pox.core import core
+
+log = core.getLogger()
+
+class EventJournal(object):
+    def __init__(self, size=4096):
+        self.records = deque(maxlen=size)
+        self.sample_rates = {}
+        self.seen = {}
+        self.dropped = {}
+        self.dump_state = False
+
+    def set_sample_rate(self, category, rate):
+        self.sample_rates[category] = rate
+
+    def record(self, category, fmt, *args):
+        seen = self.seen.get(category, 0) + 1
+        self.seen[category] = seen
+        rate = self.sample_rates.get(category, 1)
+        if rate == 0 or seen % rate != 0:
+            self.dropped[category] = self.dropped.get(category, 0) + 1
+            return
+
+        self.records.append((time.time(),category,fmt,args))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("[" + category + "] " + fmt, *args)
+
+    def state(self, category, label, state_function):
+        """ Records the result of state_function() when dump_state is on, otherwise the function is not even called """
+        if not self.dump_state:
+            return
+        self.record(category, "%s: %s", label, str(state_function()))
+
+    def format_record(self, record):
+        timestamp,category,fmt,args = record
+        try:
+            message = fmt % args
+        except (TypeError,ValueError):
+            message = fmt + " " + str(args)
+        return "%s.%03d [%s] %s" % (time.strftime("%H:%M:%S", time.localtime(timestamp)),int(timestamp * 1000) % 1000,category,message)
+
+    def dump(self, category=None, last=None):
+        """ The formatted records, oldest first, optionally only of one category and only the last ones """
+        records = [record for record in self.records if category is None or record[1] == category]
+        if last is not None:
+            records = records[-last:]
+        return [self.format_record(record) for record in records]
+
+    def print_dump(self, category=None, last=None):
+        print("\n".join(self.dump(category, last)))
+
+    def write(self, path, category=None):
+        with open(path, "w") as journal_file:
+            for line in self.dump(category):
+                journal_file.write(line + "\n")
+
+    def get_stats(self):
+        return {"records":len(self.records), "size":self.records.maxlen, "seen":dict(self.seen), "dropped":dict(self.dropped)}
+
+    def clear(self):
+        self.records.clear()
+        self.seen = {}
+        self.dropped = {}
+
+journal = EventJournal()
+
+
+def launch(size=4096, sample="", dump_state=False):
+    """ size: ring buffer length, sample: per category sample rates, e.g. "igmp=10,stream=100",
+     dump_state: record the full state before and after the events too. """
+    journal.records = deque(journal.records, maxlen=int(size))
+    for item in sample.split(","):
+        if item.strip() != "":
+            category,rate = item.split("=")
+            journal.set_sample_rate(category.strip(), int(rate))
+    journal.dump_state = str(dump_state).lower() in ("true","1","yes")
+    core.register("EventJournal", journal)
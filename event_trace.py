@@ -0,0 +1,265 @@
+""" Record and replay of the controller's input events.
+
+  The event_trace component appends every LinkEvent and every multicast PacketIn (IGMP reports and stream packets) to a
+  binary trace, before GraphBuilder, MemberStateBuilder and StreamerStateBuilder handle them:
+      ./pox.py ... event_trace --path=/var/tmp/multicast.trace
+
+  The trace starts with the MAGIC header, then one record per event, which is appended to the file, never rewritten:
+    - header: kind (B), timestamp (d), dpid (Q)
+    - LINK_ADDED, LINK_REMOVED: port1 (H), dpid2 (Q), port2 (H)
+    - PACKET_IN: in port (H), data length (H), the packet data of the PacketIn
+    - CONFIG: length (H), the options of the running components as a JSON object (see CONFIG_OPTIONS), written before
+      the first event of every recording, with dpid 0
+  Everything is in network byte order. A record cut off by a crash at the end of the trace is skipped by the reader.
+
+  Run as a script, the trace is replayed offline through the components of the benchmark harness (see
+  benchmark_harness.py), as fast as possible or at a real time multiple, and the flow mods which they send can be written
+  to a file, one line each, without the xids, so the files of two runs can be diffed:
+      PYTHONPATH=~/pox python event_trace.py /var/tmp/multicast.trace --speed 10 --flow_mods after.txt
+
+  The components and their timers run on the wall clock, the timers are fired between the replayed events when they are due,
+  and the pending one-shot timers (like the settle window) at the end. So only --speed 1 reproduces the recorded timing: at
+  a higher speed the events come closer to each other than recorded, but the aging, the querier, the barrier retries and the
+  settle window keep their real intervals, and with --speed 0 the recurring timers hardly fire at all.
+
+  The component options of the first CONFIG record are applied to the replay, except the ones given on the command line
+  (like --membership_interval, see benchmark_harness.add_pipeline_arguments).
+  """
+import argparse
+import json
+import struct
+import sys
+import time
+
+MAGIC = "MCTRACE1"
+
+LINK_ADDED   = 1
+LINK_REMOVED = 2
+PACKET_IN    = 3
+CONFIG       = 4
+
+RECORD_HEADER = struct.Struct("!BdQ")
+LINK_BODY = struct.Struct("!HQH")
+PACKET_IN_BODY = struct.Struct("!HH")
+CONFIG_BODY = struct.Struct("!H")
+
+""" (option,component,attribute) of the recorded options, the option names are the pipeline arguments of the harness """
+CONFIG_OPTIONS = [("membership_interval","MemberStateBuilder","membership_interval"),
+                  ("query_interval","MemberStateBuilder","query_interval"),
+                  ("query_response_time","MemberStateBuilder","query_response_time"),
+                  ("temporary_timeout","StreamerStateBuilder","temporary_timeout"),
+                  ("rate_limit","StreamerStateBuilder","rate_limit"),
+                  ("stream_idle_timeout","MulticastTrafficManager","stream_idle_timeout"),
+                  ("barrier_timeout","FlowProgrammer","barrier_timeout"),
+                  ("aggregate_min_prefix","MulticastTrafficManager","flow_aggregator.min_prefix")]
+
+
+class TraceWriter(object):
+    """ Appends the records to the trace, the header is only written into an empty file """
+    def __init__(self, path):
+        self.trace_file = open(path, "ab")
+        if self.trace_file.tell() == 0:
+            self.trace_file.write(MAGIC)
+        self.stats = {"records":0, "bytes":0}
+
+    def write(self, record):
+        self.trace_file.write(record)
+        self.stats["records"] += 1
+        self.stats["bytes"] += len(record)
+
+    def write_link(self, timestamp, added, dpid1, port1, dpid2, port2):
+        self.write(RECORD_HEADER.pack(LINK_ADDED if added else LINK_REMOVED, timestamp, dpid1) + LINK_BODY.pack(port1, dpid2, port2))
+
+    def write_packet_in(self, timestamp, dpid, port, data):
+        self.write(RECORD_HEADER.pack(PACKET_IN, timestamp, dpid) + PACKET_IN_BODY.pack(port, len(data)) + data)
+
+    def write_config(self, timestamp, config):
+        data = json.dumps(config, sort_keys=True)
+        self.write(RECORD_HEADER.pack(CONFIG, timestamp, 0) + CONFIG_BODY.pack(len(data)) + data)
+
+    def flush(self):
+        self.trace_file.flush()
+
+    def close(self):
+        self.trace_file.close()
+
+
+def read_trace(path):
+    """ Yields (kind,timestamp,dpid,body) for every record, body is (port1,dpid2,port2), (port,data) or the config dict """
+    with open(path, "rb") as trace_file:
+        data = trace_file.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not an event trace: " + path)
+
+    offset = len(MAGIC)
+    while offset + RECORD_HEADER.size <= len(data):
+        kind,timestamp,dpid = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        if kind == PACKET_IN:
+            if offset + PACKET_IN_BODY.size > len(data):
+                return
+            port,length = PACKET_IN_BODY.unpack_from(data, offset)
+            offset += PACKET_IN_BODY.size
+            if offset + length > len(data):
+                return
+            body = (port,data[offset:offset + length])
+            offset += length
+        elif kind == LINK_ADDED or kind == LINK_REMOVED:
+            if offset + LINK_BODY.size > len(data):
+                return
+            body = LINK_BODY.unpack_from(data, offset)
+            offset += LINK_BODY.size
+        elif kind == CONFIG:
+            if offset + CONFIG_BODY.size > len(data):
+                return
+            length, = CONFIG_BODY.unpack_from(data, offset)
+            offset += CONFIG_BODY.size
+            if offset + length > len(data):
+                return
+            body = json.loads(data[offset:offset + length])
+            offset += length
+        else:
+            raise ValueError("Unknown record kind %d at offset %d" % (kind,offset - RECORD_HEADER.size))
+        yield kind,timestamp,dpid,body
+
+
+def component_config(core):
+    """ The recorded options of the components which are registered """
+    config = {}
+    for option,component,attribute in CONFIG_OPTIONS:
+        if core.hasComponent(component):
+            value = getattr(core, component)
+            for name in attribute.split("."):
+                value = getattr(value, name)
+            config[option] = value
+    return config
+
+
+class TraceRecorder(object):
+    """ Listens with a priority above the components, so it sees the events before they are halted """
+    def __init__(self, path, flush_interval=1.0):
+        from pox.core import core
+        from pox.lib.recoco import Timer
+        import pox.lib.packet as pkt
+        self.pkt = pkt
+        self.core = core
+        self.writer = TraceWriter(path)
+        self.config_written = False
+        core.openflow.addListeners(self, priority=100)
+        core.openflow_discovery.addListeners(self, priority=100)
+        core.addListenerByName("GoingDownEvent", lambda event: self.writer.close())
+        self.flush_timer = Timer(flush_interval, self.writer.flush, recurring=True)
+
+    def write_config(self):
+        """ The components may be launched after the recorder, so their options are written before the first event """
+        if not self.config_written:
+            self.config_written = True
+            self.writer.write_config(time.time(), component_config(self.core))
+
+    def _handle_LinkEvent(self, event):
+        self.write_config()
+        link = event.link
+        self.writer.write_link(time.time(), event.added, link.dpid1, link.port1, link.dpid2, link.port2)
+
+    def _handle_PacketIn(self, event):
+        packet = event.parsed
+        if packet.type == self.pkt.ethernet.IP_TYPE and packet.payload.dstip.is_multicast:
+            self.write_config()
+            self.writer.write_packet_in(time.time(), event.dpid, event.port, event.data)
+
+    def get_stats(self):
+        return dict(self.writer.stats)
+
+
+def launch(path="multicast.trace", flush_interval=1.0):
+    """ path: the trace file, appended to if it exists, flush_interval: seconds between two flushes of the file. """
+    from pox.core import core
+    core.register("EventTrace", TraceRecorder(path, float(flush_interval)))
+
+
+def describe_flow_mod(raw):
+    """ One line of the flow mod, without the xid and the buffer id """
+    import pox.openflow.libopenflow_01 as of
+    msg = of.ofp_flow_mod()
+    msg.unpack(raw)
+    actions = ",".join(" ".join(action.show().split()) for action in msg.actions)
+    return "command=%d priority=%d idle=%d hard=%d flags=%d match=[%s] actions=[%s]" % (msg.command,msg.priority,
+           msg.idle_timeout,msg.hard_timeout,msg.flags," ".join(msg.match.show().split()),actions)
+
+def replay(path, options):
+    from benchmark_harness import Harness,Topology
+    records = []
+    config = None
+    for record in read_trace(path):
+        if record[0] != CONFIG:
+            records.append(record)
+        elif config is None:
+            config = record[3]
+    applied = {}
+    for option,value in (config or {}).iteritems():
+        if getattr(options, option, None) is None:
+            setattr(options, option, value)
+            applied[option] = value
+
+    switches = set()
+    for kind,timestamp,dpid,body in records:
+        switches.add(dpid)
+        if kind != PACKET_IN:
+            switches.add(body[1])
+    harness = Harness(Topology("trace", [], dict((dpid,[]) for dpid in switches)), options)
+
+    flow_mod_file = None
+    if options.flow_mods is not None:
+        flow_mod_file = open(options.flow_mods, "w")
+        harness.flow_mod_sink = lambda dpid, raw: flow_mod_file.write("%d %s\n" % (dpid,describe_flow_mod(raw)))
+
+    events = []
+    for kind,timestamp,dpid,body in records:
+        if kind == PACKET_IN:
+            events.append(harness.raw_packet_event(dpid, body[0], body[1]))
+        else:
+            port1,dpid2,port2 = body
+            events.append(harness.link_event(kind == LINK_ADDED, dpid, port1, dpid2, port2))
+    offsets = None
+    if options.speed > 0 and len(records) != 0:
+        offsets = [(timestamp - records[0][1]) / options.speed for kind,timestamp,dpid,body in records]
+
+    result = harness.run_phase("replay", events, offsets)
+    harness.close()
+    if flow_mod_file is not None:
+        flow_mod_file.close()
+    result.update({"trace":path, "switches":len(switches), "speed":options.speed,
+                   "trace_seconds":records[-1][1] - records[0][1] if len(records) != 0 else 0.0,
+                   "rules":harness.multicast_traffic_manager.flow_aggregator.get_stats()["rules"], "config":applied})
+    return result
+
+def print_result(result):
+    print("%s: %d events on %d switches, %.1f s in the trace, replayed in %.1f s" % (result["trace"],result["events"],
+          result["switches"],result["trace_seconds"],result["seconds"]))
+    if result["events"] != 0:
+        print("  %.0f events/s, p50 %.3f ms, p90 %.3f ms, p99 %.3f ms, max %.3f ms" % (result["events_per_sec"],result["p50_ms"],
+              result["p90_ms"],result["p99_ms"],result["max_ms"]))
+    print("  flow mods: %d, installed rules: %d" % (result["flow_mods"],result["rules"]))
+    if len(result["config"]) != 0:
+        print("  recorded options: %s" % ", ".join("%s=%s" % item for item in sorted(result["config"].iteritems())))
+
+def main(arguments):
+    from benchmark_harness import add_pipeline_arguments
+    parser = argparse.ArgumentParser(description="Offline replay of a multicast controller event trace")
+    parser.add_argument("trace")
+    parser.add_argument("--speed", type=float, default=0, help="multiple of real time, 0 replays as fast as possible")
+    parser.add_argument("--flow_mods", default=None, help="write the flow mods into this file, one line each")
+    add_pipeline_arguments(parser)
+    parser.add_argument("--json", action="store_true", help="print the result as one JSON line")
+    options = parser.parse_args(arguments)
+
+    result = replay(options.trace, options)
+    if options.json:
+        print(json.dumps(result))
+    else:
+        print_result(result)
+
+if __name__ == "__main__":
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    main(sys.argv[1:])
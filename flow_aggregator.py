@@ -0,0 +1,183 @@
+""" Flow table aggregation. It stands between the constructed routes and the flow mods: it keeps the entries of every switch
+  (group address, source, in port, out ports), computes the rules which have to be installed on the switch, and gives the
+  difference from the installed rules as flow mod operations.
+
+  The entries are merged into tiered rules:
+    exact  (priority 65535) - nw_dst and nw_src, used on the streamer's ingress switch and where the entries differ
+    group  (priority 65534) - nw_dst and in_port with wildcarded nw_src, when every source of the group arrives on the same
+                              in port and goes out on the same ports of the switch
+    prefix (priority 65533) - nw_dst prefix and in_port, when sibling group rules (down to min_prefix) are identical
+  The group and prefix rules always match on the in port of the tree link, so a new streamer, whose packets arrive on a host
+  port, still reaches the controller. Only identical sibling prefixes are merged, so the merged rules never cover a group which
+  is not on the switch. The rules are split again when the trees diverge.
+
+  Rules are keyed by (nw_dst, prefix length, nw_src, in_port) with None for the wildcarded fields. They are handled in blocks
+  of min_prefix size, so an update touches only the rules of one address block of the changed switches.
+  """
+from pox.lib.addresses import IPAddr
+import pox.openflow.libopenflow_01 as of
+
+EXACT_PRIORITY = 65535
+GROUP_PRIORITY = 65534
+PREFIX_PRIORITY = 65533
+
+def rule_priority(rule_key):
+    if rule_key[2] is not None:
+        return EXACT_PRIORITY
+    if rule_key[1] == 32:
+        return GROUP_PRIORITY
+    return PREFIX_PRIORITY
+
+def match_rule_key(match, priority):
+    """ Rule key of a flow entry of the switch, None when it is not in the multicast priority range """
+    if priority < PREFIX_PRIORITY or priority > EXACT_PRIORITY or match.dl_type != 0x800:
+        return None
+    group_addr,prefix_length = match.get_nw_dst()
+    if group_addr is None:
+        return None
+    return (group_addr.toUnsigned(),prefix_length,match.nw_src,match.in_port)
+
+
+class FlowAggregator(object):
+    def __init__(self, enabled=True, min_prefix=24):
+        self.enabled = enabled
+        self.min_prefix = min_prefix
+        self.block_mask = (0xffffffff << (32 - min_prefix)) & 0xffffffff
+
+        """ entries: {dpid:{block:{group_addr:{source:(in_port,out_ports)}}}}, installed: {dpid:{block:{rule_key:out_ports}}},
+         group_nodes: the switches of every group key """
+        self.entries = {}
+        self.installed = {}
+        self.group_nodes = {}
+        self.entry_counts = {}
+        self.forgotten = 0
+
+    def update_group(self, group_key, new_route, in_ports):
+        """ Updates the entries of the group key to the new route, and returns the needed flow mod operations as
+         (dpid,command,rule_key,out_ports) tuples, the adds and modifies of every switch before its deletes. """
+        group_addr = IPAddr(group_key[0]).toUnsigned()
+        source = group_key[1]
+        block = group_addr & self.block_mask
+
+        touched = set()
+        old_nodes = self.group_nodes.pop(group_key, set())
+        for node in old_nodes:
+            if node not in new_route:
+                self.del_entry(node, block, group_addr, source)
+                touched.add(node)
+
+        for node,out_ports in new_route.iteritems():
+            entry = (in_ports.get(node),tuple(sorted(set(out_ports))))
+            if self.set_entry(node, block, group_addr, source, entry):
+                touched.add(node)
+        if len(new_route) != 0:
+            self.group_nodes[group_key] = set(new_route.keys())
+
+        operations = []
+        for node in touched:
+            operations.extend(self.sync_block(node, block))
+        return operations
+
+    def set_entry(self, dpid, block, group_addr, source, entry):
+        sources = self.entries.setdefault(dpid,{}).setdefault(block,{}).setdefault(group_addr,{})
+        if sources.get(source) == entry:
+            return False
+        if source not in sources:
+            self.entry_counts[dpid] = self.entry_counts.get(dpid, 0) + 1
+        sources[source] = entry
+        return True
+
+    def del_entry(self, dpid, block, group_addr, source):
+        blocks = self.entries[dpid]
+        blocks[block][group_addr].pop(source)
+        self.entry_counts[dpid] -= 1
+        if len(blocks[block][group_addr]) == 0:
+            blocks[block].pop(group_addr)
+            if len(blocks[block]) == 0:
+                blocks.pop(block)
+                if len(blocks) == 0:
+                    self.entries.pop(dpid)
+                    self.entry_counts.pop(dpid)
+
+    def desired_rules(self, groups):
+        rules = {}
+        group_rules = {}
+        for group_addr,sources in groups.iteritems():
+            transit = set(entry for entry in sources.itervalues() if entry[0] is not None)
+            for source,(in_port,out_ports) in sources.iteritems():
+                if not self.enabled or in_port is None or len(transit) != 1:
+                    rules[(group_addr,32,source,None)] = out_ports
+            if self.enabled and len(transit) == 1:
+                group_rules[(group_addr,32)] = transit.pop()
+
+        """ Identical sibling prefixes are merged into their parent prefix, from /32 up to min_prefix """
+        for length in xrange(32, self.min_prefix, -1):
+            bit = 1 << (32 - length)
+            for prefix in [prefix for prefix in group_rules.keys() if prefix[1] == length]:
+                if prefix not in group_rules:
+                    continue
+                sibling = (prefix[0] ^ bit,length)
+                if group_rules.get(sibling) == group_rules[prefix]:
+                    group_rules[(prefix[0] & ~bit,length-1)] = group_rules.pop(prefix)
+                    group_rules.pop(sibling)
+
+        for (addr,length),(in_port,out_ports) in group_rules.iteritems():
+            rules[(addr,length,None,in_port)] = out_ports
+        return rules
+
+    def sync_block(self, dpid, block):
+        groups = self.entries.get(dpid,{}).get(block,{})
+        desired = self.desired_rules(groups)
+        installed = self.installed.get(dpid,{}).get(block,{})
+
+        operations = []
+        for rule_key,out_ports in desired.iteritems():
+            if rule_key not in installed:
+                operations.append((dpid,of.OFPFC_ADD,rule_key,out_ports))
+            elif installed[rule_key] != out_ports:
+                operations.append((dpid,of.OFPFC_MODIFY_STRICT,rule_key,out_ports))
+        for rule_key in installed.keys():
+            if rule_key not in desired:
+                operations.append((dpid,of.OFPFC_DELETE_STRICT,rule_key,()))
+
+        if len(desired) != 0:
+            self.installed.setdefault(dpid,{})[block] = desired
+        elif dpid in self.installed:
+            self.installed[dpid].pop(block, None)
+            if len(self.installed[dpid]) == 0:
+                self.installed.pop(dpid)
+        return operations
+
+    def get_rule(self, dpid, rule_key):
+        """ Out ports of the installed rule, None if it is not installed """
+        return self.installed.get(dpid,{}).get(rule_key[0] & self.block_mask,{}).get(rule_key)
+
+    def forget_rule(self, dpid, rule_key):
+        """ The rule is gone from the switch by itself (idle timeout): it is no longer counted as installed, so the next
+         update of its block adds it again if it is still needed. False if the rule was not installed. """
+        block = rule_key[0] & self.block_mask
+        rules = self.installed.get(dpid,{}).get(block)
+        if rules is None or rule_key not in rules:
+            return False
+        rules.pop(rule_key)
+        if len(rules) == 0:
+            self.installed[dpid].pop(block)
+            if len(self.installed[dpid]) == 0:
+                self.installed.pop(dpid)
+        self.forgotten += 1
+        return True
+
+    def get_switch_rules(self, dpid):
+        """ Every rule which should be installed on the switch, {rule_key:out_ports} """
+        rules = {}
+        for block_rules in self.installed.get(dpid,{}).itervalues():
+            rules.update(block_rules)
+        return rules
+
+    def get_stats(self):
+        """ Entry count of every switch before and after the aggregation """
+        switches = {}
+        for dpid,blocks in self.installed.iteritems():
+            switches[dpid] = {"entries":self.entry_counts.get(dpid, 0), "rules":sum(len(rules) for rules in blocks.itervalues())}
+        return {"entries":sum(self.entry_counts.itervalues()), "rules":sum(switch["rules"] for switch in switches.itervalues()),
+                "switches":switches, "forgotten":self.forgotten}
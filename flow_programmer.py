@@ -0,0 +1,229 @@
+""" Outbound flow programming queue. The flow mods are not sent one by one: they are collected per switch, and when the actual
+  event handling is finished, every switch gets its pending messages packed into one buffer write, closed by an
+  ofp_barrier_request. The barrier replies confirm the batches, which gives the install latency of every batch.
+
+  Every message has a stage, a sortable key given by the sender. The messages of one round are sent in waves, one wave per
+  stage in increasing order, and a wave is only sent when every batch of the previous wave is confirmed by its barrier reply
+  (or given up). The MulticastTrafficManager uses the stages for the make before break order of the route updates: the adds
+  and modifies from the deepest tree level up to the root, then the deletes from the root down. The waves of a later round
+  are queued behind the waves of the earlier ones, so the messages of a switch are always sent in the order they were given.
+
+  A barrier reply confirms every earlier batch of the switch too, because the switch handles the messages in order.
+
+  A batch which can't be sent because the switch has no connection waits for the switch, and when a switch disconnects, its
+  unconfirmed batches are put in front of its waiting messages. When it connects again, they are sent in this order. The FlowReconciler
+  discards these before, when it is running, and replays the switch's whole rule set instead. The waiting messages of a switch
+  are dropped when there are more than max_waiting of them, or when the switch is away for longer than waiting_timeout:
+  a switch which comes back after that needs the FlowReconciler's replay anyway.
+
+  A batch which is not confirmed in time is sent again, together with every later unconfirmed batch of the switch, in their
+  original order, so a retry never puts back a rule which a later batch has changed.
+  """
+import time
+from collections import OrderedDict,deque
+from pox.core import core
+import pox.openflow.libopenflow_01 as of
+from pox.lib.recoco import Timer
+from pipeline_stats import stats
+
+log = core.getLogger()
+
+""" The stage of the messages which don't need an order across switches """
+DEFAULT_STAGE = (0,0)
+
+class FlowProgrammer(object):
+    def __init__(self, barrier_timeout=5.0, max_retries=3, max_waiting=10000, waiting_timeout=60.0):
+        self.barrier_timeout = barrier_timeout
+        self.max_retries = max_retries
+        self.max_waiting = max_waiting
+        self.waiting_timeout = waiting_timeout
+
+        """ pending: messages of the actual round {stage:{dpid:[messages]}}, every dpid in the order of its first message,
+         waves: the waves waiting for the previous wave, in_flight: barrier xids of the actual wave,
+         waiting: messages of switches without connection, waiting_since: when the switch's first waiting message came,
+         unconfirmed: sent batches by barrier xid, in send order """
+        self.pending = {}
+        self.waves = deque()
+        self.in_flight = set()
+        self.waiting = {}
+        self.waiting_since = {}
+        self.unconfirmed = OrderedDict()
+        self.flush_scheduled = False
+        self.stats = {"batches":0, "messages":0, "waves":0, "replies":0, "confirmed":0, "retried":0, "merged":0, "replayed":0,
+                      "no_connection":0, "dropped":0, "latency_total":0.0, "latency_max":0.0}
+
+        core.openflow.addListeners(self)
+        self.retry_timer = Timer(barrier_timeout, self.check_unconfirmed, recurring=True)
+
+    def send(self, dpid, msg, stage=DEFAULT_STAGE):
+        batches = self.pending.get(stage)
+        if batches is None:
+            batches = self.pending[stage] = OrderedDict()
+        if dpid not in batches:
+            batches[dpid] = []
+        batches[dpid].append(msg)
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            core.callLater(self.flush)
+
+    def flush(self):
+        timer = stats.start("flow_send")
+        self.flush_scheduled = False
+        pending = self.pending
+        self.pending = {}
+        for stage in sorted(pending.keys()):
+            self.waves.append(pending[stage])
+        self.send_waves()
+        stats.stop(timer)
+
+    def send_waves(self):
+        """ Sends the next waves, until one of them has batches to wait for """
+        while len(self.in_flight) == 0 and len(self.waves) != 0:
+            wave = self.waves.popleft()
+            self.stats["waves"] += 1
+            for dpid,messages in wave.iteritems():
+                xid = self.send_batch(dpid, messages)
+                if xid is not None:
+                    self.in_flight.add(xid)
+
+    def send_batch(self, dpid, messages, retries=0):
+        """ Returns the xid of the barrier, None if the switch has no connection """
+        connection = core.openflow.getConnection(dpid)
+        if connection is None:
+            log.info("No connection to switch %s, %d flow mods wait for it" % (dpid,len(messages)))
+            self.add_waiting(dpid, messages)
+            self.stats["no_connection"] += 1
+            return None
+
+        barrier = of.ofp_barrier_request()
+        data = b''.join(msg.pack() for msg in messages) + barrier.pack()
+        connection.send(data)
+
+        self.unconfirmed[barrier.xid] = {"dpid":dpid, "messages":messages, "sent":time.time(), "retries":retries}
+        stats.count("flow_mods", len(messages))
+        self.stats["batches"] += 1
+        self.stats["messages"] += len(messages)
+        return barrier.xid
+
+    def add_waiting(self, dpid, messages, in_front=False):
+        if dpid not in self.waiting:
+            self.waiting[dpid] = []
+            self.waiting_since[dpid] = time.time()
+        if in_front:
+            self.waiting[dpid] = messages + self.waiting[dpid]
+        else:
+            self.waiting[dpid].extend(messages)
+        if len(self.waiting[dpid]) > self.max_waiting:
+            self.drop_waiting(dpid, "more than %d flow mods" % self.max_waiting)
+
+    def pop_waiting(self, dpid):
+        self.waiting_since.pop(dpid, None)
+        return self.waiting.pop(dpid, [])
+
+    def drop_waiting(self, dpid, reason):
+        messages = self.pop_waiting(dpid)
+        self.stats["dropped"] += len(messages)
+        log.warning("Dropped %d flow mods waiting for switch %s, %s" % (len(messages),dpid,reason))
+
+    def pop_unconfirmed(self, dpid):
+        """ Removes the unconfirmed batches of the switch, and returns them in the order they were sent. A removed batch
+         of the actual wave doesn't hold it any more. """
+        batches = []
+        for xid in [xid for xid,batch in self.unconfirmed.iteritems() if batch["dpid"] == dpid]:
+            batches.append(self.unconfirmed.pop(xid))
+            self.in_flight.discard(xid)
+        return batches
+
+    def discard(self, dpid):
+        """ Drops every message of the switch which is not confirmed yet, when its whole flow table is going to be rewritten. """
+        self.pop_waiting(dpid)
+        self.pop_unconfirmed(dpid)
+        for batches in self.pending.itervalues():
+            batches.pop(dpid, None)
+        for wave in self.waves:
+            wave.pop(dpid, None)
+        self.send_waves()
+
+    def _handle_BarrierIn(self, event):
+        batch = self.unconfirmed.get(event.xid)
+        if batch is None:
+            return
+
+        confirmed = []
+        for xid,earlier in self.unconfirmed.iteritems():
+            if earlier["dpid"] == batch["dpid"]:
+                confirmed.append(xid)
+            if xid == event.xid:
+                break
+        for xid in confirmed:
+            self.unconfirmed.pop(xid)
+            self.in_flight.discard(xid)
+        self.stats["confirmed"] += len(confirmed)
+
+        latency = time.time() - batch["sent"]
+        self.stats["replies"] += 1
+        self.stats["latency_total"] += latency
+        self.stats["latency_max"] = max(self.stats["latency_max"], latency)
+        self.send_waves()
+
+    def _handle_ConnectionDown(self, event):
+        """ The unconfirmed batches of the switch wait for it before the messages which were not sent to it """
+        messages = []
+        for batch in self.pop_unconfirmed(event.dpid):
+            messages.extend(batch["messages"])
+        if len(messages) != 0:
+            self.add_waiting(event.dpid, messages, True)
+        self.send_waves()
+
+    def _handle_ConnectionUp(self, event):
+        in_wave = any(self.unconfirmed[xid]["dpid"] == event.dpid for xid in self.in_flight)
+        messages = []
+        for batch in self.pop_unconfirmed(event.dpid):
+            messages.extend(batch["messages"])
+        messages.extend(self.pop_waiting(event.dpid))
+
+        if len(messages) != 0:
+            log.info("Replay %d flow mods to reconnected switch %s" % (len(messages),event.dpid))
+            self.stats["replayed"] += len(messages)
+            xid = self.send_batch(event.dpid, messages)
+            if in_wave and xid is not None:
+                self.in_flight.add(xid)
+        self.send_waves()
+
+    def check_unconfirmed(self):
+        now = time.time()
+        for dpid,since in self.waiting_since.items():
+            if now - since >= self.waiting_timeout:
+                self.drop_waiting(dpid, "it is away for %d seconds" % (now - since))
+
+        timed_out = []
+        for batch in self.unconfirmed.itervalues():
+            if now - batch["sent"] >= self.barrier_timeout and batch["dpid"] not in timed_out:
+                timed_out.append(batch["dpid"])
+
+        for dpid in timed_out:
+            in_wave = any(self.unconfirmed[xid]["dpid"] == dpid for xid in self.in_flight)
+            batches = self.pop_unconfirmed(dpid)
+            retries = max(batch["retries"] for batch in batches)
+            messages = []
+            for batch in batches:
+                messages.extend(batch["messages"])
+
+            if retries >= self.max_retries:
+                log.warning("%d flow mods to switch %s were not confirmed, giving up" % (len(messages),dpid))
+                continue
+            self.stats["retried"] += 1
+            self.stats["merged"] += len(batches) - 1
+            xid = self.send_batch(dpid, messages, retries + 1)
+            if in_wave and xid is not None:
+                self.in_flight.add(xid)
+        self.send_waves()
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["unconfirmed"] = len(self.unconfirmed)
+        stats["waiting"] = sum(len(messages) for messages in self.waiting.itervalues())
+        stats["queued_waves"] = len(self.waves)
+        if stats["replies"] != 0:
+            stats["latency_avg"] = stats["latency_total"] / stats["replies"]
+        return stats
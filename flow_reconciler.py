@@ -0,0 +1,149 @@
+""" Flow state reconciliation. The flow aggregator of the MulticastTrafficManager knows every rule which should be installed on the
+  switches, this component makes the switches match it:
+
+  - when a switch connects (again), its whole share of the rules, the BLOCK entries of its incomplete groups and the
+    temporary drop entries of its new streams (with their remaining timeout) are replayed in one batch,
+  - the flow tables are pulled periodically with ofp_flow_stats requests, and only the drifted rules are fixed: missing
+    rules are added, rules with wrong out ports are modified, and unknown rules in the multicast priority range are deleted.
+    The temporary entries expire by themselves, so only the unknown ones are deleted, the missing ones are not added.
+  """
+import math
+import time
+from pox.core import core
+import pox.openflow.libopenflow_01 as of
+from pox.lib.addresses import IPAddr
+from pox.lib.recoco import Timer
+from flow_aggregator import match_rule_key
+from streamer_state_builder import TEMPORARY_PRIORITY
+
+log = core.getLogger()
+
+class FlowReconciler(object):
+    def __init__(self, interval=30):
+        self.interval = interval
+        self.multicast_traffic_manager = None
+        self.check_timer = None
+        self.stats = {"replays":0, "replayed_rules":0, "checks":0, "missing":0, "modified":0, "unexpected":0,
+                      "fix_flow_mods":0, "check_time_total":0.0, "check_time_max":0.0}
+
+        core.listen_to_dependencies(self, ['MulticastTrafficManager'])
+        """ Higher priority than the flow programmer's listener, so its stale replay is discarded before the full replay """
+        core.openflow.addListeners(self, priority=1)
+
+    def _all_dependencies_met(self):
+        self.multicast_traffic_manager = core.MulticastTrafficManager
+        if self.interval > 0:
+            self.check_timer = Timer(self.interval, self.request_flow_stats, recurring=True)
+
+    def expected_rules(self, dpid):
+        """ {(nw_dst,prefix length,nw_src,in_port):out_ports} of the switch, including the BLOCK entries """
+        rules = {}
+        for (group_addr,prefix_length,source,in_port),out_ports in self.multicast_traffic_manager.flow_aggregator.get_switch_rules(dpid).iteritems():
+            if source is not None:
+                source = IPAddr(source)
+            rules[(group_addr,prefix_length,source,in_port)] = tuple(out_ports)
+
+        for group_key,streamer in self.blocked_groups(dpid):
+            rule_key = (IPAddr(group_key[0]).toUnsigned(),32,IPAddr(group_key[1]),None)
+            if rule_key not in rules:
+                rules[rule_key] = ()
+        return rules
+
+    def blocked_groups(self, dpid):
+        if not core.hasComponent("StreamerStateBuilder"):
+            return []
+        incomplete_groups = core.StreamerStateBuilder.incomplete_groups
+        return [(group_key,group["streamer"]) for group_key,group in incomplete_groups.iteritems() if group["streamer"] == dpid]
+
+    def temporary_flows(self, dpid):
+        if not core.hasComponent("StreamerStateBuilder"):
+            return []
+        return core.StreamerStateBuilder.get_temporary_flows(dpid, time.time())
+
+    def _handle_ConnectionUp(self, event):
+        if self.multicast_traffic_manager is None:
+            return
+
+        start = time.time()
+        manager = self.multicast_traffic_manager
+        manager.flow_programmer.discard(event.dpid)
+
+        rules = manager.flow_aggregator.get_switch_rules(event.dpid)
+        for rule_key,out_ports in rules.iteritems():
+            manager.send_flow_mod(event.dpid, manager.make_rule_flow_mod(rule_key, out_ports, of.OFPFC_ADD, manager.rule_idle_timeout(event.dpid, rule_key)))
+        blocked_groups = self.blocked_groups(event.dpid)
+        for group_key,streamer in blocked_groups:
+            manager.send_incomplete_group_message(group_key, streamer, 'BLOCK')
+        temporary_flows = self.temporary_flows(event.dpid)
+        for group_key,in_port,remaining in temporary_flows:
+            manager.send_flow_mod(event.dpid, core.StreamerStateBuilder.make_temporary_flow_mod(group_key, in_port, int(math.ceil(remaining))))
+
+        replayed = len(rules) + len(blocked_groups) + len(temporary_flows)
+        self.stats["replays"] += 1
+        self.stats["replayed_rules"] += replayed
+        log.info("Switch %s connected, replayed %d rules in %.1f ms" % (event.dpid,replayed,(time.time() - start) * 1000))
+
+    def request_flow_stats(self):
+        for connection in core.openflow.connections:
+            msg = of.ofp_stats_request(body=of.ofp_flow_stats_request())
+            msg.body.match.dl_type = 0x800
+            connection.send(msg)
+
+    def _handle_FlowStatsReceived(self, event):
+        if self.multicast_traffic_manager is None:
+            return
+
+        start = time.time()
+        dpid = event.connection.dpid
+        expected = self.expected_rules(dpid)
+
+        actual = {}
+        temporary = set((group_key,in_port) for group_key,in_port,remaining in self.temporary_flows(dpid))
+        unknown_temporary = []
+        for flow_stats in event.stats:
+            if flow_stats.priority == TEMPORARY_PRIORITY and flow_stats.match.dl_type == 0x800:
+                group_key = (flow_stats.match.nw_dst,flow_stats.match.nw_src)
+                if (group_key,flow_stats.match.in_port) not in temporary:
+                    unknown_temporary.append((group_key,flow_stats.match.in_port))
+                continue
+            rule_key = match_rule_key(flow_stats.match, flow_stats.priority)
+            if rule_key is None:
+                continue
+            actual[rule_key] = tuple(sorted(action.port for action in flow_stats.actions if isinstance(action, of.ofp_action_output)))
+
+        fixes = []
+        for rule_key,out_ports in expected.iteritems():
+            if rule_key not in actual:
+                fixes.append((rule_key,out_ports,of.OFPFC_ADD))
+                self.stats["missing"] += 1
+            elif actual[rule_key] != tuple(sorted(out_ports)):
+                fixes.append((rule_key,out_ports,of.OFPFC_MODIFY_STRICT))
+                self.stats["modified"] += 1
+        for rule_key in actual.keys():
+            if rule_key not in expected:
+                fixes.append((rule_key,(),of.OFPFC_DELETE_STRICT))
+                self.stats["unexpected"] += 1
+
+        manager = self.multicast_traffic_manager
+        for rule_key,out_ports,command in fixes:
+            idle_timeout = manager.rule_idle_timeout(dpid, rule_key) if command != of.OFPFC_DELETE_STRICT else 0
+            manager.send_flow_mod(dpid, manager.make_rule_flow_mod(rule_key, out_ports, command, idle_timeout))
+        for group_key,in_port in unknown_temporary:
+            manager.send_flow_mod(dpid, core.StreamerStateBuilder.make_temporary_flow_mod(group_key, in_port, 0, of.OFPFC_DELETE_STRICT))
+        self.stats["unexpected"] += len(unknown_temporary)
+
+        check_time = time.time() - start
+        self.stats["checks"] += 1
+        self.stats["fix_flow_mods"] += len(fixes) + len(unknown_temporary)
+        self.stats["check_time_total"] += check_time
+        self.stats["check_time_max"] = max(self.stats["check_time_max"], check_time)
+        if len(fixes) != 0:
+            log.info("Switch %s drifted, %d of %d rules fixed" % (dpid,len(fixes),len(expected)))
+
+    def get_stats(self):
+        return dict(self.stats)
+
+def launch(interval=30):
+    """ interval: seconds between two flow table checks, 0 disables the periodic check. """
+    flow_reconciler = FlowReconciler(float(interval))
+    core.register("FlowReconciler", flow_reconciler)
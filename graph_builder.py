@@ -5,9 +5,14 @@
   The graph building is done by handling the openflow discovery component's LinkEvent events. The event can be of state up and down. Therefore we can delete or add a link. 
   When the structure is changed, the component raises a GraphStructureChanged event. After that, the handling component can query the graph structure. 
   """
-from collections import defaultdict
+import time
+from collections import OrderedDict
 from pox.core import core
 from pox.lib.revent import EventHalt,Event,EventMixin
+from pox.lib.recoco import Timer
+import routing_engines
+from graph_snapshot import GraphSnapshot
+from event_journal import journal
 
 log = core.getLogger()
 
@@ -15,14 +20,64 @@ class GraphStructureChanged(Event):
     def __str__ (self):
         return "Graph Structure changed"
     
-    def __init__ (self,graph_builder):
+    def __init__ (self,graph_builder,changed_links=None):
         super(GraphStructureChanged,self).__init__()
         self.graph_builder = graph_builder
+        self.changed_links = changed_links
         
     def get_graph_builder(self):
         return self.graph_builder
+    
+    def get_changed_links(self):
+        """ The set of (from_dpid,to_dpid) links which were added, removed or changed, None if it is unknown. """
+        return self.changed_links
+        
+        
+class AdjacencyStore(object):
+    """ Indexed adjacency of the discovered topology. The successors of a node are stored in a set (succ dict) and the predecessors
+      in a reverse adjacency set (pred dict), so adding and removing a link or asking the degree of a node costs O(1). """
+    
+    def __init__(self):
+        self.succ = {}
+        self.pred = {}
+        
+    def has_edge(self, from_node, to_node):
+        return from_node in self.succ and to_node in self.succ[from_node]
+    
+    def add_edge(self, from_node, to_node):
+        if from_node not in self.succ:
+            self.succ[from_node] = set()
+        if to_node not in self.pred:
+            self.pred[to_node] = set()
+        self.succ[from_node].add(to_node)
+        self.pred[to_node].add(from_node)
         
+    def del_edge(self, from_node, to_node):
+        if not self.has_edge(from_node, to_node):
+            return False
         
+        self.succ[from_node].remove(to_node)
+        if len(self.succ[from_node]) == 0:
+            self.succ.pop(from_node)
+            
+        self.pred[to_node].remove(from_node)
+        if len(self.pred[to_node]) == 0:
+            self.pred.pop(to_node)
+        return True
+    
+    def successors(self, node):
+        return self.succ.get(node,())
+    
+    def predecessors(self, node):
+        return self.pred.get(node,())
+    
+    def out_degree(self, node):
+        return len(self.succ.get(node,()))
+    
+    def in_degree(self, node):
+        return len(self.pred.get(node,()))
+    
+    
 class GraphBuilder(EventMixin):
     _eventMixin_events = set([GraphStructureChanged])
     _rule_priority_adjustment = -0x1000 
@@ -31,65 +86,163 @@ class GraphBuilder(EventMixin):
         core.addListeners(self)
         core.openflow_discovery.addListeners(self)
         
-        self.nodes = []
-        self.edges = defaultdict(list)
+        self.nodes = set()
+        self.adjacency = AdjacencyStore()
         self.distances = {}
         self.ports = {}
+        self.port_links = {}
+        self.weight_function = None
+        self.routing_engine = routing_engines.PrimPruneEngine()
+        self.version = 0
+        self.snapshot = None
+        self.dirty_nodes = set()
+        
+        """ Link event coalescing, disabled when settle_window is None. The pending dict stores the last event of every link
+         which arrived in the actual window. """
+        self.settle_window = None
+        self.settle_max_delay = 1.0
+        self.pending_links = OrderedDict()
+        self.pending_since = None
+        self.settle_timer = None
+        self.flush_scheduled = False
         
     def add_node(self, value):
         if value not in self.nodes:
-            self.nodes.append(value)
+            self.nodes.add(value)
+            self.dirty_nodes.add(value)
+            self.version += 1
             
     def del_node(self, value):
         if value in self.nodes:
             self.nodes.remove(value)
+            self.dirty_nodes.add(value)
+            self.version += 1
             
     def add_edge(self, from_node, from_port, to_node, to_port, distance):
-        self.edges[from_node].append(to_node)
-        self.distances[(from_node, to_node)] = distance
-        self.ports[(from_node,to_node)] = (from_port,to_port)
+        edge = (from_node,to_node)
+        if self.adjacency.has_edge(from_node, to_node) and self.distances[edge] == distance and self.ports[edge] == (from_port,to_port):
+            return False
+        
+        if edge in self.ports:
+            self.port_links.pop((from_node,self.ports[edge][0]), None)
+        self.adjacency.add_edge(from_node, to_node)
+        self.distances[edge] = distance
+        self.ports[edge] = (from_port,to_port)
+        self.port_links[(from_node,from_port)] = edge
+        self.dirty_nodes.add(from_node)
+        self.version += 1
+        return True
     
     def del_edge(self,from_node, from_port, to_node, to_port):
-        if from_node in self.edges.keys():
-            to_delete_index = self.edges[from_node].index(to_node)
-            del self.edges[from_node][to_delete_index]
-            
-            if len(self.edges[from_node]) == 0:
-                self.edges.pop(from_node)
-  
-        if (from_node, to_node) in self.distances.keys():
-            self.distances.pop((from_node, to_node))
+        """ Removes the link, and the to_node too, when no other link points to it. Returns False when the link was not known. """
+        if not self.adjacency.del_edge(from_node, to_node):
+            return False
         
-        if (from_node,to_node) in self.ports.keys():
-            self.ports.pop((from_node,to_node))
+        self.distances.pop((from_node, to_node), None)
+        old_ports = self.ports.pop((from_node,to_node), None)
+        if old_ports is not None:
+            self.port_links.pop((from_node,old_ports[0]), None)
+        self.dirty_nodes.add(from_node)
+        self.version += 1
         
-        was_there = False
-        for item in self.edges.values():
-            if to_node in item:
-                was_there = True
-                
-        if was_there == False:
+        if self.adjacency.in_degree(to_node) == 0:
             self.del_node(to_node)
+        return True
             
     def _handle_LinkEvent(self, event):
-        if (event.added == True ):
-            log.info("ConnectionUp, dpid1=%s , dpid2=%s" % (event.link.dpid1,event.link.dpid2))
-            self.add_node(event.link.dpid1)
-            self.add_node(event.link.dpid2)
-            self.add_edge(event.link.dpid1, event.link.port1, event.link.dpid2, event.link.port2, 1)
-        else:
-            log.info("ConnectionDown, dpid1=%s, dpid2=%s" % (event.link.dpid1,event.link.dpid2))
-            self.del_edge(event.link.dpid1, event.link.port1, event.link.dpid2, event.link.port2)
+        if self.settle_window is not None:
+            self.queue_link_event(event.added, event.link)
+            return EventHalt
         
-        ev = GraphStructureChanged(self)
-        self.raiseEvent(ev)
+        if self.apply_link_event(event.added, event.link):
+            ev = GraphStructureChanged(self,set([(event.link.dpid1,event.link.dpid2)]))
+            self.raiseEvent(ev)
         return EventHalt
+    
+    def apply_link_event(self, added, link):
+        if (added == True ):
+            log.info("ConnectionUp, dpid1=%s , dpid2=%s" % (link.dpid1,link.dpid2))
+            self.add_node(link.dpid1)
+            self.add_node(link.dpid2)
+            return self.add_edge(link.dpid1, link.port1, link.dpid2, link.port2, self.link_distance(link.dpid1, link.dpid2))
+        else:
+            log.info("ConnectionDown, dpid1=%s, dpid2=%s" % (link.dpid1,link.dpid2))
+            return self.del_edge(link.dpid1, link.port1, link.dpid2, link.port2)
+        
+    def link_distance(self, from_node, to_node):
+        """ Distance of a link, it is given by the weight function if one is set (see the link_utilization component), 1 otherwise. """
+        if self.weight_function is None:
+            return 1
+        return self.weight_function(from_node, to_node)
+    
+    def update_link_weights(self, links):
+        """ Recomputes the distance of the given (from_node,to_node) links with the weight function, and raises one
+         GraphStructureChanged event with the links whose distance really changed. """
+        changed_links = set()
+        for edge in links:
+            if edge not in self.distances:
+                continue
+            from_port,to_port = self.ports[edge]
+            if self.add_edge(edge[0], from_port, edge[1], to_port, self.link_distance(edge[0], edge[1])):
+                changed_links.add(edge)
+        
+        if len(changed_links) != 0:
+            log.info("Link weights changed: "+str(changed_links))
+            ev = GraphStructureChanged(self,changed_links)
+            self.raiseEvent(ev)
+        return changed_links
+    
+    def queue_link_event(self, added, link):
+        """ Collects the link events until the settle window passes without a new event, but at most for settle_max_delay seconds.
+         With a zero window the batch is applied when the event queue is idle. """
+        edge = (link.dpid1,link.dpid2)
+        self.pending_links.pop(edge, None)
+        self.pending_links[edge] = (added,link)
+        
+        now = time.time()
+        if self.pending_since is None:
+            self.pending_since = now
+        
+        if self.settle_window == 0:
+            if not self.flush_scheduled:
+                self.flush_scheduled = True
+                core.callLater(self.flush_link_events)
+            return
+        
+        if self.settle_timer is not None:
+            self.settle_timer.cancel()
+        delay = min(self.settle_window, max(0, self.pending_since + self.settle_max_delay - now))
+        self.settle_timer = Timer(delay, self.flush_link_events)
+        
+    def flush_link_events(self):
+        """ Applies the collected link events as one batch and raises one GraphStructureChanged event with the changed links. """
+        if self.settle_timer is not None:
+            self.settle_timer.cancel()
+            self.settle_timer = None
+        self.flush_scheduled = False
+        self.pending_since = None
+        
+        pending_links = self.pending_links
+        self.pending_links = OrderedDict()
+        
+        changed_links = set()
+        for edge,(added,link) in pending_links.iteritems():
+            if self.apply_link_event(added, link):
+                changed_links.add(edge)
+        
+        log.info("Applied %d coalesced link events, %d links changed" % (len(pending_links),len(changed_links)))
+        if len(changed_links) != 0:
+            ev = GraphStructureChanged(self,changed_links)
+            self.raiseEvent(ev)
         
     def get_nodes(self):
-        return self.nodes
+        return list(self.nodes)
     
     def get_edges(self):
-        return self.edges
+        edges = {}
+        for from_node,to_nodes in self.adjacency.succ.iteritems():
+            edges[from_node] = list(to_nodes)
+        return edges
     
     def get_distances(self):
         return self.distances
@@ -97,6 +250,38 @@ class GraphBuilder(EventMixin):
     def get_ports(self):
         return self.ports
     
+    def has_node(self, node):
+        return node in self.nodes
+    
+    def successors(self, node):
+        return self.adjacency.successors(node)
+    
+    def get_distance(self, from_node, to_node):
+        return self.distances[(from_node,to_node)]
+    
+    def successor_distances(self, node):
+        distances = self.distances
+        return [(to_node,distances[(node,to_node)]) for to_node in self.adjacency.successors(node)]
+    
+    def get_port_pair(self, from_node, to_node):
+        return self.ports[(from_node,to_node)]
+    
+    def get_link_by_port(self, dpid, port):
+        """ Returns the (from_node,to_node) link which leaves the dpid switch on the given port, or None. """
+        return self.port_links.get((dpid,port))
+    
+    def get_snapshot(self):
+        """ Immutable CSR snapshot of the actual topology version (see graph_snapshot), it is rebuilt incrementally from the
+         previous one when the version changes. """
+        if self.snapshot is None or self.snapshot.version != self.version:
+            self.snapshot = GraphSnapshot.build(self, self.snapshot, self.dirty_nodes)
+            self.dirty_nodes = set()
+        return self.snapshot
+    
+    def get_version(self):
+        """ Topology version, it is increased on every real change of the nodes, links, distances or ports. """
+        return self.version
+    
     def minimal_cost_spanning_tree(self,received_group_members,root):
         valid_group_members = set()
         for member in received_group_members.keys():
@@ -151,12 +336,12 @@ class GraphBuilder(EventMixin):
                 visited_group_members.add(min_edge[1])
                 
 
-        log.info("The before edge dict: "+str(before_edges))
+        journal.state("route", "Reference tree before edges", lambda: before_edges)
         """ We find every group member, and with the help of the before_edges dict, which contains the before edge to every vertex
          in the computed min cost spanning tree. After this section only valid edges will be in the resul_min_tree. """
         
         group_members = group_members.difference(unvisitable_nodes) 
-        log.info("Updated group member set: "+str(group_members))
+        journal.state("route", "Reachable group members", lambda: group_members)
         
         for member in group_members:
             if member == root:
@@ -175,28 +360,34 @@ class GraphBuilder(EventMixin):
         
         return result_min_tree
     
-    def construct_routes(self, result_min_tree,group_members):
-        """ To be able to write out the exact routes to switches, we need the ports in each vertex, where we can find the group members.
-         To achieve this, we return the constructed route  """
-         
-        constructed_route = {} 
+    def compute_tree(self,received_group_members,root):
+        """ Computes the multicast tree with the selected routing engine, see the routing_engines module. """
+        result_min_tree = self.routing_engine.compute_tree(self, received_group_members.keys(), root)
+        
+        reached = set([root])
         for edge in result_min_tree:
-            from_node = edge[0]
-            if constructed_route.has_key(from_node):
-                constructed_route[from_node].append(self.ports[edge][0])
-            else:
-                constructed_route.update({from_node:[self.ports[edge][0]]})
-                
-            if group_members.has_key(from_node):
-                constructed_route[from_node].append(group_members[from_node])
-        
-        for member in group_members.keys():
-            if member not in constructed_route.keys() and member in self.nodes:
-                constructed_route.update({member:group_members[member]})
-               
-        return constructed_route
+            reached.add(edge[1])
+        unreachable = [member for member in received_group_members.keys() if member not in reached]
+        if len(unreachable) != 0:
+            log.info("Unreachable group members with %s engine: %s" % (self.routing_engine.name,unreachable))
+        return result_min_tree
+    
+    def tree_cost(self,result_min_tree):
+        return routing_engines.tree_cost(self, result_min_tree)
+    
+    def construct_routes(self, result_min_tree,group_members):
+        return routing_engines.construct_routes(self, result_min_tree, group_members)
 
-def launch():
+def launch(routing_engine="prim", settle_window=None, settle_max_delay=1.0):
+    """ routing_engine: prim, reference, spt, kmb, tm or compare, see the routing_engines module,
+      settle_window: coalesce the link events for this many seconds (0 means until the event queue is idle),
+      settle_max_delay: the longest time a link event can wait in a coalesced batch. """
+    engine = routing_engines.get_engine(routing_engine)
+    
     graph_builder = GraphBuilder()
+    graph_builder.routing_engine = engine
+    if settle_window is not None:
+        graph_builder.settle_window = float(settle_window)
+        graph_builder.settle_max_delay = float(settle_max_delay)
     core.register("GraphBuilder",graph_builder)
     
\ No newline at end of file
@@ -0,0 +1,250 @@
+""" Compact, immutable snapshot of the GraphBuilder topology for large fabrics.
+
+  The dpids are mapped to dense integer ids, and the adjacency is stored in compressed sparse row (CSR) format in flat arrays:
+  the successors of the node with id i are targets[offsets[i]:offsets[i+1]], sorted by id, and the distances and the port pairs
+  of these links are at the same positions in the weights, from_ports and to_ports arrays.
+
+  The snapshot provides has_node, successors, successor_distances, get_distance and get_port_pair with dpids, like the
+  GraphBuilder, so the routing engines can run against it. A get_distance or get_port_pair searches the CSR row, which is
+  several times slower than the GraphBuilder's dict lookup; only expanding a whole node with successor_distances, two slices
+  of a row (the dpids of the targets are kept in a flat array at the positions of the targets), is cheaper than the dicts.
+  So the components look up the topology in the GraphBuilder itself, and the snapshot is only used where its size counts:
+  it is pickled to the route worker processes (see parallel_routes), which traverse it in bulk. The target dpid array is not pickled, it is rebuilt from the ids when the snapshot is loaded.
+  The snapshot is rebuilt for every topology version: the id mapping is kept, and only the rows of the changed nodes are
+  regenerated, the others are copied from the previous snapshot.
+
+  Run this module to compare its memory use and lookup cost with the dict representation:
+    python graph_snapshot.py [switches] [links per switch]
+  """
+import sys
+import random
+import time
+from array import array
+from bisect import bisect_left
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class GraphSnapshot(object):
+    def __init__(self, version, node_ids, node_dpids, present, offsets, targets, weights, from_ports, to_ports):
+        self.version = version
+        self.node_ids = node_ids
+        self.node_dpids = node_dpids
+        self.present = present
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.from_ports = from_ports
+        self.to_ports = to_ports
+        self.target_dpids = array('l', (node_dpids[to_id] for to_id in targets))
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop("target_dpids")
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.target_dpids = array('l', (self.node_dpids[to_id] for to_id in self.targets))
+
+    @classmethod
+    def build(cls, source, previous=None, dirty_nodes=None):
+        """ Builds the snapshot of the source graph (GraphBuilder), which has nodes, adjacency, distances, ports and version.
+         With a previous snapshot only the rows of the dirty nodes are read from the source. """
+        if previous is None or dirty_nodes is None:
+            node_ids = {}
+            node_dpids = []
+            dirty_nodes = None
+        else:
+            node_ids = dict(previous.node_ids)
+            node_dpids = list(previous.node_dpids)
+
+        succ = source.adjacency.succ
+        for node in source.nodes:
+            if node not in node_ids:
+                node_ids[node] = len(node_dpids)
+                node_dpids.append(node)
+        for node in succ:
+            if node not in node_ids:
+                node_ids[node] = len(node_dpids)
+                node_dpids.append(node)
+
+        present = bytearray(len(node_dpids))
+        for node in source.nodes:
+            present[node_ids[node]] = 1
+
+        offsets = array('i', [0])
+        targets = array('i')
+        weights = array('d')
+        from_ports = array('H')
+        to_ports = array('H')
+        for node_id,node in enumerate(node_dpids):
+            if dirty_nodes is not None and node not in dirty_nodes and node_id < len(previous.node_dpids):
+                start = previous.offsets[node_id]
+                end = previous.offsets[node_id+1]
+                targets.extend(previous.targets[start:end])
+                weights.extend(previous.weights[start:end])
+                from_ports.extend(previous.from_ports[start:end])
+                to_ports.extend(previous.to_ports[start:end])
+            else:
+                row = sorted((node_ids[to_node],to_node) for to_node in succ.get(node,()))
+                for to_id,to_node in row:
+                    edge = (node,to_node)
+                    targets.append(to_id)
+                    weights.append(source.distances[edge])
+                    from_ports.append(source.ports[edge][0])
+                    to_ports.append(source.ports[edge][1])
+            offsets.append(len(targets))
+
+        return cls(source.version, node_ids, node_dpids, present, offsets, targets, weights, from_ports, to_ports)
+
+    def _edge_index(self, from_node, to_node):
+        from_id = self.node_ids[from_node]
+        to_id = self.node_ids[to_node]
+        start = self.offsets[from_id]
+        end = self.offsets[from_id+1]
+        index = bisect_left(self.targets, to_id, start, end)
+        if index == end or self.targets[index] != to_id:
+            raise KeyError((from_node,to_node))
+        return index
+
+    def has_node(self, node):
+        node_id = self.node_ids.get(node)
+        return node_id is not None and self.present[node_id] == 1
+
+    def successors(self, node):
+        node_id = self.node_ids.get(node)
+        if node_id is None:
+            return ()
+        return self.target_dpids[self.offsets[node_id]:self.offsets[node_id+1]]
+
+    def successor_distances(self, node):
+        node_id = self.node_ids.get(node)
+        if node_id is None:
+            return ()
+        start = self.offsets[node_id]
+        end = self.offsets[node_id+1]
+        return zip(self.target_dpids[start:end], self.weights[start:end])
+
+    def get_distance(self, from_node, to_node):
+        return self.weights[self._edge_index(from_node, to_node)]
+
+    def get_port_pair(self, from_node, to_node):
+        index = self._edge_index(from_node, to_node)
+        return (self.from_ports[index],self.to_ports[index])
+
+    def num_edges(self):
+        return len(self.targets)
+
+    def memory_size(self):
+        """ Approximate size in bytes: the flat arrays and the dpid <-> id mapping. """
+        size = sys.getsizeof(self.present) + sys.getsizeof(self.node_ids) + sys.getsizeof(self.node_dpids)
+        for flat in (self.offsets,self.targets,self.target_dpids,self.weights,self.from_ports,self.to_ports):
+            size += flat.itemsize * len(flat)
+        return size
+
+    def as_numpy(self):
+        """ Zero copy NumPy views of the CSR arrays, None when NumPy is not installed. """
+        if numpy is None:
+            return None
+        return {"offsets":numpy.frombuffer(self.offsets, dtype=numpy.int32),
+                "targets":numpy.frombuffer(self.targets, dtype=numpy.int32),
+                "weights":numpy.frombuffer(self.weights, dtype=numpy.float64),
+                "from_ports":numpy.frombuffer(self.from_ports, dtype=numpy.uint16),
+                "to_ports":numpy.frombuffer(self.to_ports, dtype=numpy.uint16)}
+
+
+class _DictGraph(object):
+    """ The GraphBuilder's dict representation, only for the benchmark. """
+
+    class _Adjacency(object):
+        def __init__(self):
+            self.succ = {}
+
+    def __init__(self):
+        self.nodes = set()
+        self.adjacency = self._Adjacency()
+        self.distances = {}
+        self.ports = {}
+        self.version = 0
+
+    def add_link(self, from_node, from_port, to_node, to_port, distance):
+        self.nodes.add(from_node)
+        self.nodes.add(to_node)
+        self.adjacency.succ.setdefault(from_node,set()).add(to_node)
+        self.distances[(from_node,to_node)] = distance
+        self.ports[(from_node,to_node)] = (from_port,to_port)
+        self.version += 1
+
+    def successor_distances(self, node):
+        distances = self.distances
+        return [(to_node,distances[(node,to_node)]) for to_node in self.adjacency.succ.get(node,())]
+
+    def memory_size(self):
+        size = sys.getsizeof(self.nodes) + sys.getsizeof(self.adjacency.succ) + sys.getsizeof(self.distances) + sys.getsizeof(self.ports)
+        for node,to_nodes in self.adjacency.succ.iteritems():
+            size += sys.getsizeof(to_nodes)
+        for edge,port_pair in self.ports.iteritems():
+            size += 2 * sys.getsizeof(edge) + sys.getsizeof(port_pair)
+        return size
+
+
+def _benchmark(switches=10000, links_per_switch=4, lookups=200000):
+    random.seed(1)
+    dpids = random.sample(xrange(1, 2**48), switches)
+    graph = _DictGraph()
+    for index,dpid in enumerate(dpids):
+        graph.add_link(dpid, 1, dpids[(index+1) % switches], 2, 1)
+        graph.add_link(dpids[(index+1) % switches], 2, dpid, 1, 1)
+        for port in xrange(3, links_per_switch+1):
+            other = random.choice(dpids)
+            if other != dpid:
+                graph.add_link(dpid, port, other, port, random.randint(1, 10))
+                graph.add_link(other, port, dpid, port, random.randint(1, 10))
+
+    start = time.time()
+    snapshot = GraphSnapshot.build(graph)
+    build_time = time.time() - start
+
+    changed = random.sample(dpids, max(1, switches / 100))
+    for dpid in changed:
+        graph.add_link(dpid, 60000, random.choice(dpids), 60000, 5)
+    start = time.time()
+    GraphSnapshot.build(graph, snapshot, set(changed))
+    rebuild_time = time.time() - start
+
+    edges = random.sample(list(graph.distances.keys()), min(lookups, len(graph.distances)))
+    start = time.time()
+    for edge in edges:
+        graph.distances[edge]
+        graph.ports[edge]
+    dict_lookup = (time.time() - start) / len(edges)
+
+    snapshot = GraphSnapshot.build(graph)
+    start = time.time()
+    for from_node,to_node in edges:
+        snapshot.get_distance(from_node, to_node)
+        snapshot.get_port_pair(from_node, to_node)
+    snapshot_lookup = (time.time() - start) / len(edges)
+
+    nodes = random.sample(dpids, min(lookups / links_per_switch, switches))
+    start = time.time()
+    for node in nodes:
+        graph.successor_distances(node)
+    dict_expand = (time.time() - start) / len(nodes)
+    start = time.time()
+    for node in nodes:
+        snapshot.successor_distances(node)
+    snapshot_expand = (time.time() - start) / len(nodes)
+
+    print("switches: %d, links: %d" % (switches,len(graph.distances)))
+    print("memory:  dict %.1f MB, snapshot %.1f MB" % (graph.memory_size() / 1e6,snapshot.memory_size() / 1e6))
+    print("lookup:  dict %.2f us, snapshot %.2f us (distance + ports)" % (dict_lookup * 1e6,snapshot_lookup * 1e6))
+    print("expand:  dict %.2f us, snapshot %.2f us (successor_distances of a node)" % (dict_expand * 1e6,snapshot_expand * 1e6))
+    print("build:   full %.1f ms, incremental with %d changed switches %.1f ms" % (build_time * 1e3,len(changed),rebuild_time * 1e3))
+
+if __name__ == "__main__":
+    _benchmark(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,107 @@
+""" Link utilization monitor. It polls the port statistics of every switch periodically, and computes a smoothed (exponentially
+  weighted moving average) utilization of the links from the transmitted bytes of the links' source ports.
+
+  The utilization is mapped to load levels with hysteresis: a link goes up a level when its utilization is above the level's
+  threshold, and goes back only when it falls below the threshold minus the hysteresis. The distance of a link in the
+  GraphBuilder is 1 + level * weight_step, so the trees are recomputed only when a link changes its level, not on every poll.
+  """
+import time
+from pox.core import core
+import pox.openflow.libopenflow_01 as of
+from pox.lib.recoco import Timer
+
+log = core.getLogger()
+
+class LinkUtilizationMonitor(object):
+    def __init__(self, interval=5.0, capacity_mbps=100.0, smoothing=0.3, thresholds=(0.3,0.6,0.85), hysteresis=0.1, weight_step=1):
+        self.interval = interval
+        self.capacity = capacity_mbps * 1000000.0
+        self.smoothing = smoothing
+        self.thresholds = thresholds
+        self.hysteresis = hysteresis
+        self.weight_step = weight_step
+
+        self.graph_builder = None
+        self.poll_timer = None
+        """ Per (dpid,port) sample: {"tx_bytes":, "time":, "utilization":} and per (from_node,to_node) link load level """
+        self.samples = {}
+        self.levels = {}
+
+        core.listen_to_dependencies(self, ['GraphBuilder'])
+        core.openflow.addListeners(self)
+
+    def _all_dependencies_met(self):
+        self.graph_builder = core.GraphBuilder
+        self.graph_builder.weight_function = self.link_weight
+        self.poll_timer = Timer(self.interval, self.poll, recurring=True)
+
+    def link_weight(self, from_node, to_node):
+        return 1 + self.levels.get((from_node,to_node), 0) * self.weight_step
+
+    def poll(self):
+        for connection in core.openflow.connections:
+            connection.send(of.ofp_stats_request(body=of.ofp_port_stats_request()))
+
+    def next_level(self, level, utilization):
+        while level < len(self.thresholds) and utilization > self.thresholds[level]:
+            level += 1
+        while level > 0 and utilization < self.thresholds[level-1] - self.hysteresis:
+            level -= 1
+        return level
+
+    def _handle_PortStatsReceived(self, event):
+        if self.graph_builder is None:
+            return
+
+        now = time.time()
+        dpid = event.connection.dpid
+        changed_links = set()
+        for port_stats in event.stats:
+            key = (dpid,port_stats.port_no)
+            sample = self.samples.get(key)
+            if sample is None:
+                self.samples[key] = {"tx_bytes":port_stats.tx_bytes, "time":now, "utilization":0.0}
+                continue
+            self.samples[key] = {"tx_bytes":port_stats.tx_bytes, "time":now, "utilization":sample["utilization"]}
+
+            elapsed = now - sample["time"]
+            sent = port_stats.tx_bytes - sample["tx_bytes"]
+            if elapsed <= 0 or sent < 0:
+                continue
+
+            utilization = sent * 8 / elapsed / self.capacity
+            utilization = self.smoothing * utilization + (1 - self.smoothing) * sample["utilization"]
+            self.samples[key]["utilization"] = utilization
+
+            link = self.graph_builder.get_link_by_port(dpid, port_stats.port_no)
+            if link is None:
+                continue
+
+            level = self.levels.get(link, 0)
+            new_level = self.next_level(level, utilization)
+            if new_level != level:
+                log.info("Link %s utilization %.2f, load level %d -> %d" % (link,utilization,level,new_level))
+                self.levels[link] = new_level
+                changed_links.add(link)
+
+        if len(changed_links) != 0:
+            self.graph_builder.update_link_weights(changed_links)
+
+    def get_utilizations(self):
+        utilizations = {}
+        for key,sample in self.samples.iteritems():
+            link = None
+            if self.graph_builder is not None:
+                link = self.graph_builder.get_link_by_port(key[0], key[1])
+            if link is not None:
+                utilizations[link] = {"utilization":sample["utilization"], "level":self.levels.get(link, 0)}
+        return utilizations
+
+def launch(interval=5, capacity_mbps=100, smoothing=0.3, thresholds="0.3,0.6,0.85", hysteresis=0.1, weight_step=1):
+    """ interval: port statistics polling period in seconds, capacity_mbps: link capacity for the utilization,
+      smoothing: weight of the new sample in the moving average, thresholds: comma separated utilization level thresholds,
+      hysteresis: how far below a threshold the utilization has to go to step a level back, weight_step: distance per level. """
+    thresholds = tuple(sorted(float(threshold) for threshold in str(thresholds).split(",")))
+    link_utilization_monitor = LinkUtilizationMonitor(float(interval), float(capacity_mbps), float(smoothing), thresholds,
+                                                      float(hysteresis), int(weight_step))
+    core.register("LinkUtilizationMonitor", link_utilization_monitor)
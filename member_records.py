@@ -0,0 +1,165 @@
+""" Compact records of the IGMP member states, used by the MemberStateBuilder instead of nested dicts.
+
+  - the modes are the integers INCLUDE and EXCLUDE,
+  - the source sets are frozensets, and every empty source set (the IGMPv2 joins) is the shared EMPTY_SOURCES,
+  - the states are MemberState objects with __slots__,
+  - the member ports of a switch below BITMAP_PORTS are stored as a bitmap, so the membership test of a port is a shift,
+    the higher port numbers (like OFPP_LOCAL) are kept in a set, so the bitmaps stay small integers.
+
+  Run it as a script for a memory comparison with the dict layout: python member_records.py [memberships] [groups]
+  """
+import random
+import sys
+import time
+
+INCLUDE = 0
+EXCLUDE = 1
+MODE_NAMES = ("INCLUDE","EXCLUDE")
+
+EMPTY_SOURCES = frozenset()
+
+BITMAP_PORTS = 64
+
+def make_source_set(sources):
+    if len(sources) == 0:
+        return EMPTY_SOURCES
+    return frozenset(sources)
+
+
+class MemberState(object):
+    __slots__ = ("mode","source_set","last_seen")
+
+    def __init__(self, mode, source_set=EMPTY_SOURCES, last_seen=0.0):
+        self.mode = mode
+        self.source_set = make_source_set(source_set)
+        self.last_seen = last_seen
+
+    def accepts(self, source):
+        if self.mode == INCLUDE:
+            return source in self.source_set
+        return source not in self.source_set
+
+    def same_state(self, mode, source_set):
+        return self.mode == mode and self.source_set == source_set
+
+    def __repr__(self):
+        return "%s%s" % (MODE_NAMES[self.mode],sorted(str(source) for source in self.source_set))
+
+
+class GroupRecord(object):
+    """ members: {dpid:bitmap of the ports below BITMAP_PORTS}, high_ports: None or {dpid:set(ports)} of the other ports,
+     member_states: {(dpid,port):MemberState} """
+    __slots__ = ("members","high_ports","member_states")
+
+    def __init__(self):
+        self.members = {}
+        self.high_ports = None
+        self.member_states = {}
+
+    def has_member(self, dpid, port):
+        if port >= BITMAP_PORTS:
+            return self.high_ports is not None and port in self.high_ports.get(dpid, ())
+        return (self.members.get(dpid, 0) >> port) & 1 == 1
+
+    def set_member(self, dpid, port, member_state):
+        if port >= BITMAP_PORTS:
+            if self.high_ports is None:
+                self.high_ports = {}
+            self.high_ports.setdefault(dpid, set()).add(port)
+        else:
+            self.members[dpid] = self.members.get(dpid, 0) | (1 << port)
+        self.member_states[(dpid,port)] = member_state
+
+    def remove_member(self, dpid, port):
+        """ False if the member was not found """
+        if not self.has_member(dpid, port):
+            return False
+        if port >= BITMAP_PORTS:
+            self.high_ports[dpid].remove(port)
+            if len(self.high_ports[dpid]) == 0:
+                self.high_ports.pop(dpid)
+                if len(self.high_ports) == 0:
+                    self.high_ports = None
+        else:
+            bitmap = self.members[dpid] & ~(1 << port)
+            if bitmap == 0:
+                self.members.pop(dpid)
+            else:
+                self.members[dpid] = bitmap
+        self.member_states.pop((dpid,port))
+        return True
+
+    def is_empty(self):
+        return len(self.members) == 0 and self.high_ports is None
+
+    def __repr__(self):
+        return repr(self.member_states)
+
+
+def _deep_size(obj, seen=None):
+    """ Size of the object and everything it references, the shared objects are counted once """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key,value in obj.iteritems():
+            size += _deep_size(key, seen) + _deep_size(value, seen)
+    elif isinstance(obj, (list,tuple,set,frozenset)):
+        for item in obj:
+            size += _deep_size(item, seen)
+    elif hasattr(obj, "__slots__"):
+        for name in obj.__slots__:
+            size += _deep_size(getattr(obj, name), seen)
+    return size
+
+def _benchmark(memberships=100000, groups=5000, switches=100, ports=48):
+    random.seed(1)
+    sources = ["10.0.%d.%d" % (index / 256,index % 256) for index in xrange(1000)]
+    addresses = ["239.%d.%d.%d" % (index / 65536,index / 256 % 256,index % 256) for index in xrange(groups)]
+    members = []
+    for index in xrange(memberships):
+        source_set = ()
+        mode = EXCLUDE
+        if random.random() < 0.2:
+            mode = INCLUDE
+            source_set = tuple(random.sample(sources, random.randint(1, 2)))
+        members.append((addresses[index % groups],random.randint(1, switches),random.randint(1, ports),mode,source_set))
+    now = time.time()
+
+    start = time.time()
+    dict_groups = {}
+    for address,dpid,port,mode,source_set in members:
+        group_rec = dict_groups.setdefault(address, {"members":{}, "member_states":{}})
+        if port not in group_rec["members"].setdefault(dpid, []):
+            group_rec["members"][dpid].append(port)
+        group_rec["member_states"][(dpid,port)] = {"mode":MODE_NAMES[mode], "source_set":set(source_set), "last_seen":now}
+    dict_time = time.time() - start
+
+    start = time.time()
+    record_groups = {}
+    for address,dpid,port,mode,source_set in members:
+        group_rec = record_groups.get(address)
+        if group_rec is None:
+            group_rec = record_groups[address] = GroupRecord()
+        group_rec.set_member(dpid, port, MemberState(mode, source_set, now))
+    record_time = time.time() - start
+
+    stored = sum(len(group_rec.member_states) for group_rec in record_groups.itervalues())
+    shared = set()
+    for address in addresses:
+        _deep_size(address, shared)
+    for source in sources:
+        _deep_size(source, shared)
+    dict_size = _deep_size(dict_groups, set(shared))
+    record_size = _deep_size(record_groups, set(shared))
+
+    print("memberships: %d (%d distinct), groups: %d" % (memberships,stored,groups))
+    print("memory: dicts %.1f MB (%d B/member), records %.1f MB (%d B/member)" % (dict_size / 1e6,dict_size / stored,
+                                                                              record_size / 1e6,record_size / stored))
+    print("build:  dicts %.2f s, records %.2f s" % (dict_time,record_time))
+
+if __name__ == "__main__":
+    _benchmark(*[int(arg) for arg in sys.argv[1:3]])
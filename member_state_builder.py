@@ -1,10 +1,18 @@
+import time
 from pox.core import core
 import pox.openflow.libopenflow_01 as of
 import pox.lib.packet as pkt
+from pox.lib.addresses import IPAddr,EthAddr
 from pox.lib.revent import Event,EventHalt,EventMixin
+from pox.lib.recoco import Timer
+from pipeline_stats import stats
+from event_journal import journal
+from timer_wheel import TimerWheel
+from member_records import INCLUDE,EXCLUDE,MemberState,GroupRecord,make_source_set
 
 log = core.getLogger()
 
+MEMBERSHIP_QUERY     = 0x11
 MEMBERSHIP_REPORT_V2 = 0x16
 LEAVE_GROUP_V2       = 0x17
 MEMBERSHIP_REPORT_V3 = 0x22
@@ -16,15 +24,21 @@ CHANGE_TO_EXCLUDE_MODE = 4
 ALLOW_NEW_SOURCES = 5
 BLOCK_OLD_SOURCES = 6
 
+IGMP_ALL_HOSTS = IPAddr("224.0.0.1")
+IGMP_ALL_HOSTS_MAC = EthAddr("01:00:5e:00:00:01")
+QUERIER_MAC = EthAddr("02:00:00:00:00:01")
+ROBUSTNESS = 2
+
 
 class PassiveGroupStateChanged(Event):
     def __str__ (self):
         return "Passive group with IP: %s status changed",self.group_key
     
-    def __init__ (self,address,member_state_builder):
+    def __init__ (self,address,member_state_builder,changed_members=None):
         super(PassiveGroupStateChanged,self).__init__()
         self.address = address
         self.member_state_builder = member_state_builder
+        self.changed_members = changed_members
         
     def get_member_state_builder(self):
         return self.member_state_builder
@@ -32,6 +46,10 @@ class PassiveGroupStateChanged(Event):
     def get_group_addr(self):
         return self.address
     
+    def get_changed_members(self):
+        """ The (dpid,port) pairs whose state changed, None if unknown """
+        return self.changed_members
+    
 class PassiveGroupDeleted(Event):
     def __str__ (self):
         return "Passive group with IP: %s deleted",self.group_key
@@ -49,14 +67,52 @@ class PassiveGroupDeleted(Event):
     
 class MemberStateBuilder(EventMixin):
     """The group data is stored in format:
-       self.group_record = {"members":{}, "member_states":{(dpid,port):{"mode": "EXCLUDE/INCLUDE","source_set":set()}}}
-       self.groups = {"ipaddress":self.group_record}
+       self.groups = {"ipaddress":GroupRecord}, where GroupRecord.members = {dpid:port bitmap} (the ports from BITMAP_PORTS in GroupRecord.high_ports),
+       GroupRecord.member_states = {(dpid,port):MemberState(INCLUDE/EXCLUDE, frozenset of sources, last seen time)}
+       
+       The members accepting a source are indexed per group:
+       self.source_index = {"ipaddress":{"any":set((dpid,port)), "accepting":{source:set((dpid,port))}, "views":{source:({dpid:[ports]},fingerprint)}}}
+       any: the EXCLUDE mode members, which accept every source not in their source set,
+       accepting: the members accepting the source, kept for every source of an INCLUDE set and for every queried source,
+       views: the member dicts returned by get_valid_group_members, they are rebuilt only when the accepting set changes,
+       so an unchanged member set is returned as the same object. The views must not be modified by the callers. The
+       fingerprint of a view is the frozenset of its (dpid,port) pairs, two member sets are the same if their fingerprints are.
+       
+       With a membership_interval the members which are not refreshed by a report in time are expired. Every member is
+       in a timer wheel at most once: when its timer expires and it was refreshed meanwhile, it is scheduled again to its
+       new deadline. The expired members are removed in one batch, with one event per group. The optional querier sends the
+       general queries, spread over the query interval, to the host ports of the switches.
+       
+       An IGMP packet is handled as one transaction: the first state of every touched member is saved, and when the whole
+       packet is applied, one event is raised for every group whose member states differ from their saved states. So the
+       records of a report which cancel each other out (allow then block of the same source) raise no event.
        """
     _eventMixin_events = set([PassiveGroupStateChanged,PassiveGroupDeleted])
     _rule_priority_adjustment = -0x1000 
     
-    def __init__(self):
+    def __init__(self, membership_interval=0, query_interval=0, query_response_time=10, querier_address="0.0.0.0"):
         self.groups = {}
+        self.source_index = {}
+        """ effective: updates which changed the member states, suppressed: refreshes and leaves which changed nothing """
+        self.update_stats = {"effective":0, "suppressed":0, "cancelled":0}
+        self.transaction = None
+        
+        self.membership_interval = membership_interval
+        self.aging_wheel = None
+        self.aging_scheduled = set()
+        self.aging_stats = {"expired":0, "expiry_batches":0, "rescheduled":0, "queries":0}
+        if membership_interval > 0:
+            self.aging_wheel = TimerWheel(1.0, now=time.time())
+            self.aging_timer = Timer(1.0, self.expire_members, recurring=True)
+        
+        self.query_interval = float(query_interval)
+        self.query_response_time = query_response_time
+        self.querier_address = IPAddr(querier_address)
+        self.query_ports = []
+        self.query_cursor = 0
+        self.query_credit = 0.0
+        if query_interval > 0:
+            self.query_timer = Timer(1.0, self.send_queries, recurring=True)
         
         core.addListeners(self)
         core.openflow.addListeners(self)
@@ -69,157 +125,366 @@ class MemberStateBuilder(EventMixin):
             dictionary.update({key:[item]})
         return dictionary
         
+    def _materialize_source(self,address,source):
+        index = self.source_index[address]
+        member_states = self.groups[address].member_states
+        accepting = set(member for member in index["any"] if source not in member_states[member].source_set)
+        for member,member_state in member_states.iteritems():
+            if member_state.mode == INCLUDE and source in member_state.source_set:
+                accepting.add(member)
+        index["accepting"][source] = accepting
+        return accepting
+    
+    def index_member_state(self,address,member,member_state):
+        """ Updates the source index after the state of one member changed, member_state is None when the member left """
+        if member_state is None and address not in self.groups:
+            self.source_index.pop(address, None)
+            return
+        index = self.source_index.setdefault(address, {"any":set(), "accepting":{}, "views":{}})
+        
+        if member_state is not None and member_state.mode == EXCLUDE:
+            index["any"].add(member)
+        else:
+            index["any"].discard(member)
+        
+        sources = set(index["accepting"].keys())
+        if member_state is not None and member_state.mode == INCLUDE:
+            sources.update(member_state.source_set)
+        for source in sources:
+            if source not in index["accepting"]:
+                self._materialize_source(address, source)
+                index["views"].pop(source, None)
+                continue
+            accepting = index["accepting"][source]
+            if member_state is not None and member_state.accepts(source):
+                if member in accepting:
+                    continue
+                accepting.add(member)
+            else:
+                if member not in accepting:
+                    continue
+                accepting.discard(member)
+                if len(accepting) == 0:
+                    index["accepting"].pop(source)
+            index["views"].pop(source, None)
+    
+    def get_accepting_members(self,address,source):
+        """ The set of (dpid,port) pairs accepting the source, it must not be modified """
+        index = self.source_index[address]
+        if source in index["accepting"]:
+            return index["accepting"][source]
+        return self._materialize_source(address, source)
+    
+    def get_any_source_members(self,address):
+        return self.source_index[address]["any"]
+        
+    def _get_view(self,address,source):
+        index = self.source_index[address]
+        view = index["views"].get(source)
+        if view is None:
+            accepting = self.get_accepting_members(address, source)
+            group_members = {}
+            for dpid,port in accepting:
+                group_members = self._add_member_to_dict(group_members, dpid, port)
+            for ports in group_members.itervalues():
+                ports.sort()
+            view = index["views"][source] = (group_members,frozenset(accepting))
+        return view
+    
     def get_valid_group_members(self,address,source):
-        group_rec = self.groups[address]
-        group_members = {}
-        
-        for switch_data in group_rec["members"].iteritems():
-            for port in switch_data[1]:
-                dpid = switch_data[0]
-                member_state = group_rec["member_states"][(dpid,port)]
-                if member_state["mode"] == "INCLUDE":
-                    if address in member_state["source_set"]:
-                        group_members = self._add_member_to_dict(group_members, dpid, port)
-                else:
-                    if address not in member_state["source_set"]:
-                        group_members = self._add_member_to_dict(group_members, dpid, port)
-
+        timer = stats.start("valid_members")
+        group_members = self._get_view(address, source)[0]
+        stats.stop(timer)
         return group_members            
+    
+    def get_member_fingerprint(self,address,source):
+        """ Frozenset of the (dpid,port) pairs of get_valid_group_members """
+        return self._get_view(address, source)[1]
                  
-    def raise_event_modified(self,address):
-        ev = PassiveGroupStateChanged(address,self)
-        log.info("Raised a modified event")
+    def begin_transaction(self):
+        if self.transaction is not None:
+            self.commit_transaction()
+        self.transaction = {}
+    
+    def _track_member(self,address,member):
+        """ Saves the state of the member before its first change in the transaction """
+        if self.transaction is None:
+            return
+        changes = self.transaction.setdefault(address, {})
+        if member not in changes:
+            group_rec = self.groups.get(address)
+            changes[member] = group_rec.member_states.get(member) if group_rec is not None else None
+    
+    def commit_transaction(self):
+        transaction = self.transaction
+        self.transaction = None
+        for address,changes in transaction.iteritems():
+            group_rec = self.groups.get(address)
+            changed_members = set()
+            touched = False
+            for member,before in changes.iteritems():
+                after = group_rec.member_states.get(member) if group_rec is not None else None
+                if before is after:
+                    continue
+                touched = True
+                if before is not None and after is not None and after.same_state(before.mode, before.source_set):
+                    continue
+                changed_members.add(member)
+            
+            if len(changed_members) == 0:
+                if touched:
+                    self.update_stats["cancelled"] += 1
+            elif group_rec is None:
+                self.raise_event_deleted(address)
+            else:
+                self.raise_event_modified(address, changed_members)
+    
+    def raise_event_modified(self,address,changed_members=None):
+        stats.count("member_events")
+        ev = PassiveGroupStateChanged(address,self,changed_members)
+        journal.record("member", "Group %s modified", address)
         self.raiseEvent(ev)
         
     def raise_event_deleted(self,address):
         ev = PassiveGroupDeleted(address,self)
-        log.info("Raised a deleted event")
+        journal.record("member", "Group %s deleted", address)
         self.raiseEvent(ev)
         
     def update_group_member_states(self,event,address,mode,source_set):
-        if len(source_set) == 0 and mode == "INCLUDE":
-            log.info("To be deleted, before state of groups: "+str(self.groups))
+        timer = stats.start("member_update")
+        self._track_member(address, (event.dpid,event.port))
+        if len(source_set) == 0 and mode == INCLUDE:
+            journal.state("member", "Groups before delete", lambda: self.groups)
             has_to_be_deleted = self.del_member(event, address)
-            log.info("After the groups: "+str(self.groups))
+            if has_to_be_deleted is not None:
+                self.index_member_state(address, (event.dpid,event.port), None)
+            journal.state("member", "Groups after delete", lambda: self.groups)
+            stats.stop(timer)
+            if has_to_be_deleted is None:
+                self.update_stats["suppressed"] += 1
+                journal.record("member", "Leave of unknown member %s:%s for %s", event.dpid, event.port, address)
+                return
+            self.update_stats["effective"] += 1
+            if self.transaction is not None:
+                return
             if has_to_be_deleted is True:
                 self.raise_event_deleted(address)
-            elif has_to_be_deleted is False:
-                self.raise_event_modified(address)
-            elif has_to_be_deleted is None:
-                log.info("Bad packet,data to be deleted not found")
+            else:
+                self.raise_event_modified(address, set([(event.dpid,event.port)]))
             return
         
-        log.info("Update group status, groups before: "+str(self.groups))
-        if self.groups.has_key(address):
-            if self.groups[address]["members"].has_key(event.dpid):
-                if event.port not in self.groups[address]["members"][event.dpid]:
-                    self.groups[address]["members"][event.dpid].append(event.port)
-                    member_state = {(event.dpid,event.port):{"mode": mode, "source_set":source_set}}
-                    self.groups[address]["member_states"].update(member_state)
-                                
-            else:
-                self.groups[address]["members"].update({event.dpid:[event.port]})
-                member_state = {(event.dpid,event.port):{"mode": mode, "source_set":source_set}}
-                self.groups[address]["member_states"].update(member_state)
-                            
-        else:
-            group_rec = {"members":{event.dpid:[event.port]}, "member_states":{(event.dpid,event.port):{"mode": mode,"source_set":source_set}}}
-            self.groups.update({address:group_rec})
+        journal.state("member", "Groups before update", lambda: self.groups)
+        now = time.time()
+        source_set = make_source_set(source_set)
+        group_rec = self.groups.get(address)
+        if group_rec is None:
+            group_rec = self.groups[address] = GroupRecord()
+        
+        member_state = group_rec.member_states.get((event.dpid,event.port))
+        if member_state is not None and member_state.same_state(mode, source_set):
+            """ Refresh of an unchanged state, only the last seen time is updated """
+            member_state.last_seen = now
+            self.update_stats["suppressed"] += 1
+            stats.stop(timer)
+            return
+        
+        member_state = MemberState(mode, source_set, now)
+        group_rec.set_member(event.dpid, event.port, member_state)
             
-        log.info("Update group status, groups after: "+str(self.groups))    
-        self.raise_event_modified(address)
+        self.index_member_state(address, (event.dpid,event.port), member_state)
+        self.schedule_aging(address, (event.dpid,event.port), now)
+        self.update_stats["effective"] += 1
+        journal.state("member", "Groups after update", lambda: self.groups)
+        stats.stop(timer)
+        if self.transaction is None:
+            self.raise_event_modified(address, set([(event.dpid,event.port)]))
+
+    def get_update_stats(self):
+        return dict(self.update_stats)
 
     def del_member(self,event,address):
-        log.info("Delete invoked")
-        if self.groups.has_key(address):
-            if self.groups[address]["members"].has_key(event.dpid):
-                if event.port in self.groups[address]["members"][event.dpid]:
-                    port_index_to_del = self.groups[address]["members"][event.dpid].index(event.port)
-                    del self.groups[address]["members"][event.dpid][port_index_to_del]
-                                
-                    self.groups[address]["member_states"].pop((event.dpid,event.port))
-                                
-                    if len(self.groups[address]["members"][event.dpid]) == 0:
-                        self.groups[address]["members"].pop(event.dpid)
-                        
-                    if len(self.groups[address]["members"].keys()) == 0:
-                        self.groups.pop(address)
-                        return True
-                    return False
-        return None
+        return self.remove_member(address, event.dpid, event.port)
+    
+    def remove_member(self,address,dpid,port):
+        """ True if the group was deleted with the member, False if only the member, None if the member was not found """
+        group_rec = self.groups.get(address)
+        if group_rec is None or not group_rec.remove_member(dpid, port):
+            return None
+        if group_rec.is_empty():
+            self.groups.pop(address)
+            return True
+        return False
+    
+    def schedule_aging(self,address,member,now):
+        if self.aging_wheel is None or (address,member) in self.aging_scheduled:
+            return
+        self.aging_scheduled.add((address,member))
+        self.aging_wheel.schedule((address,member), now + self.membership_interval)
+    
+    def expire_members(self, now=None):
+        if now is None:
+            now = time.time()
+        
+        changed = {}
+        for address,member in self.aging_wheel.advance(now):
+            self.aging_scheduled.discard((address,member))
+            group_rec = self.groups.get(address)
+            if group_rec is None or member not in group_rec.member_states:
+                continue
+            deadline = group_rec.member_states[member].last_seen + self.membership_interval
+            if deadline > now:
+                self.aging_scheduled.add((address,member))
+                self.aging_wheel.schedule((address,member), deadline)
+                self.aging_stats["rescheduled"] += 1
+                continue
+            
+            self.remove_member(address, member[0], member[1])
+            self.index_member_state(address, member, None)
+            changed.setdefault(address,set()).add(member)
+        
+        if len(changed) == 0:
+            return
+        self.aging_stats["expired"] += sum(len(members) for members in changed.itervalues())
+        self.aging_stats["expiry_batches"] += 1
+        journal.record("member", "%d members of %d groups expired", sum(len(members) for members in changed.itervalues()), len(changed))
+        for address,members in changed.iteritems():
+            if address in self.groups:
+                self.raise_event_modified(address, members)
+            else:
+                self.raise_event_deleted(address)
+    
+    def get_aging_stats(self):
+        aging_stats = dict(self.aging_stats)
+        aging_stats["scheduled"] = len(self.aging_scheduled)
+        return aging_stats
+    
+    def _handle_ConnectionUp(self,event):
+        if self.query_interval <= 0:
+            return
+        self.query_ports = [(dpid,port) for dpid,port in self.query_ports if dpid != event.dpid]
+        for port in event.ofp.ports:
+            if port.port_no < of.OFPP_MAX:
+                self.query_ports.append((event.dpid,port.port_no))
+    
+    def _handle_ConnectionDown(self,event):
+        self.query_ports = [(dpid,port) for dpid,port in self.query_ports if dpid != event.dpid]
+    
+    def send_queries(self):
+        """ Called every second, it queries the next slice of the ports, so every port is queried once per query interval """
+        if len(self.query_ports) == 0:
+            return
+        self.query_credit = min(self.query_credit + len(self.query_ports) / self.query_interval, len(self.query_ports))
+        count = int(self.query_credit)
+        self.query_credit -= count
+        for i in xrange(count):
+            if self.query_cursor >= len(self.query_ports):
+                self.query_cursor = 0
+            dpid,port = self.query_ports[self.query_cursor]
+            self.query_cursor += 1
+            """ Ports of the switch links are not queried """
+            if core.hasComponent("GraphBuilder") and core.GraphBuilder.get_link_by_port(dpid, port) is not None:
+                continue
+            self.send_general_query(dpid, port)
+    
+    def send_general_query(self,dpid,port):
+        igmp_packet = pkt.igmp()
+        igmp_packet.ver_and_type = MEMBERSHIP_QUERY
+        igmp_packet.max_response_time = int(self.query_response_time * 10)
+        igmp_packet.address = IPAddr("0.0.0.0")
+        
+        ip_packet = pkt.ipv4(protocol=pkt.ipv4.IGMP_PROTOCOL, srcip=self.querier_address, dstip=IGMP_ALL_HOSTS)
+        ip_packet.ttl = 1
+        ip_packet.payload = igmp_packet
+        eth_packet = pkt.ethernet(type=pkt.ethernet.IP_TYPE, src=QUERIER_MAC, dst=IGMP_ALL_HOSTS_MAC)
+        eth_packet.payload = ip_packet
+        
+        msg = of.ofp_packet_out(data=eth_packet.pack(), action=of.ofp_action_output(port=port))
+        core.openflow.sendToDPID(dpid, msg)
+        self.aging_stats["queries"] += 1
                 
                 
     def _handle_PacketIn(self,event):
+        """ The parse stage is measured for every PacketIn, the igmp_packet_in stage for the IGMP packets from the end of the
+         parsing """
+        timer = stats.start("parse")
         packet = event.parsed
         
         if packet.type == pkt.ethernet.IP_TYPE:
             ip_packet = packet.payload
             if ip_packet.protocol == ip_packet.IGMP_PROTOCOL:
                 igmp_packet = ip_packet.next
-                log.info("Groups before packet handling: "+str(self.groups))
+                stats.stop(timer)
+                packet_timer = stats.start("igmp_packet_in")
+                stats.count("igmp_packets")
+                journal.state("igmp", "Groups before packet", lambda: self.groups)
+                self.begin_transaction()
                 if igmp_packet.ver_and_type == MEMBERSHIP_REPORT_V2:
-                    self.update_group_member_states(event, igmp_packet.address, "EXCLUDE", set())
+                    journal.record("igmp", "Report v2 on %s:%s for %s", event.dpid, event.port, igmp_packet.address)
+                    self.update_group_member_states(event, igmp_packet.address, EXCLUDE, set())
                         
                 elif igmp_packet.ver_and_type == LEAVE_GROUP_V2:
-                    self.update_group_member_states(event, igmp_packet.address, "INCLUDE", set())
+                    journal.record("igmp", "Leave v2 on %s:%s for %s", event.dpid, event.port, igmp_packet.address)
+                    self.update_group_member_states(event, igmp_packet.address, INCLUDE, set())
                                 
                 elif igmp_packet.ver_and_type == MEMBERSHIP_REPORT_V3:
-                    log.info("IGMPv3 packet")
+                    journal.record("igmp", "Report v3 on %s:%s with %d records", event.dpid, event.port, igmp_packet.grp_num)
 
                     for i in xrange(igmp_packet.grp_num):
                         actual_group_rec = igmp_packet.grp_rec[i]
-                        log.info("Actual group rec addr: "+str(actual_group_rec.address))
-                        log.info("Actaul group src set: "+str(actual_group_rec.src_addr))
-                        log.info("Actual group rec type: "+str(actual_group_rec.type))
+                        journal.record("igmp", "Record type %d for %s with %d sources", actual_group_rec.type, actual_group_rec.address, len(actual_group_rec.src_addr))
                         address = actual_group_rec.address
                         source_set =  set(actual_group_rec.src_addr)
                                               
                         if actual_group_rec.type == MODE_IS_INCLUDE:
-                            log.info("Mode is include")
-                            self.update_group_member_states(event, address, "INCLUDE",source_set)
+                            self.update_group_member_states(event, address, INCLUDE,source_set)
                         
                         if actual_group_rec.type == MODE_IS_EXCLUDE:
-                            log.info("Mode is exclude")
-                            self.update_group_member_states(event, address, "EXCLUDE", source_set)
+                            self.update_group_member_states(event, address, EXCLUDE, source_set)
                         
                         if actual_group_rec.type == CHANGE_TO_INCLUDE_MODE:
-                            log.info("Change to include")
-                            self.update_group_member_states(event, address, "INCLUDE", source_set)
+                            self.update_group_member_states(event, address, INCLUDE, source_set)
                         
                         if actual_group_rec.type == CHANGE_TO_EXCLUDE_MODE:
-                            log.info("Change to exclude")
-                            self.update_group_member_states(event, address, "EXCLUDE", source_set)
+                            self.update_group_member_states(event, address, EXCLUDE, source_set)
                         
                         if actual_group_rec.type == ALLOW_NEW_SOURCES:
-                            log.info("Allow new sources")
                             try:
-                                member_state = self.groups[address]["member_states"][(event.dpid,event.port)]
+                                member_state = self.groups[address].member_states[(event.dpid,event.port)]
                             except KeyError:
-                                member_state = {"mode": "INCLUDE", "source_set":set()}
+                                member_state = MemberState(INCLUDE)
                                    
-                            if member_state["mode"] == "EXCLUDE":
-                                source_set = member_state["source_set"].difference(source_set)
-                                self.update_group_member_states(event, address, "EXCLUDE", source_set)
+                            if member_state.mode == EXCLUDE:
+                                source_set = member_state.source_set.difference(source_set)
+                                self.update_group_member_states(event, address, EXCLUDE, source_set)
                             else:
-                                source_set = member_state["source_set"].union(source_set)
-                                self.update_group_member_states(event, address, "INCLUDE", source_set)
+                                source_set = member_state.source_set.union(source_set)
+                                self.update_group_member_states(event, address, INCLUDE, source_set)
   
                         if actual_group_rec.type == BLOCK_OLD_SOURCES:
-                            log.info("Block old sources")
                             try:
-                                member_state = self.groups[address]["member_states"][(event.dpid,event.port)]
+                                member_state = self.groups[address].member_states[(event.dpid,event.port)]
                             except KeyError:
-                                member_state = {"mode": "INCLUDE", "source_set":set()}
+                                member_state = MemberState(INCLUDE)
                                 
-                            if member_state["mode"] == "EXCLUDE":
-                                source_set = member_state["source_set"].union(source_set)
-                                self.update_group_member_states(event, address, "EXCLUDE", source_set)
+                            if member_state.mode == EXCLUDE:
+                                source_set = member_state.source_set.union(source_set)
+                                self.update_group_member_states(event, address, EXCLUDE, source_set)
                             else:
-                                source_set = member_state["source_set"].difference(source_set)
-                                self.update_group_member_states(event, address, "INCLUDE", source_set)
-                log.info("Groups after packet handling: "+str(self.groups))          
+                                source_set = member_state.source_set.difference(source_set)
+                                self.update_group_member_states(event, address, INCLUDE, source_set)
+                self.commit_transaction()
+                journal.state("igmp", "Groups after packet", lambda: self.groups)
+                stats.stop(packet_timer)
                 return EventHalt
+        stats.stop(timer)
                                 
-def launch():
-    member_state_builder = MemberStateBuilder()
+def launch(membership_interval=None, query_interval=0, query_response_time=10, querier_address="0.0.0.0"):
+    """ membership_interval: seconds after an unrefreshed member expires, 0 disables the aging. By default it is the group
+     membership interval of the querier (2 * query_interval + query_response_time), and 0 without the querier.
+     query_interval: seconds between two general queries on every host port, 0 disables the querier. """
+    query_interval = float(query_interval)
+    query_response_time = float(query_response_time)
+    if membership_interval is None:
+        membership_interval = ROBUSTNESS * query_interval + query_response_time if query_interval > 0 else 0
+    member_state_builder = MemberStateBuilder(float(membership_interval), query_interval, query_response_time, querier_address)
     core.register("MemberStateBuilder",member_state_builder)
\ No newline at end of file
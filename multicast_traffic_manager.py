@@ -1,104 +1,358 @@
+from collections import OrderedDict
 from pox.core import core
 import pox.openflow.libopenflow_01 as of
 from pox.lib.addresses import IPAddr
 import pox.lib.packet as pkt
 from pox.lib.revent import EventHalt
+from flow_programmer import FlowProgrammer,DEFAULT_STAGE
+from flow_aggregator import FlowAggregator,rule_priority,match_rule_key
+from pipeline_stats import stats
+from event_journal import journal
 
 log = core.getLogger()
 
+class RouteCache(object):
+    """ Bounded LRU cache of the computed trees and constructed routes. Groups which have the same streamer switch and the same
+      member (dpid,port) set get the same tree, so it is enough to compute it once per topology version. The cached routes are
+      shared between groups, they must not be modified by the callers. """
+    
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        
+    def make_key(self, root, group_members, version):
+        member_ports = set()
+        for dpid,ports in group_members.iteritems():
+            for port in ports:
+                member_ports.add((dpid,port))
+        return (root, frozenset(member_ports), version)
+        
+    def get(self, key):
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        
+        value = self.entries.pop(key)
+        self.entries[key] = value
+        self.hits += 1
+        return value
+    
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        
+        self.entries.pop(key, None)
+        self.entries[key] = value
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            
+    def clear(self):
+        self.entries.clear()
+            
+    def get_stats(self):
+        return {"size":len(self.entries), "max_size":self.max_size, "hits":self.hits, "misses":self.misses}
+    
+    
 class MulticastTrafficManager():
-    def __init__(self):
+    def __init__(self, route_cache_size=1024, route_computer=None, barrier_timeout=5.0, aggregate=True, aggregate_min_prefix=24,
+                 stream_idle_timeout=60, full_repair=False):
         core.listen_to_dependencies(self, ['GraphBuilder','StreamerStateBuilder'])
+        core.openflow.addListeners(self)
         self.streamer_state_builder = None
         self.graph_builder = None
         self.flow_entries = {}
+        self.route_cache = RouteCache(route_cache_size)
+        self.route_computer = route_computer
+        self.flow_programmer = FlowProgrammer(barrier_timeout)
+        self.flow_aggregator = FlowAggregator(aggregate, aggregate_min_prefix)
+        self.group_trees = {}
+        self.edge_index = {}
+        self.node_index = {}
+        self.unreached_groups = set()
+        self.repair_stats = {"events":0, "groups_touched":0, "last_touched":0}
+        self.stream_idle_timeout = stream_idle_timeout
+        self.full_repair = full_repair
+        self.reused_trees = 0
     
     def _handle_GraphBuilder_GraphStructureChanged(self, event):
         if self.graph_builder == None:
             self.graph_builder = event.get_graph_builder()
         
-        log.info("Compute path invoked")
-        
-        nodes = self.graph_builder.get_nodes()
-        edges = self.graph_builder.get_edges()
-        distances = self.graph_builder.get_distances()
-        ports = self.graph_builder.get_ports()
+        journal.record("topology", "Graph structure changed, version %s", self.graph_builder.get_version())
+        journal.state("topology", "Edges", self.graph_builder.get_edges)
+        journal.state("topology", "Distances", self.graph_builder.get_distances)
+        journal.state("topology", "Ports", self.graph_builder.get_ports)
         
-        log.info("Nodes: " + str(nodes))
-        log.info("Edges: " + str(edges))
-        log.info("Distances: " + str(distances))
-        log.info("Ports: " + str(ports))
-        
-        # Recompute and write out these groups
+        # Recompute and write out only the groups which can be affected by the changed links
         if self.streamer_state_builder is not None:
             active_groups = self.streamer_state_builder.get_complete_groups()
-            log.info("Flow entries before: "+str(self.flow_entries))
+            journal.state("topology", "Flow entries before", lambda: self.flow_entries)
             
-            for group_key in active_groups.keys():        
-                constructed_route = self.construct_routes(active_groups[group_key]["members"], active_groups[group_key]["streamer"])
-                
-                if self.flow_entries.has_key(group_key):
-                    self.remove_old_route(self.flow_entries[group_key], group_key)
-                
-                if len(constructed_route) != 0:
-                    self.write_route(constructed_route,group_key)
+            changed_links = event.get_changed_links()
+            if changed_links is None:
+                affected_groups = active_groups.keys()
+            else:
+                affected_groups = self.get_affected_groups(changed_links)
+            
+            group_items = [(group_key,active_groups[group_key]) for group_key in affected_groups if group_key in active_groups]
+            computed_trees = self.compute_group_trees_parallel(group_items)
             
-                self.validate_flow_entries(constructed_route,group_key)
+            touched = 0
+            for group_key,group in group_items:
+                self.update_group_route(group_key, group["members"], group["streamer"], computed_trees.get(group_key))
+                touched += 1
+            
+            self.repair_stats["events"] += 1
+            self.repair_stats["groups_touched"] += touched
+            self.repair_stats["last_touched"] = touched
+            log.info("Topology change touched %d of %d groups" % (touched,len(active_groups)))
                 
-            log.info("Flow entries after: "+str(self.flow_entries))
+            journal.state("topology", "Flow entries after", lambda: self.flow_entries)
+            journal.record("topology", "Route cache: %s", str(self.route_cache.get_stats()))
+            aggregation_stats = self.flow_aggregator.get_stats()
+            log.info("Flow entries: %d, installed rules after aggregation: %d" % (aggregation_stats["entries"],aggregation_stats["rules"]))
+            tree_stats = self.get_tree_stats()
+            log.info("Trees with %s engine, total cost: %s, total links: %d" % (tree_stats["engine"],tree_stats["total_cost"],tree_stats["total_links"]))
         return EventHalt
     
     def  _handle_StreamerStateBuilder_ActiveGroupStateChanged(self, event):
         group_key,streamer,members = event.get_group_data()
         
-        log.info("Key:"+str(group_key))
-        log.info("Streamer:"+str(streamer))
-        log.info("Members:"+str(members))
+        journal.record("route", "Group %s changed, streamer %s, %d member switches", group_key, streamer, len(members))
         
         if self.streamer_state_builder == None:
             self.streamer_state_builder = event.get_streamer_state_builder()
             
-        constructed_route = self.construct_routes(members,streamer)
-        log.info("Constructed path: "+str(constructed_route))
+        constructed_route = self.update_group_route(group_key, members, streamer,
+                                                    self.reuse_group_tree(group_key, members, streamer, event.get_changed_switches()))
+        journal.state("route", "Constructed route", lambda: constructed_route)
+        journal.state("route", "Flow entries", lambda: self.flow_entries)
         
-        if self.flow_entries.has_key(group_key):
-            self.remove_old_route(self.flow_entries[group_key], group_key)
+    def update_group_route(self, group_key, members, streamer, computed_tree=None):
+        if computed_tree is None:
+            computed_tree = self.compute_group_tree(members,streamer)
+        min_cost_tree,constructed_route,tree_info = computed_tree
+        if streamer not in constructed_route:
+            """ The streamer's switch always gets the exact rule of the stream, a drop rule when no member is reached, so the
+             stream is retired by its idle timeout even without a route """
+            constructed_route = dict(constructed_route)
+            constructed_route[streamer] = []
         
-        if len(constructed_route) != 0:
-            self.write_route(constructed_route,group_key)
+        old_levels = {}
+        moved_roots = ()
+        if group_key in self.group_trees:
+            old_levels = self.group_trees[group_key]["levels"]
+            if self.group_trees[group_key]["root"] != streamer:
+                moved_roots = (self.group_trees[group_key]["root"],streamer)
+        self.update_route_flows(group_key, old_levels, constructed_route, tree_info, moved_roots)
         
         self.validate_flow_entries(constructed_route,group_key)
+        self.index_group_tree(group_key, tree_info)
+        return constructed_route
+        
+    def reuse_group_tree(self, group_key, members, streamer, changed_switches):
+        """ The tree of a group connects its member switches. When the changed members of a membership update are all on
+         switches which were and are still members (or neither), the installed tree is kept and only the routes are rebuilt
+         from it with the new ports, without a tree computation. Returns None when the tree has to be computed. """
+        tree_info = self.group_trees.get(group_key)
+        if changed_switches is None or tree_info is None or tree_info["root"] != streamer or \
+           tree_info["version"] != self.graph_builder.get_version():
+            return None
+        member_switches = tree_info["member_switches"]
+        for dpid in changed_switches:
+            if (dpid in member_switches) != (dpid in members):
+                return None
         
-        log.info("Flow entries: "+str(self.flow_entries))
+        min_cost_tree = list(tree_info["edges"])
+        self.reused_trees += 1
+        stats.count("reused_trees")
+        return min_cost_tree,self.graph_builder.construct_routes(min_cost_tree, members),tree_info
         
     def  _handle_StreamerStateBuilder_ActiveGroupDeleted(self, event):
-        log.info("Group deleted event handler in multicast")
-        log.info("FLow entries before: "+str(self.flow_entries))
+        journal.state("route", "Flow entries before delete", lambda: self.flow_entries)
         if self.streamer_state_builder == None:
             self.streamer_state_builder = event.get_streamer_state_builder()
             
         group_key = event.get_group_key()
+        journal.record("route", "Group %s deleted", group_key)
         if self.flow_entries.has_key(group_key):
-            self.remove_old_route(self.flow_entries[group_key], group_key)
+            self.remove_old_route(group_key)
             self.flow_entries.pop(group_key)
+        self.unindex_group_tree(group_key)
             
-        log.info("FLow entries after: "+str(self.flow_entries))
+        journal.state("route", "Flow entries after delete", lambda: self.flow_entries)
     
     
     def  _handle_StreamerStateBuilder_IncompleteGroupStateChanged(self, event):
-        log.info("Group incomplete block/unblock event handler in multicast")
-            
         group_key,streamer,flag = event.get_group_data()
         self.send_incomplete_group_message(group_key, streamer, flag)
        
         
     def construct_routes(self, group_members, group_streamer):
-        min_cost_tree = self.graph_builder.minimal_cost_spanning_tree(group_members, group_streamer)
+        return self.compute_group_tree(group_members, group_streamer)[1]
+    
+    def compute_group_tree(self, group_members, group_streamer):
+        cache_key = self.route_cache.make_key(group_streamer, group_members, self.graph_builder.get_version())
+        cached = self.route_cache.get(cache_key)
+        if cached is not None:
+            stats.count("route_cache_hits")
+            return cached
+        
+        timer = stats.start("tree")
+        min_cost_tree = self.graph_builder.compute_tree(group_members, group_streamer)
+        stats.stop(timer)
+        timer = stats.start("routes")
         constructed_routes = self.graph_builder.construct_routes(min_cost_tree,group_members)
+        stats.stop(timer)
+        tree_info = self.make_tree_info(min_cost_tree, group_members, group_streamer)
+        self.route_cache.put(cache_key, (min_cost_tree,constructed_routes,tree_info))
+        
+        journal.state("route", "Min cost tree", lambda: min_cost_tree)
+        journal.record("route", "Tree from %s, cost: %s, links: %d", group_streamer, tree_info["cost"], tree_info["links"])
+        
+        return min_cost_tree,constructed_routes,tree_info
+    
+    def compute_group_trees_parallel(self, group_items):
+        """ Computes the trees of the (group_key,group) items in the worker pool, when it is enabled and there are enough
+         groups to compute. Groups with the same cache key are computed only once. Returns {group_key:computed tree}, which
+         is empty when the trees have to be computed in process, and misses the groups of a failed worker, which
+         update_group_route computes in process too. """
+        computed_trees = {}
+        if self.route_computer is None or not self.route_computer.should_use(len(group_items), self.graph_builder.routing_engine):
+            return computed_trees
+        
+        version = self.graph_builder.get_version()
+        jobs = {}
+        waiting_groups = {}
+        for group_key,group in group_items:
+            cache_key = self.route_cache.make_key(group["streamer"], group["members"], version)
+            cached = self.route_cache.get(cache_key)
+            if cached is not None:
+                computed_trees[group_key] = cached
+            else:
+                jobs[cache_key] = (group["members"],group["streamer"])
+                waiting_groups.setdefault(cache_key,[]).append(group_key)
+        
+        if len(jobs) == 0:
+            return computed_trees
         
-        log.info("Min cost tree: "+str(min_cost_tree))
+        results = self.route_computer.compute(self.graph_builder.get_snapshot(), self.graph_builder.routing_engine.name,
+                                              [(cache_key,members,root) for cache_key,(members,root) in jobs.iteritems()])
+        for cache_key,(min_cost_tree,constructed_route) in results.iteritems():
+            members,root = jobs[cache_key]
+            computed_tree = (min_cost_tree,constructed_route,self.make_tree_info(min_cost_tree, members, root))
+            self.route_cache.put(cache_key, computed_tree)
+            for group_key in waiting_groups[cache_key]:
+                computed_trees[group_key] = computed_tree
         
-        return constructed_routes
+        if len(results) != len(jobs):
+            log.warning("%d of %d trees were lost with a failed worker, they are computed in process" % (len(jobs) - len(results),len(jobs)))
+        log.info("Computed %d trees for %d groups in the worker pool" % (len(results),len(group_items)))
+        return computed_trees
+    
+    def make_tree_info(self, min_cost_tree, group_members, root):
+        """ Summary of a computed tree for the incremental repair: the used edges, the path cost from the root to every tree node,
+         the heaviest edge and the deepest path, and whether some members could not be reached. The in ports of the tree
+         switches are needed by the flow aggregation, the level (hop count from the root) of the tree nodes orders the flow
+         mods of a route update. The root, the member switches and the topology version tell reuse_group_tree whether a
+         membership update can keep the tree. """
+        distances = self.graph_builder.get_distances()
+        children = {}
+        in_ports = {}
+        max_edge = 0
+        for edge in min_cost_tree:
+            children.setdefault(edge[0],[]).append(edge[1])
+            in_ports[edge[1]] = self.graph_builder.get_port_pair(edge[0],edge[1])[1]
+            max_edge = max(max_edge, distances[edge])
+        
+        depths = {root:0}
+        levels = {root:0}
+        to_visit = [root]
+        while len(to_visit) != 0:
+            node = to_visit.pop()
+            for child in children.get(node,()):
+                depths[child] = depths[node] + distances[(node,child)]
+                levels[child] = levels[node] + 1
+                to_visit.append(child)
+        
+        unreached = False
+        for member in group_members.keys():
+            if member not in depths:
+                unreached = True
+                break
+        
+        return {"edges":frozenset(min_cost_tree), "depths":depths, "levels":levels, "max_edge":max_edge, "max_depth":max(depths.values()), "unreached":unreached,
+                "in_ports":in_ports, "cost":self.graph_builder.tree_cost(min_cost_tree), "links":len(min_cost_tree), "root":root,
+                "member_switches":frozenset(group_members.keys()), "version":self.graph_builder.get_version()}
+    
+    def index_group_tree(self, group_key, tree_info):
+        self.unindex_group_tree(group_key)
+        self.group_trees[group_key] = tree_info
+        for edge in tree_info["edges"]:
+            self.edge_index.setdefault(edge,set()).add(group_key)
+        for node in tree_info["depths"].keys():
+            self.node_index.setdefault(node,set()).add(group_key)
+        if tree_info["unreached"]:
+            self.unreached_groups.add(group_key)
+    
+    def is_tree_node(self, group_key, dpid):
+        tree_info = self.group_trees.get(group_key)
+        return tree_info is not None and dpid in tree_info["depths"]
+    
+    def get_tree_stats(self):
+        """ Total tree cost and link count of every active group, and their sum, to measure the replicated bandwidth. """
+        groups = {}
+        total_cost = 0
+        total_links = 0
+        for group_key,tree_info in self.group_trees.iteritems():
+            groups[group_key] = {"cost":tree_info["cost"], "links":tree_info["links"]}
+            total_cost += tree_info["cost"]
+            total_links += tree_info["links"]
+        return {"engine":self.graph_builder.routing_engine.name, "groups":groups, "total_cost":total_cost, "total_links":total_links,
+                "reused_trees":self.reused_trees}
+    
+    def unindex_group_tree(self, group_key):
+        tree_info = self.group_trees.pop(group_key, None)
+        if tree_info is None:
+            return
+        
+        for edge in tree_info["edges"]:
+            self.edge_index[edge].discard(group_key)
+            if len(self.edge_index[edge]) == 0:
+                self.edge_index.pop(edge)
+        for node in tree_info["depths"].keys():
+            self.node_index[node].discard(group_key)
+            if len(self.node_index[node]) == 0:
+                self.node_index.pop(node)
+        self.unreached_groups.discard(group_key)
+        
+    def get_affected_groups(self, changed_links):
+        """ Groups whose tree uses a changed link are always repaired. A link which is up after the change is only worth to
+         re-evaluate for groups with unreached members, or when it starts from a tree node and is lighter than the heaviest
+         tree edge or gives a shorter path than the deepest one.
+         The up link bound is a heuristic, not an exact one: a new link between two switches off the tree can still give a
+         cheaper tree, which is found only at the next repair of the group. With full_repair every group is recomputed
+         when a link comes up or its distance changes. """
+        distances = self.graph_builder.get_distances()
+        affected_groups = set()
+        for edge in changed_links:
+            affected_groups.update(self.edge_index.get(edge,()))
+            if edge not in distances:
+                continue
+            
+            if self.full_repair:
+                affected_groups.update(self.group_trees.keys())
+                continue
+            
+            affected_groups.update(self.unreached_groups)
+            distance = distances[edge]
+            for group_key in self.node_index.get(edge[0],()):
+                tree_info = self.group_trees[group_key]
+                if distance < tree_info["max_edge"] or tree_info["depths"][edge[0]] + distance < tree_info["max_depth"]:
+                    affected_groups.add(group_key)
+        return affected_groups
     
     def validate_flow_entries(self, constructed_route, group_key):
         if len(constructed_route) != 0:
@@ -110,48 +364,130 @@ class MulticastTrafficManager():
             if self.flow_entries.has_key(group_key):
                 self.flow_entries.pop(group_key)
             
-    def remove_old_route(self, old_route, group_key):
-        for node in old_route.keys():
-                msg = of.ofp_flow_mod()
-                msg.priority = 65535
-                msg.command = of.OFPFC_DELETE
-                msg.match.dl_type = 0x800
-                msg.match.nw_dst = IPAddr(group_key[0])
-                msg.match.nw_src = IPAddr(group_key[1])
-                try:
-                    core.openflow.getConnection(node).send(msg)
-                except AttributeError:
-                    log.info("Core is going down, can't post update for this node")
-        
-    def write_route(self, constructed_route, group_key):
-        for node in constructed_route.keys():
-            msg = of.ofp_flow_mod()
-            msg.priority = 65535
-            msg.match.dl_type = 0x800
-            msg.match.nw_dst = IPAddr(group_key[0])
-            msg.match.nw_src = IPAddr(group_key[1])
-            for out_port in constructed_route[node]:
-                msg.actions.append(of.ofp_action_output(port = out_port))
-            try:
-                core.openflow.getConnection(node).send(msg)
-            except AttributeError:
-                log.info("Core is going down, can't post update for this node")    
-                
+    def remove_old_route(self, group_key):
+        old_levels = {}
+        if group_key in self.group_trees:
+            old_levels = self.group_trees[group_key]["levels"]
+        self.update_route_flows(group_key, old_levels, {}, {"levels":{}, "in_ports":{}})
+        
+    def update_route_flows(self, group_key, old_levels, new_route, tree_info, moved_roots=()):
+        """ Make before break update of a group's route. The flow aggregator gives the rules which changed on the switches of the
+         old and new route: only these get a flow mod. Adds and strict modifies are sent first, starting from the deepest level
+         of the new tree, so the downstream switches are ready before the traffic arrives. Strict deletes are sent after that,
+         starting from the root, so no switch forwards to a neighbour which has already lost its entry. Every level is a stage
+         of the flow programmer, which sends a stage only when the switches of the previous one have confirmed theirs.
+         When the streamer moved, the exact rule of the stream on the old and the new streamer's switch is added again (a
+         modify keeps the timeouts of the entry), so only the new one has the idle timeout. """
+        timer = stats.start("flow_emission")
+        new_levels = tree_info["levels"]
+        operations = self.flow_aggregator.update_group(group_key, new_route, tree_info["in_ports"])
+        if len(moved_roots) != 0:
+            stream_rule = (IPAddr(group_key[0]).toUnsigned(),32,group_key[1],None)
+            written = set((dpid,rule_key) for dpid,command,rule_key,out_ports in operations if command != of.OFPFC_DELETE_STRICT)
+            for dpid in moved_roots:
+                out_ports = self.flow_aggregator.get_rule(dpid, stream_rule)
+                if out_ports is not None and (dpid,stream_rule) not in written:
+                    operations.append((dpid,of.OFPFC_ADD,stream_rule,out_ports))
+        
+        to_write = []
+        to_delete = []
+        for dpid,command,rule_key,out_ports in operations:
+            if command == of.OFPFC_DELETE_STRICT:
+                to_delete.append((old_levels.get(dpid,-1),dpid,rule_key))
+            else:
+                to_write.append((new_levels.get(dpid,-1),dpid,command,rule_key,out_ports))
+        to_write.sort(reverse=True)
+        to_delete.sort()
+        
+        for level,dpid,command,rule_key,out_ports in to_write:
+            self.send_flow_mod(dpid, self.make_rule_flow_mod(rule_key, out_ports, command, self.rule_idle_timeout(dpid, rule_key)), (0,-level))
+        for level,dpid,rule_key in to_delete:
+            self.send_flow_mod(dpid, self.make_rule_flow_mod(rule_key, (), of.OFPFC_DELETE_STRICT), (1,level))
+        
+        stats.stop(timer)
+        stats.count("group_updates")
+        journal.record("route", "Route update of %s: %d rules written, %d deleted", group_key, len(to_write), len(to_delete))
+    
+    def _handle_FlowRemoved(self, event):
+        """ A rule which expired on the switch is not installed any more: the flow aggregator forgets it, so the reconciler
+         doesn't add it again. The StreamerStateBuilder retires the stream when it was its streamer's rule. """
+        if event.ofp.reason != of.OFPRR_IDLE_TIMEOUT:
+            return
+        rule_key = match_rule_key(event.ofp.match, event.ofp.priority)
+        if rule_key is not None and self.flow_aggregator.forget_rule(event.dpid, rule_key):
+            journal.record("route", "Rule %s expired on switch %s", rule_key, event.dpid)
+    
+    def rule_idle_timeout(self, dpid, rule_key):
+        """ The exact rule of a stream on its streamer's switch expires when the stream stops, and its FlowRemoved message
+         retires the stream in the StreamerStateBuilder. The other rules have no timeout. """
+        if self.stream_idle_timeout <= 0 or self.streamer_state_builder is None or rule_key[2] is None or rule_key[3] is not None:
+            return 0
+        if self.streamer_state_builder.get_streamer((IPAddr(rule_key[0]),IPAddr(rule_key[2]))) != dpid:
+            return 0
+        return self.stream_idle_timeout
+    
+    def make_rule_flow_mod(self, rule_key, out_ports, command=of.OFPFC_ADD, idle_timeout=0):
+        """ Flow mod of a (nw_dst,prefix length,nw_src,in_port) rule of the flow aggregator. """
+        group_addr,prefix_length,source,in_port = rule_key
+        msg = of.ofp_flow_mod()
+        msg.command = command
+        msg.priority = rule_priority(rule_key)
+        if idle_timeout > 0:
+            msg.idle_timeout = idle_timeout
+            msg.flags = of.OFPFF_SEND_FLOW_REM
+        msg.match.dl_type = 0x800
+        if prefix_length == 32:
+            msg.match.nw_dst = IPAddr(group_addr)
+        else:
+            msg.match.set_nw_dst(IPAddr(group_addr), prefix_length)
+        if source is not None:
+            msg.match.nw_src = IPAddr(source)
+        if in_port is not None:
+            msg.match.in_port = in_port
+        for out_port in out_ports:
+            msg.actions.append(of.ofp_action_output(port = out_port))
+        return msg
+    
+    def send_flow_mod(self, node, msg, stage=DEFAULT_STAGE):
+        """ The flow mods are sent in one batch per switch and stage by the flow programmer, when the actual event is handled. """
+        self.flow_programmer.send(node, msg, stage)
+        
     def send_incomplete_group_message(self,group_key,streamer,flag):
         msg = of.ofp_flow_mod()
         msg.priority = 65535
         msg.match.dl_type = 0x800
         if flag == 'UNBLOCK':
             msg.command = of.OFPFC_DELETE
+        elif self.stream_idle_timeout > 0:
+            """ The BLOCK entry expires when the stream stops, and the incomplete group is retired """
+            msg.idle_timeout = self.stream_idle_timeout
+            msg.flags = of.OFPFF_SEND_FLOW_REM
         msg.match.nw_dst = IPAddr(group_key[0])
         msg.match.nw_src = IPAddr(group_key[1])
         msg.actions = []
-        try:
-            log.info("Incomplete group message sent out with flag "+str(flag))
-            core.openflow.getConnection(streamer).send(msg)
-        except AttributeError:
-            log.info("Core is going down, can't post update for this node")
+        journal.record("route", "Group %s %s on switch %s", group_key, flag, streamer)
+        self.send_flow_mod(streamer, msg)
 
-def launch():
-    multicast_traffic_manager = MulticastTrafficManager()
+def launch(route_cache_size=1024, workers=0, parallel_threshold=64, barrier_timeout=5, aggregate=True, aggregate_min_prefix=24,
+           stream_idle_timeout=60, full_repair=False):
+    """ route_cache_size: number of cached trees, 0 disables the cache,
+      workers: size of the process pool which computes the trees after a topology change, 0 computes them in process,
+      parallel_threshold: smaller recomputations than this many groups are done in process,
+      barrier_timeout: seconds to wait for the barrier reply of a flow mod batch before it is sent again,
+      aggregate: merge the flow entries which share the out ports into wildcarded rules (see flow_aggregator),
+      aggregate_min_prefix: the shortest group address prefix a merged rule can match,
+      stream_idle_timeout: seconds without packets after which the ingress entry (or BLOCK entry) of a stream expires and
+      the stream is retired, 0 keeps the streams until their members leave,
+      full_repair: recompute every group when a link comes up, instead of the groups which the link can improve by the
+      heuristic bound of get_affected_groups. """
+    route_computer = None
+    if int(workers) > 0:
+        from parallel_routes import ParallelRouteComputer
+        route_computer = ParallelRouteComputer(int(workers), int(parallel_threshold))
+    
+    aggregate = str(aggregate).lower() not in ("false","0","no")
+    full_repair = str(full_repair).lower() in ("true","1","yes")
+    multicast_traffic_manager = MulticastTrafficManager(int(route_cache_size), route_computer, float(barrier_timeout), aggregate,
+                                                        int(aggregate_min_prefix), int(stream_idle_timeout), full_repair)
     core.register("MulticastTrafficManager", multicast_traffic_manager)
+    core.register("FlowProgrammer", multicast_traffic_manager.flow_programmer)
@@ -0,0 +1,141 @@
+""" Parallel computation of the multicast trees in worker processes.
+
+  The tree of a group is a pure function of the topology and the group's streamer and members, so after a topology change the
+  trees can be computed in worker processes. The groups are split into one chunk per worker, and the results are returned to
+  the main thread, where the flows are written out.
+
+  The workers are new interpreters running this module (fork and exec), not forks of the controller: they don't inherit the
+  controller's threads, locks and sockets. They talk to the controller with pickled messages on their stdin and stdout:
+    ("snapshot",version,pickled GraphSnapshot) - the topology, sent to a worker only when its version changed
+    ("jobs",version,engine name,jobs)          - a chunk, answered with the list of (job_key,min_cost_tree,constructed_route)
+  So the snapshot is pickled once per topology version and sent to every worker once, not with every chunk.
+
+  When a worker dies, or its pipe breaks or carries a broken message, it is replaced by a new worker, and the jobs of its chunk
+  are left out of the results: the MulticastTrafficManager computes the missing trees in process.
+  """
+import cPickle as pickle
+import os
+import subprocess
+import sys
+
+import routing_engines
+
+
+class _Worker(object):
+    def __init__(self):
+        script = os.path.splitext(os.path.abspath(__file__))[0] + ".py"
+        self.process = subprocess.Popen([sys.executable, script], stdin=subprocess.PIPE, stdout=subprocess.PIPE, close_fds=True)
+        self.version = None
+
+    def send(self, message):
+        pickle.dump(message, self.process.stdin, pickle.HIGHEST_PROTOCOL)
+        self.process.stdin.flush()
+
+    def receive(self):
+        return pickle.load(self.process.stdout)
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+    def kill(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        try:
+            self.process.stdin.close()
+        except IOError:
+            pass
+        self.process.stdout.close()
+        self.process.wait()
+
+
+""" What a dead worker or a broken pipe gives on send and receive """
+WORKER_ERRORS = (EOFError,IOError,OSError,ValueError,pickle.UnpicklingError)
+
+
+class ParallelRouteComputer(object):
+    def __init__(self, workers, threshold=64):
+        self.threshold = threshold
+        self.workers = [_Worker() for index in xrange(workers)]
+        self.stats = {"rounds":0, "jobs":0, "snapshots_sent":0, "worker_failures":0, "lost_jobs":0}
+
+    def should_use(self, job_count, engine):
+        """ Small rounds are computed in process, they are cheaper than the pickling. The reference and compare engines can't
+         run on a snapshot. """
+        return job_count >= self.threshold and engine.name not in ("reference","compare")
+
+    def compute(self, snapshot, engine_name, jobs):
+        """ jobs: list of (job_key,group_members,root), returns {job_key:(min_cost_tree,constructed_route)}, without the jobs
+         of the workers which failed """
+        chunk_size = (len(jobs) + len(self.workers) - 1) / len(self.workers)
+        snapshot_data = None
+        busy_workers = []
+        for index,start in zip(xrange(len(self.workers)), xrange(0, len(jobs), chunk_size)):
+            worker = self.workers[index]
+            chunk = jobs[start:start+chunk_size]
+            try:
+                if worker.version != snapshot.version:
+                    if snapshot_data is None:
+                        snapshot_data = pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL)
+                    worker.send(("snapshot",snapshot.version,snapshot_data))
+                    worker.version = snapshot.version
+                    self.stats["snapshots_sent"] += 1
+                worker.send(("jobs",snapshot.version,engine_name,chunk))
+            except WORKER_ERRORS:
+                self.replace_worker(index, len(chunk))
+                continue
+            busy_workers.append((index,len(chunk)))
+
+        results = {}
+        for index,job_count in busy_workers:
+            try:
+                worker_results = self.workers[index].receive()
+            except WORKER_ERRORS:
+                self.replace_worker(index, job_count)
+                continue
+            for job_key,min_cost_tree,constructed_route in worker_results:
+                results[job_key] = (min_cost_tree,constructed_route)
+
+        self.stats["rounds"] += 1
+        self.stats["jobs"] += len(jobs)
+        return results
+
+    def replace_worker(self, index, lost_jobs):
+        """ Kills the failed worker and starts a new one in its place, which gets the snapshot with its next chunk """
+        self.workers[index].kill()
+        self.workers[index] = _Worker()
+        self.stats["worker_failures"] += 1
+        self.stats["lost_jobs"] += lost_jobs
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+
+def _worker_loop(requests, responses):
+    snapshot = None
+    version = None
+    while True:
+        try:
+            message = pickle.load(requests)
+        except EOFError:
+            return
+        if message[0] == "snapshot":
+            version = message[1]
+            snapshot = pickle.loads(message[2])
+            continue
+
+        kind,jobs_version,engine_name,jobs = message
+        if jobs_version != version:
+            raise ValueError("Jobs of version %s with snapshot version %s" % (jobs_version,version))
+        engine = routing_engines.get_engine(engine_name)
+        results = []
+        for job_key,group_members,root in jobs:
+            min_cost_tree = engine.compute_tree(snapshot, group_members.keys(), root)
+            constructed_route = routing_engines.construct_routes(snapshot, min_cost_tree, group_members)
+            results.append((job_key,min_cost_tree,constructed_route))
+        pickle.dump(results, responses, pickle.HIGHEST_PROTOCOL)
+        responses.flush()
+
+if __name__ == "__main__":
+    _worker_loop(sys.stdin, sys.stdout)
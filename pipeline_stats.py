@@ -0,0 +1,150 @@
+""" Latency instrumentation of the multicast pipeline, from the IGMP PacketIn to the flow mods.
+
+  The components measure their stages with the shared stats object:
+      timer = stats.start("tree")
+      ...
+      stats.stop(timer)
+  and count events with stats.count("name"). When the stats are disabled (the default), start returns None and stop and
+  count return at once, so the overhead is a method call. The histograms and counters are changed and read under a lock,
+  because the HTTP endpoint runs in its own thread.
+
+  Stages: parse, member_update, valid_members, tree, routes, flow_emission. Every stage has a histogram with logarithmic
+  buckets, from which the percentiles are estimated.
+
+  With the pipeline_stats component the stats are enabled, they are available as core.PipelineStats from the POX py console
+  (report(), as_json(), reset()), and optionally on a local HTTP endpoint: GET /stats returns the JSON, GET /reset resets them.
+  """
+import json
+import math
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler,HTTPServer
+
+class Histogram(object):
+    """ Histogram of durations in seconds, with buckets growing by 2^(1/4) from one microsecond """
+    BASE = 2 ** 0.25
+    MIN_VALUE = 1e-6
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        if value < self.MIN_VALUE:
+            index = 0
+        else:
+            index = int(math.log(value / self.MIN_VALUE, self.BASE)) + 1
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        """ Upper bound of the bucket where the given fraction of the values is reached """
+        if self.count == 0:
+            return 0.0
+        limit = fraction * self.count
+        seen = 0
+        for index in sorted(self.buckets.keys()):
+            seen += self.buckets[index]
+            if seen >= limit:
+                return min(self.MIN_VALUE * self.BASE ** index, self.max)
+        return self.max
+
+    def summary(self):
+        if self.count == 0:
+            return {"count":0}
+        return {"count":self.count, "avg_ms":self.total / self.count * 1e3, "p50_ms":self.percentile(0.5) * 1e3,
+                "p90_ms":self.percentile(0.9) * 1e3, "p99_ms":self.percentile(0.99) * 1e3, "max_ms":self.max * 1e3}
+
+
+class PipelineStats(object):
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+        self.counters = {}
+        self.since = time.time()
+        self.lock = threading.Lock()
+
+    def start(self, stage):
+        if not self.enabled:
+            return None
+        return (stage,time.time())
+
+    def stop(self, timer):
+        if timer is None:
+            return
+        stage,started = timer
+        duration = time.time() - started
+        with self.lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = Histogram()
+            self.histograms[stage].add(duration)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self.since = time.time()
+
+    def snapshot(self):
+        with self.lock:
+            return {"enabled":self.enabled, "seconds":time.time() - self.since, "counters":dict(self.counters),
+                    "stages":dict((stage,histogram.summary()) for stage,histogram in self.histograms.items())}
+
+    def as_json(self):
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def report(self):
+        snapshot = self.snapshot()
+        lines = ["Pipeline stats of the last %.1f seconds" % snapshot["seconds"]]
+        for stage,summary in sorted(snapshot["stages"].items()):
+            if summary["count"] != 0:
+                lines.append("  %-14s n=%-8d avg=%.3fms p50=%.3fms p90=%.3fms p99=%.3fms max=%.3fms" %
+                             (stage,summary["count"],summary["avg_ms"],summary["p50_ms"],summary["p90_ms"],summary["p99_ms"],summary["max_ms"]))
+        for name,value in sorted(snapshot["counters"].items()):
+            lines.append("  %-14s %d" % (name,value))
+        return "\n".join(lines)
+
+stats = PipelineStats()
+
+
+class _StatsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/reset":
+            stats.reset()
+        elif self.path != "/stats":
+            self.send_error(404)
+            return
+
+        body = stats.as_json()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def launch(http_port=None):
+    """ Enables the stats. http_port: serve them on http://127.0.0.1:<http_port>/stats too. """
+    from pox.core import core
+    stats.enabled = True
+    core.register("PipelineStats", stats)
+
+    if http_port is not None:
+        server = HTTPServer(("127.0.0.1", int(http_port)), _StatsRequestHandler)
+        thread = threading.Thread(target=server.serve_forever, name="PipelineStatsHTTP")
+        thread.daemon = True
+        thread.start()
+        core.getLogger().info("Pipeline stats on http://127.0.0.1:%s/stats" % http_port)
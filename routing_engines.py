@@ -0,0 +1,360 @@
+""" Routing engines, which compute the multicast tree from the streamer's switch (root) to the switches of the group members.
+
+  Every engine works on a graph object which provides has_node(node), successors(node), get_distance(from_node,to_node) and
+  successor_distances(node), the (to_node,distance) pairs of the links leaving the node (the GraphBuilder or a GraphSnapshot), and returns the tree in the result_min_tree format: a list of (from_node,to_node)
+  edges directed away from the root. Group members which can't be reached from the root are left out of the tree.
+
+  The engines are:
+    prim      - PRIM spanning tree grown until every member is reached, then pruned back to the member paths
+    reference - the original PRIM implementation of the GraphBuilder, only for comparison
+    spt       - shortest path tree from the root
+    kmb       - Kou-Markowsky-Berman Steiner tree heuristic (minimum spanning tree of the metric closure)
+    tm        - Takahashi-Matsuyama Steiner tree heuristic (always connect the nearest member to the tree)
+    compare   - the prim tree, checked against the reference tree, a warning is logged when it is heavier
+
+  Run this module to compare the tree costs of the engines on random Waxman graphs:
+    python routing_engines.py [switches] [groups] [members per group]
+  """
+import math
+import random
+import sys
+from heapq import heappush,heappop
+
+
+def dijkstra(graph, sources, targets=None, stop_at_first=False):
+    """ Shortest paths from the sources. Stops when every target (or with stop_at_first the first target) is settled.
+     Returns the distances and the before edges of the settled nodes. """
+    distances = {}
+    before_edges = {}
+    tentative = {}
+    heap = []
+    for source in sources:
+        tentative[source] = 0
+        heappush(heap,(0,source))
+
+    remaining = None
+    if targets is not None:
+        remaining = set(targets)
+
+    while len(heap) != 0:
+        distance,node = heappop(heap)
+        if node in distances:
+            continue
+
+        distances[node] = distance
+        if remaining is not None and node in remaining:
+            remaining.remove(node)
+            if len(remaining) == 0 or stop_at_first:
+                break
+
+        for next_node,link_distance in graph.successor_distances(node):
+            next_distance = distance + link_distance
+            if next_node not in distances and (next_node not in tentative or next_distance < tentative[next_node]):
+                tentative[next_node] = next_distance
+                before_edges[next_node] = (node,next_node)
+                heappush(heap,(next_distance,next_node))
+
+    for node in before_edges.keys():
+        if node not in distances:
+            before_edges.pop(node)
+    return distances,before_edges
+
+
+def collect_tree(before_edges, root, group_members):
+    """ Walks back from every reached group member with the help of the before_edges dict. When an edge is already in the
+     result, the rest of the path towards the root is in there too, so the walk can stop. """
+    result_min_tree = []
+    in_result = set()
+    for member in group_members:
+        if member == root or member not in before_edges:
+            continue
+        temp_edge = before_edges[member]
+        while temp_edge not in in_result:
+            result_min_tree.append(temp_edge)
+            in_result.add(temp_edge)
+            if temp_edge[0] == root:
+                break
+            temp_edge = before_edges[temp_edge[0]]
+
+    return result_min_tree
+
+
+def tree_cost(graph, result_min_tree):
+    cost = 0
+    for edge in result_min_tree:
+        cost += graph.get_distance(edge[0],edge[1])
+    return cost
+
+
+def valid_members(graph, group_members):
+    members = set()
+    for member in group_members:
+        if graph.has_node(member):
+            members.add(member)
+    return members
+
+
+def construct_routes(graph, result_min_tree, group_members):
+    """ To be able to write out the exact routes to switches, we need the ports in each vertex, where we can find the group members.
+     To achieve this, we return the constructed route: the list of out ports for every switch of the tree and every switch of
+     the members. The graph has to provide get_port_pair(from_node,to_node) too. """
+    constructed_route = {}
+    for edge in result_min_tree:
+        from_node = edge[0]
+        if not constructed_route.has_key(from_node):
+            constructed_route[from_node] = list(group_members.get(from_node,()))
+        out_port = graph.get_port_pair(edge[0],edge[1])[0]
+        if out_port not in constructed_route[from_node]:
+            constructed_route[from_node].append(out_port)
+
+    for member in group_members.keys():
+        if member not in constructed_route and graph.has_node(member):
+            constructed_route[member] = list(group_members[member])
+
+    return constructed_route
+
+
+class SubGraph(object):
+    """ Graph view which contains only the given edges of the underlying graph. """
+
+    def __init__(self, graph, edges):
+        self.graph = graph
+        self.succ = {}
+        for from_node,to_node in edges:
+            self.succ.setdefault(from_node,set()).add(to_node)
+            self.succ.setdefault(to_node,set())
+
+    def has_node(self, node):
+        return node in self.succ
+
+    def successors(self, node):
+        return self.succ.get(node,())
+
+    def get_distance(self, from_node, to_node):
+        return self.graph.get_distance(from_node,to_node)
+
+    def successor_distances(self, node):
+        get_distance = self.graph.get_distance
+        return [(to_node,get_distance(node,to_node)) for to_node in self.succ.get(node,())]
+
+
+class RoutingEngine(object):
+    """ The engines implement compute_tree(graph, group_members, root), which returns the result_min_tree edge list. """
+    name = None
+
+
+class PrimPruneEngine(RoutingEngine):
+    """ PRIM algorithm driven by the adjacency and a binary heap of candidate edges, it runs while every group member is in
+     the tree. Every edge is pushed at most once, so one run costs O(E log E). """
+    name = "prim"
+
+    def compute_tree(self, graph, group_members, root):
+        group_members = valid_members(graph, group_members)
+        visited = set([root])
+        remaining = group_members.difference(visited)
+        before_edges = {}
+        heap = []
+
+        for to_node,distance in graph.successor_distances(root):
+            heappush(heap,(distance,root,to_node))
+
+        while len(remaining) != 0 and len(heap) != 0:
+            distance,from_node,to_node = heappop(heap)
+            if to_node in visited:
+                continue
+
+            visited.add(to_node)
+            before_edges[to_node] = (from_node,to_node)
+            remaining.discard(to_node)
+
+            for next_node,next_distance in graph.successor_distances(to_node):
+                if next_node not in visited:
+                    heappush(heap,(next_distance,to_node,next_node))
+
+        return collect_tree(before_edges, root, group_members)
+
+
+class ReferencePrimEngine(RoutingEngine):
+    """ The original GraphBuilder.minimal_cost_spanning_tree, it works only on the GraphBuilder itself. """
+    name = "reference"
+
+    def compute_tree(self, graph, group_members, root):
+        return graph.minimal_cost_spanning_tree(dict.fromkeys(group_members), root)
+
+
+class ShortestPathTreeEngine(RoutingEngine):
+    """ Every member is reached on its shortest path from the root. """
+    name = "spt"
+
+    def compute_tree(self, graph, group_members, root):
+        group_members = valid_members(graph, group_members)
+        distances,before_edges = dijkstra(graph, [root], group_members)
+        return collect_tree(before_edges, root, group_members)
+
+
+class KMBEngine(RoutingEngine):
+    """ Kou-Markowsky-Berman heuristic: minimum spanning tree of the terminals' metric closure, expanded to the shortest paths,
+     spanning tree of the expanded subgraph, and finally pruned back to the member paths. """
+    name = "kmb"
+
+    def compute_tree(self, graph, group_members, root):
+        group_members = valid_members(graph, group_members)
+        root_distances,root_before_edges = dijkstra(graph, [root], group_members)
+        terminals = set([root])
+        for member in group_members:
+            if member in root_distances:
+                terminals.add(member)
+        if len(terminals) == 1:
+            return []
+
+        closure = {root:(root_distances,root_before_edges)}
+        for terminal in terminals:
+            if terminal != root:
+                closure[terminal] = dijkstra(graph, [terminal], terminals)
+
+        """ PRIM algorithm on the metric closure, every selected closure edge is expanded to its shortest path """
+        in_tree = set([root])
+        heap = []
+        for terminal in terminals:
+            if terminal != root:
+                heappush(heap,(root_distances[terminal],root,terminal))
+
+        expanded_edges = set()
+        while len(heap) != 0 and len(in_tree) != len(terminals):
+            distance,from_terminal,to_terminal = heappop(heap)
+            if to_terminal in in_tree:
+                continue
+
+            in_tree.add(to_terminal)
+            before_edges = closure[from_terminal][1]
+            node = to_terminal
+            while node != from_terminal:
+                edge = before_edges[node]
+                expanded_edges.add(edge)
+                node = edge[0]
+
+            terminal_distances = closure[to_terminal][0]
+            for terminal in terminals:
+                if terminal not in in_tree and terminal in terminal_distances:
+                    heappush(heap,(terminal_distances[terminal],to_terminal,terminal))
+
+        return PrimPruneEngine().compute_tree(SubGraph(graph, expanded_edges), terminals, root)
+
+
+class TakahashiMatsuyamaEngine(RoutingEngine):
+    """ Takahashi-Matsuyama heuristic: starting from the root, the member nearest to the actual tree is connected on its
+     shortest path, until every reachable member is in the tree. """
+    name = "tm"
+
+    def compute_tree(self, graph, group_members, root):
+        group_members = valid_members(graph, group_members)
+        tree_nodes = set([root])
+        remaining = group_members.difference(tree_nodes)
+        result_min_tree = []
+
+        while len(remaining) != 0:
+            distances,before_edges = dijkstra(graph, tree_nodes, remaining, stop_at_first=True)
+            nearest = None
+            for member in remaining:
+                if member in distances and (nearest is None or distances[member] < distances[nearest]):
+                    nearest = member
+            if nearest is None:
+                break
+
+            path = []
+            node = nearest
+            while node not in tree_nodes:
+                edge = before_edges[node]
+                path.append(edge)
+                tree_nodes.add(node)
+                node = edge[0]
+            path.reverse()
+            result_min_tree.extend(path)
+            remaining.difference_update(tree_nodes)
+
+        return result_min_tree
+
+
+class CompareEngine(RoutingEngine):
+    """ Returns the tree of the engine, and logs a warning when it is heavier than the tree of the reference engine. Both
+     trees are computed, so it is only for checking. The reference engine works only on the GraphBuilder. """
+    name = "compare"
+
+    def __init__(self, engine=None, reference=None):
+        self.engine = engine or PrimPruneEngine()
+        self.reference = reference or ReferencePrimEngine()
+        self.stats = {"trees":0, "heavier":0}
+        """ POX is imported here, the other engines also run in the route workers, which don't load POX """
+        from pox.core import core
+        self.log = core.getLogger("routing_engines")
+
+    def compute_tree(self, graph, group_members, root):
+        result_min_tree = self.engine.compute_tree(graph, group_members, root)
+        reference_tree = self.reference.compute_tree(graph, group_members, root)
+        self.stats["trees"] += 1
+        if tree_cost(graph, result_min_tree) > tree_cost(graph, set(reference_tree)):
+            self.stats["heavier"] += 1
+            self.log.warning("%s tree %s is heavier than %s tree %s" % (self.engine.name,result_min_tree,self.reference.name,reference_tree))
+        return result_min_tree
+
+
+ENGINES = dict((engine.name,engine) for engine in [PrimPruneEngine,ReferencePrimEngine,ShortestPathTreeEngine,KMBEngine,TakahashiMatsuyamaEngine,
+                                                   CompareEngine])
+
+def get_engine(name):
+    if name not in ENGINES:
+        raise ValueError("Unknown routing engine: %s, choose from %s" % (name,", ".join(sorted(ENGINES.keys()))))
+    return ENGINES[name]()
+
+
+class _RandomGraph(object):
+    """ Waxman random graph for the comparison, made connected by linking every node to its nearest earlier node """
+
+    def __init__(self, nodes, alpha=0.4, beta=0.2, rand=None):
+        rand = rand or random.Random(1)
+        points = [(rand.random(),rand.random()) for node in xrange(nodes)]
+        self.succ = dict((node,set()) for node in xrange(nodes))
+        self.distances = {}
+        for node in xrange(1, nodes):
+            nearest = min(xrange(node), key=lambda other: math.hypot(points[node][0] - points[other][0], points[node][1] - points[other][1]))
+            self.add_link(nearest, node, rand)
+        for node in xrange(nodes):
+            for other in xrange(node + 1, nodes):
+                distance = math.hypot(points[node][0] - points[other][0], points[node][1] - points[other][1])
+                if other not in self.succ[node] and rand.random() < beta * math.exp(-distance / (alpha * math.sqrt(2))):
+                    self.add_link(node, other, rand)
+
+    def add_link(self, node, other, rand):
+        self.succ[node].add(other)
+        self.succ[other].add(node)
+        self.distances[(node,other)] = self.distances[(other,node)] = rand.randint(1, 10)
+
+    def has_node(self, node):
+        return node in self.succ
+
+    def successors(self, node):
+        return self.succ.get(node,())
+
+    def get_distance(self, from_node, to_node):
+        return self.distances[(from_node,to_node)]
+
+    def successor_distances(self, node):
+        distances = self.distances
+        return [(to_node,distances[(node,to_node)]) for to_node in self.succ.get(node,())]
+
+
+def _compare_engines(nodes=200, groups=200, members=10):
+    rand = random.Random(1)
+    graph = _RandomGraph(nodes, rand=rand)
+    trees = [(rand.randrange(nodes),rand.sample(xrange(nodes), members)) for group in xrange(groups)]
+    print("nodes: %d, links: %d, groups: %d x %d members" % (nodes,len(graph.distances) / 2,groups,members))
+    prim_cost = None
+    for name in ("prim","spt","kmb","tm"):
+        engine = get_engine(name)
+        cost = sum(tree_cost(graph, engine.compute_tree(graph, group_members, root)) for root,group_members in trees)
+        if prim_cost is None:
+            prim_cost = cost
+        print("  %-5s total cost %6d, %+.1f%% to prim" % (name,cost,(cost - prim_cost) * 100.0 / prim_cost))
+
+if __name__ == "__main__":
+    _compare_engines(*[int(arg) for arg in sys.argv[1:4]])
@@ -2,7 +2,14 @@ from pox.core import core
 import pox.openflow.libopenflow_01 as of
 from pox.lib.addresses import IPAddr
 import pox.lib.packet as pkt
+import time
 from pox.lib.revent import Event,EventHalt,EventMixin
+from pipeline_stats import stats
+from event_journal import journal
+from flow_aggregator import EXACT_PRIORITY,PREFIX_PRIORITY
+
+""" Priority of the temporary drop entries, below the multicast rules, so the real route overrides them when it lands """
+TEMPORARY_PRIORITY = PREFIX_PRIORITY - 1
 
 log = core.getLogger()
 
@@ -10,12 +17,13 @@ class ActiveGroupStateChanged(Event):
     def __str__ (self):
         return "Group with key: %s route should be recomputed",self.group_key
     
-    def __init__ (self,group_key,group,streamer_state_builder):
+    def __init__ (self,group_key,group,streamer_state_builder,changed_switches=None):
         super(ActiveGroupStateChanged,self).__init__()
         self.group_key = group_key
         self.group_members = group["members"]
         self.group_streamer = group["streamer"]
         self.streamer_state_builder = streamer_state_builder
+        self.changed_switches = changed_switches
         
     def get_streamer_state_builder(self):
         return self.streamer_state_builder
@@ -23,6 +31,10 @@ class ActiveGroupStateChanged(Event):
     def get_group_data(self):
         return self.group_key,self.group_streamer,self.group_members
     
+    def get_changed_switches(self):
+        """ The switches of the members whose state changed, None for a new route """
+        return self.changed_switches
+    
     
 class ActiveGroupDeleted(Event):
     def __str__ (self):
@@ -61,14 +73,37 @@ class StreamerStateBuilder(EventMixin):
     _eventMixin_events = set([ActiveGroupStateChanged,ActiveGroupDeleted,IncompleteGroupStateChanged])
     _rule_priority_adjustment = -0x1000 
     ''' Groups are stored in this format 
-        self.groups{(group_multicast_dstip,streamer_srcip):{streamer:'streamer.dpid',members:{dpid1:[ports],dpid2:[ports]}'''
+        self.groups{(group_multicast_dstip,streamer_srcip):{streamer:'streamer.dpid',members:{dpid1:[ports],dpid2:[ports]},fingerprint:frozenset((dpid,port))}
+        The keys of both groups and incomplete_groups are indexed by the group address in group_keys and incomplete_keys
+        {group_multicast_dstip:set(group keys)}, so a membership change touches only the streams of its group. The member
+        sets are compared by their fingerprints.
+        
+        The packets of already known group keys are not handled again: they reach the controller only until the flows of the
+        route are installed. On the streamer's switch a temporary drop entry is installed for them through the flow programmer,
+        which expires after temporary_timeout. self.temporary_flows = {group_key:(install time,dpid,in_port)} keeps them for
+        the FlowReconciler. A known key from another switch, which is not on the tree of the group, is handled as a moved
+        streamer, at most once per rate_limit seconds per key.
+        
+        When the idle ingress entry (or BLOCK entry) of a stream expires, its FlowRemoved message retires the group key. The
+        keys retired while an event is handled are removed together, and their routes are deleted in one flow mod batch. '''
     
-    def __init__(self):
+    def __init__(self, temporary_timeout=2, rate_limit=1.0):
         self.groups = {}
         self.incomplete_groups = {}
+        self.group_keys = {}
+        self.incomplete_keys = {}
         self.group_addrs = set()
         self.member_state_builder = None
         
+        self.temporary_timeout = temporary_timeout
+        self.rate_limit = rate_limit
+        self.last_handled = {}
+        self.temporary_flows = {}
+        self.packet_in_stats = {"handled":0, "suppressed":0, "rate_limited":0, "temporary_flows":0}
+        self.retired_keys = set()
+        self.retire_scheduled = False
+        self.retire_stats = {"retired":0, "retired_incomplete":0, "batches":0}
+        
         core.addListeners(self)
         core.listen_to_dependencies(self, ['MemberStateBuilder'])
         core.openflow.addListeners(self)
@@ -82,122 +117,245 @@ class StreamerStateBuilder(EventMixin):
     def get_complete_groups(self):
         return self.groups
             
-    def is_different(self,old_group,new_group):
-        if len(old_group.keys()) != len(new_group.keys()):
-            return True
-        else:
-            for dpid in new_group.keys():
-                if dpid not in old_group.keys():
-                    return True
-                else:
-                    if len(new_group[dpid]) != len(old_group[dpid]):
-                        return True
-                    else:
-                        for port in new_group[dpid]:
-                            if port not in old_group[dpid]:
-                                return True
-                         
-        return False
+    def _index_key(self,index,group_key):
+        index.setdefault(group_key[0], set()).add(group_key)
+    
+    def _unindex_key(self,index,group_key):
+        group_keys = index.get(group_key[0])
+        if group_keys is not None:
+            group_keys.discard(group_key)
+            if len(group_keys) == 0:
+                index.pop(group_key[0])
+    
+    def set_group(self,group_key,group):
+        self.groups[group_key] = group
+        self._index_key(self.group_keys, group_key)
+    
+    def pop_group(self,group_key):
+        self._unindex_key(self.group_keys, group_key)
+        return self.groups.pop(group_key)
+    
+    def set_incomplete_group(self,group_key,group):
+        self.incomplete_groups[group_key] = group
+        self._index_key(self.incomplete_keys, group_key)
+    
+    def pop_incomplete_group(self,group_key):
+        self._unindex_key(self.incomplete_keys, group_key)
+        return self.incomplete_groups.pop(group_key)
+    
+    def get_group_keys(self,address):
+        return list(self.group_keys.get(address, ()))
+    
+    def get_incomplete_keys(self,address):
+        return list(self.incomplete_keys.get(address, ()))
     
     def raise_event_incomplete(self,grp_key,flag):
         ev = IncompleteGroupStateChanged(grp_key,self.incomplete_groups[grp_key],self,flag)
         self.raiseEvent(ev)
     
-    def raise_event_modified(self,grp_key):
-        ev = ActiveGroupStateChanged(grp_key,self.groups[grp_key],self)
+    def raise_event_modified(self,grp_key,changed_switches=None):
+        ev = ActiveGroupStateChanged(grp_key,self.groups[grp_key],self,changed_switches)
         self.raiseEvent(ev)
         
     def raise_event_deleted(self,grp_key):
         ev = ActiveGroupDeleted(grp_key,self)
         self.raiseEvent(ev)
           
+    def get_streamer(self,group_key):
+        if group_key in self.groups:
+            return self.groups[group_key]["streamer"]
+        if group_key in self.incomplete_groups:
+            return self.incomplete_groups[group_key]["streamer"]
+        return None
+    
+    def is_tree_node(self,group_key,dpid):
+        if not core.hasComponent("MulticastTrafficManager"):
+            return False
+        return core.MulticastTrafficManager.is_tree_node(group_key, dpid)
+    
+    def make_temporary_flow_mod(self,group_key,in_port,hard_timeout,command=of.OFPFC_ADD):
+        msg = of.ofp_flow_mod()
+        msg.command = command
+        msg.priority = TEMPORARY_PRIORITY
+        msg.hard_timeout = hard_timeout
+        msg.match.dl_type = 0x800
+        msg.match.nw_dst = IPAddr(group_key[0])
+        msg.match.nw_src = IPAddr(group_key[1])
+        msg.match.in_port = in_port
+        msg.actions = []
+        return msg
+    
+    def install_temporary_flow(self,event,group_key,now):
+        """ Drops the packets of the stream on its ingress switch until the route is installed, or the entry expires """
+        if self.temporary_timeout <= 0 or not core.hasComponent("FlowProgrammer"):
+            return
+        installed = self.temporary_flows.get(group_key)
+        if installed is not None and now - installed[0] < self.temporary_timeout:
+            return
+        self.temporary_flows[group_key] = (now,event.dpid,event.port)
+        core.FlowProgrammer.send(event.dpid, self.make_temporary_flow_mod(group_key, event.port, int(self.temporary_timeout)))
+        self.packet_in_stats["temporary_flows"] += 1
+    
+    def get_temporary_flows(self,dpid,now):
+        """ [(group_key,in_port,remaining seconds)] of the temporary entries of the switch which have not expired yet """
+        temporary_flows = []
+        for group_key,(installed,flow_dpid,in_port) in self.temporary_flows.iteritems():
+            remaining = self.temporary_timeout - (now - installed)
+            if flow_dpid == dpid and remaining > 0:
+                temporary_flows.append((group_key,in_port,remaining))
+        return temporary_flows
+    
+    def is_suppressed(self,event,group_key,now):
+        """ True if the packet of a known group key doesn't have to be handled """
+        streamer = self.get_streamer(group_key)
+        if streamer is None:
+            return False
+        if streamer == event.dpid:
+            """ The incomplete groups are dropped by their BLOCK entry already """
+            if group_key in self.groups:
+                self.install_temporary_flow(event, group_key, now)
+            return True
+        if group_key in self.groups and self.is_tree_node(group_key, event.dpid):
+            return True
+        if now - self.last_handled.get(group_key, 0) < self.rate_limit:
+            self.packet_in_stats["rate_limited"] += 1
+            return True
+        return False
+    
+    def get_packet_in_stats(self):
+        return dict(self.packet_in_stats)
+          
     def _handle_PacketIn(self,event):
         packet = event.parsed
         if packet.type == pkt.ethernet.IP_TYPE:
             ip_packet = packet.payload
                                
             if self.is_multicast(ip_packet.dstip) and ip_packet.protocol != ip_packet.IGMP_PROTOCOL:
-                log.info("Multicast packet handled, IP: "+str(ip_packet.dstip))
+                stats.count("stream_packets")
+                group_key = (ip_packet.dstip,ip_packet.srcip)
+                now = time.time()
+                if self.is_suppressed(event, group_key, now):
+                    self.packet_in_stats["suppressed"] += 1
+                    stats.count("stream_packets_suppressed")
+                    return EventHalt
+                
+                self.packet_in_stats["handled"] += 1
+                self.last_handled[group_key] = now
                 if ip_packet.dstip in self.group_addrs:
-                    log.info("New streamer for group key: "+str(ip_packet.dstip)+":"+str(ip_packet.srcip))
-                    group_key = (ip_packet.dstip,ip_packet.srcip)
                     passive_group = self.member_state_builder.get_valid_group_members(ip_packet.dstip,ip_packet.srcip)
-                    log.info("Valid group data for this stream from other component: "+str(passive_group))
-                    self.groups.update({group_key:{"members":passive_group, "streamer":event.dpid}})
-                    log.info("Group after added streamer "+str(self.groups))
+                    fingerprint = self.member_state_builder.get_member_fingerprint(ip_packet.dstip,ip_packet.srcip)
+                    journal.record("stream", "New streamer %s on switch %s, %d member switches", group_key, event.dpid, len(passive_group))
+                    self.set_group(group_key, {"members":passive_group, "streamer":event.dpid, "fingerprint":fingerprint})
+                    journal.state("stream", "Groups after new streamer", lambda: self.groups)
                     self.raise_event_modified(group_key)
+                    self.install_temporary_flow(event, group_key, now)
                 else:
-                    log.info("Incomplete group block")
-                    log.info("New streamer for group key: "+str(ip_packet.dstip)+":"+str(ip_packet.srcip))
-                    group_key = (ip_packet.dstip,ip_packet.srcip)
-                    self.incomplete_groups.update({group_key:{"members":{}, "streamer":event.dpid}})
-                    log.info("Blocked Group after added streamer "+str(self.incomplete_groups))
+                    journal.record("stream", "New streamer %s on switch %s without members, blocked", group_key, event.dpid)
+                    self.set_incomplete_group(group_key, {"members":{}, "streamer":event.dpid, "fingerprint":frozenset()})
+                    journal.state("stream", "Incomplete groups after new streamer", lambda: self.incomplete_groups)
                     self.raise_event_incomplete(group_key,"BLOCK")
                     
                 return EventHalt 
    
+    def _handle_FlowRemoved(self,event):
+        """ Only the idle timeout of a stream's own entry on its streamer's switch retires it, the deletes of the route
+         updates don't """
+        if event.ofp.reason != of.OFPRR_IDLE_TIMEOUT or event.ofp.priority != EXACT_PRIORITY:
+            return
+        match = event.ofp.match
+        if match.nw_dst is None or match.nw_src is None:
+            return
+        group_key = (match.nw_dst,match.nw_src)
+        if self.get_streamer(group_key) != event.dpid:
+            return
+        
+        self.retired_keys.add(group_key)
+        if not self.retire_scheduled:
+            self.retire_scheduled = True
+            core.callLater(self.retire_streams)
+    
+    def retire_streams(self):
+        self.retire_scheduled = False
+        retired_keys = self.retired_keys
+        self.retired_keys = set()
+        
+        for group_key in retired_keys:
+            self.last_handled.pop(group_key, None)
+            self.temporary_flows.pop(group_key, None)
+            if group_key in self.groups:
+                self.pop_group(group_key)
+                self.retire_stats["retired"] += 1
+                self.raise_event_deleted(group_key)
+            elif group_key in self.incomplete_groups:
+                self.pop_incomplete_group(group_key)
+                self.retire_stats["retired_incomplete"] += 1
+        self.retire_stats["batches"] += 1
+        journal.record("stream", "%d idle streams retired", len(retired_keys))
+    
+    def get_retire_stats(self):
+        return dict(self.retire_stats)
+   
     def _handle_MemberStateBuilder_PassiveGroupStateChanged(self,event):
-        log.info("MemberStateBuilder handler invoked")
         if self.member_state_builder is None:
             self.member_state_builder = event.get_member_state_builder()
             
-        log.info("Group addrs before: "+str(self.group_addrs))
-        log.info("Groups before: "+str(self.groups))
+        journal.state("group", "Groups before", lambda: self.groups)
         
         address = event.get_group_addr()
+        journal.record("group", "Members of %s changed", address)
         self.group_addrs.add(address)
+        changed_switches = None
+        if event.get_changed_members() is not None:
+            changed_switches = frozenset(dpid for dpid,port in event.get_changed_members())
         
-        for group_key in self.groups.keys():
-            if group_key[0] == address:
-                passive_group = self.member_state_builder.get_valid_group_members(group_key[0],group_key[1])
-                log.info("Looping the existing groups, actual key: "+str(group_key))
-                log.info("For this key the group members recieved from passive group builder: "+str(passive_group))
-                is_different = self.is_different(self.groups[group_key]["members"],passive_group)
-                if is_different:
-                    self.groups[group_key]["members"] = passive_group
-                    self.raise_event_modified(group_key)
+        for group_key in self.get_group_keys(address):
+            group = self.groups[group_key]
+            passive_group = self.member_state_builder.get_valid_group_members(group_key[0],group_key[1])
+            """ The member state builder returns the same member dict while the members of the source don't change """
+            if passive_group is group["members"]:
+                continue
+            fingerprint = self.member_state_builder.get_member_fingerprint(group_key[0],group_key[1])
+            if fingerprint != group["fingerprint"]:
+                journal.record("group", "Group %s has %d member switches", group_key, len(passive_group))
+                group["members"] = passive_group
+                group["fingerprint"] = fingerprint
+                self.raise_event_modified(group_key, changed_switches)
         
-        log.info("Incomplete groups before event handled: "+str(self.incomplete_groups))
-        to_delete = []
-        for group_key in self.incomplete_groups.keys():
-            if address in group_key:
-                passive_group = self.member_state_builder.get_valid_group_members(group_key[0],group_key[1])
-                log.info("Looping the existing blocked groups, actual key which is updated: "+str(group_key))
-                log.info("For this key the group members recieved from passive group builder: "+str(passive_group))
-                to_delete.append(group_key)
-                self.incomplete_groups[group_key]['members'] = passive_group
-                self.groups.update({group_key:self.incomplete_groups[group_key]})
-                self.raise_event_incomplete(group_key, 'UNBLOCK')
-                self.raise_event_modified(group_key)
-        
-        for group_key in to_delete:
-            self.incomplete_groups.pop(group_key)
-        
-        log.info("Incomplete groups after event handled: "+str(self.incomplete_groups))
-                
-        log.info("Group addrs after: "+str(self.group_addrs))
-        log.info("Groups after: "+str(self.groups))
+        journal.state("group", "Incomplete groups before", lambda: self.incomplete_groups)
+        for group_key in self.get_incomplete_keys(address):
+            group = self.incomplete_groups[group_key]
+            group["members"] = self.member_state_builder.get_valid_group_members(group_key[0],group_key[1])
+            group["fingerprint"] = self.member_state_builder.get_member_fingerprint(group_key[0],group_key[1])
+            journal.record("group", "Incomplete group %s unblocked with %d member switches", group_key, len(group["members"]))
+            self.set_group(group_key, group)
+            self.raise_event_incomplete(group_key, 'UNBLOCK')
+            self.pop_incomplete_group(group_key)
+            self.raise_event_modified(group_key)
+        
+        journal.state("group", "Incomplete groups after", lambda: self.incomplete_groups)
+        journal.state("group", "Groups after", lambda: self.groups)
             
     def _handle_MemberStateBuilder_PassiveGroupDeleted(self,event):
-        log.info("MemberStateBuilder handler invoked")
         if self.member_state_builder is None:
             self.member_state_builder = event.get_member_state_builder()
             
-        log.info("Group addrs before: "+str(self.group_addrs))
-        log.info("Groups before: "+str(self.groups))
+        journal.state("group", "Groups before", lambda: self.groups)
         address = event.get_group_addr()
+        journal.record("group", "Group %s deleted", address)
         
         self.group_addrs.remove(address)
-        for group_key in self.groups.keys():
-            if group_key[0] == address:
-                self.groups.pop(group_key)
-                self.raise_event_deleted(group_key)
-        log.info("Group addrs after: "+str(self.group_addrs))
-        log.info("Groups after: "+str(self.groups))
+        for group_key in self.get_group_keys(address):
+            self.pop_group(group_key)
+            self.last_handled.pop(group_key, None)
+            self.temporary_flows.pop(group_key, None)
+            self.raise_event_deleted(group_key)
+        journal.state("group", "Groups after", lambda: self.groups)
         
         
           
     
-def launch():
-    streamer_state_builder = StreamerStateBuilder()
+def launch(temporary_timeout=2, rate_limit=1.0):
+    """ temporary_timeout: hard timeout of the temporary drop entries of new streams in seconds, 0 disables them,
+     rate_limit: minimal seconds between two handled packets of the same known group key """
+    streamer_state_builder = StreamerStateBuilder(int(temporary_timeout), float(rate_limit))
     core.register("StreamerStateBuilder",streamer_state_builder)
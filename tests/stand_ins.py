@@ -0,0 +1,80 @@
+""" Shared setup of the tests of the POX components. They run on the stand-ins of the benchmark harness (the core, the
+  openflow component and the timers), the rest of POX is the real one, so these tests are skipped when POX is not on the
+  python path:
+      PYTHONPATH=~/pox python -m unittest discover tests
+
+  The components have to be imported after install(), inside the tests, because they bind pox.core.core and
+  pox.lib.recoco.Timer when they are imported.
+  """
+import struct
+import unittest
+
+try:
+    import pox.lib.revent
+    HAVE_POX = True
+except ImportError:
+    HAVE_POX = False
+
+requires_pox = unittest.skipUnless(HAVE_POX, "POX is not on the python path")
+
+
+def install():
+    """ Installs the stand-ins, or resets them when they are installed already, and returns the stand-in core """
+    import benchmark_harness
+    return benchmark_harness.install_stand_ins()
+
+def make_harness(host_ports, links=(), **options):
+    """ A benchmark harness on the given switches, with the default pipeline options changed by the keyword arguments """
+    import benchmark_harness
+    harness_options = benchmark_harness.parse_arguments([])
+    for name,value in options.iteritems():
+        setattr(harness_options, name, value)
+    return benchmark_harness.Harness(benchmark_harness.Topology("test", list(links), host_ports), harness_options)
+
+def record(**attributes):
+    import benchmark_harness
+    return benchmark_harness._Record(**attributes)
+
+def igmp_packet_in(dpid, port, igmp_packet):
+    """ PacketIn event of a parsed IGMP packet, with the attributes the components read """
+    import pox.lib.packet as pkt
+    ip_packet = record(protocol=pkt.ipv4.IGMP_PROTOCOL, IGMP_PROTOCOL=pkt.ipv4.IGMP_PROTOCOL, next=igmp_packet, payload=igmp_packet)
+    return record(dpid=dpid, port=port, parsed=record(type=pkt.ethernet.IP_TYPE, payload=ip_packet, next=ip_packet))
+
+def report_v2(dpid, port, address, leave=False):
+    from member_state_builder import MEMBERSHIP_REPORT_V2,LEAVE_GROUP_V2
+    return igmp_packet_in(dpid, port, record(ver_and_type=LEAVE_GROUP_V2 if leave else MEMBERSHIP_REPORT_V2, address=address))
+
+def report_v3(dpid, port, records):
+    """ records: [(record type,group address,[sources])] """
+    from member_state_builder import MEMBERSHIP_REPORT_V3
+    group_records = [record(type=record_type, address=address, src_addr=list(sources)) for record_type,address,sources in records]
+    return igmp_packet_in(dpid, port, record(ver_and_type=MEMBERSHIP_REPORT_V3, grp_num=len(group_records), grp_rec=group_records))
+
+def stream_packet_in(dpid, port, address, source):
+    """ PacketIn event of a multicast UDP packet of the source """
+    import pox.lib.packet as pkt
+    ip_packet = record(protocol=pkt.ipv4.UDP_PROTOCOL, IGMP_PROTOCOL=pkt.ipv4.IGMP_PROTOCOL, dstip=address, srcip=source)
+    return record(dpid=dpid, port=port, parsed=record(type=pkt.ethernet.IP_TYPE, payload=ip_packet, next=ip_packet))
+
+
+class RecordingConnection(object):
+    """ Keeps every send call as a list of (message type,xid,packed message) """
+
+    def __init__(self, dpid):
+        self.dpid = dpid
+        self.sends = []
+
+    def send(self, data):
+        if not isinstance(data, bytes):
+            data = data.pack()
+        messages = []
+        offset = 0
+        while offset + 8 <= len(data):
+            version,message_type,length,xid = struct.unpack_from("!BBHL", data, offset)
+            messages.append((message_type,xid,data[offset:offset + length]))
+            offset += length
+        self.sends.append(messages)
+
+    def xids(self, index=-1):
+        return [xid for message_type,xid,raw in self.sends[index]]
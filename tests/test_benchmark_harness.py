@@ -0,0 +1,129 @@
+""" Tests of the benchmark harness: the generated topologies, the stand-in core and timers, and the phases on a small ring """
+import unittest
+
+from stand_ins import requires_pox,install,make_harness,record
+
+
+class TopologyTest(unittest.TestCase):
+    def setUp(self):
+        import benchmark_harness
+        self.harness_module = benchmark_harness
+
+    def test_fat_tree(self):
+        topology = self.harness_module.fat_tree_topology(4)
+        self.assertEqual((len(topology.switches),len(topology.links),len(topology.all_host_ports())), (20,32,16))
+
+    def test_ports_are_numbered_in_link_order(self):
+        topology = self.harness_module.ring_topology(3, 1)
+        self.assertEqual(topology.links, [(1,1,2,1), (2,2,3,1), (3,2,1,2)])
+        self.assertEqual(topology.host_ports, {1:[3], 2:[3], 3:[3]})
+
+    def test_mininet_topologies(self):
+        customupg = self.harness_module.make_topology("customupg", 0)
+        loop_topo = self.harness_module.make_topology("loop_topo", 0)
+        self.assertEqual((customupg.switches,len(customupg.links),len(customupg.all_host_ports())), ([9,10,11,12,13],4,8))
+        self.assertEqual(len(loop_topo.links), 5)
+        self.assertRaises(ValueError, self.harness_module.make_topology, "mesh", 4)
+
+
+@requires_pox
+class StandInCoreTest(unittest.TestCase):
+    def setUp(self):
+        self.core = install()
+
+    def test_reinstall_resets_the_same_core(self):
+        import benchmark_harness
+        self.core.register("Component", record())
+        self.core.callLater(lambda: None)
+        benchmark_harness.StandInTimer(1, lambda: None)
+        self.assertIs(install(), self.core)
+        self.assertEqual((self.core.components,len(self.core.later),benchmark_harness.StandInTimer.timers), ({},0,[]))
+        self.assertFalse(hasattr(self.core, "Component"))
+
+    def test_dependency_without_events_is_bound(self):
+        """ The FlowReconciler depends on the MulticastTrafficManager, which raises no events """
+        from flow_reconciler import FlowReconciler
+        reconciler = FlowReconciler(interval=0)
+        manager = record(flow_aggregator=None)
+        self.core.register("MulticastTrafficManager", manager)
+        self.assertIs(reconciler.multicast_traffic_manager, manager)
+
+    def test_recurring_timer_stops_when_its_callback_returns_false(self):
+        import benchmark_harness
+        calls = []
+        timer = benchmark_harness.StandInTimer(10, lambda: calls.append(1) or len(calls) < 2, recurring=True)
+        timer.fire()
+        self.assertFalse(timer.cancelled)
+        self.assertGreater(timer.deadline, timer.interval)
+        timer.fire()
+        self.assertTrue(timer.cancelled)
+
+
+@requires_pox
+class HarnessTest(unittest.TestCase):
+    """ Ring of 3 switches with one host port each """
+    def setUp(self):
+        import benchmark_harness
+        topology = benchmark_harness.ring_topology(3, 1)
+        self.harness = make_harness(topology.host_ports, topology.links, settle_window=0)
+        self.links = topology.links
+        self.group = self.harness.IPAddr("232.1.1.1")
+        self.source = self.harness.IPAddr("10.0.0.1")
+
+    def link_events(self):
+        events = []
+        for dpid1,port1,dpid2,port2 in self.links:
+            events.extend([self.harness.link_event(True, dpid1, port1, dpid2, port2),
+                           self.harness.link_event(True, dpid2, port2, dpid1, port1)])
+        return events
+
+    def test_phases_count_the_events_and_flow_mods(self):
+        result = self.harness.run_phase("links", self.link_events())
+        self.assertEqual((result["phase"],result["events"],result["flow_mods"]), ("links",6,0))
+        self.assertEqual(sum(len(to_nodes) for to_nodes in self.harness.graph_builder.get_edges().itervalues()), 6)
+
+        self.harness.run_phase("joins", [self.harness.report_v2(3, 3, self.group)])
+        result = self.harness.run_phase("streams", [self.harness.stream_event(1, 3, self.group, self.source)] * 2)
+        """ The root and the member switch, the second packet is suppressed """
+        self.assertEqual((result["events"],result["flow_mods"]), (2,2))
+        self.assertEqual(self.harness.streamer_state_builder.get_packet_in_stats()["suppressed"], 1)
+        self.assertEqual([phase["phase"] for phase in self.harness.phase_results], ["links","joins","streams"])
+
+    def test_barriers_are_answered_before_the_next_event(self):
+        self.harness.run_phase("links", self.link_events())
+        self.harness.handle(*self.harness.report_v2(3, 3, self.group))
+        self.harness.handle(*self.harness.stream_event(1, 3, self.group, self.source))
+        flow_programmer = self.harness.multicast_traffic_manager.flow_programmer
+        self.assertEqual((flow_programmer.in_flight,len(flow_programmer.waves)), (set(),0))
+        self.assertEqual(self.harness.message_counts[self.harness.of.OFPT_BARRIER_REQUEST], 2)
+
+    def test_drain_fires_the_one_shot_timers(self):
+        self.harness.graph_builder.settle_window = 10
+        for event in self.link_events():
+            self.harness.handle(*event)
+        self.assertEqual(self.harness.graph_builder.get_version(), 0)
+        self.harness.fire_timers()
+        self.assertEqual(self.harness.graph_builder.get_version(), 0)
+        self.harness.fire_timers(drain=True)
+        self.assertNotEqual(self.harness.graph_builder.get_version(), 0)
+
+    def test_component_options_are_passed_on(self):
+        import benchmark_harness
+        options = benchmark_harness.parse_arguments(["--membership_interval", "125", "--rate_limit", "0.5",
+                                                     "--aggregate_min_prefix", "16"])
+        harness = benchmark_harness.Harness(benchmark_harness.ring_topology(3, 1), options)
+        self.assertEqual((harness.member_state_builder.membership_interval,harness.member_state_builder.query_interval), (125.0,0))
+        self.assertEqual((harness.streamer_state_builder.rate_limit,harness.streamer_state_builder.temporary_timeout), (0.5,0))
+        self.assertEqual(harness.multicast_traffic_manager.flow_aggregator.min_prefix, 16)
+
+    def test_run_reports_every_phase(self):
+        import benchmark_harness
+        options = benchmark_harness.parse_arguments(["--topology", "ring", "--size", "4", "--groups", "3", "--members", "2",
+                                                     "--churn", "5", "--link_failures", "1"])
+        result = benchmark_harness.Harness(benchmark_harness.make_topology("ring", 4), options).run()
+        self.assertEqual([(phase["phase"],phase["events"]) for phase in result["phases"]],
+                         [("links",8), ("joins",6), ("streams",3), ("churn",5), ("repair",4)])
+        self.assertGreater(result["flow_mods"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
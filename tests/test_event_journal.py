@@ -0,0 +1,69 @@
+""" Tests of the event journal: the sampling, the ring buffer, the lazy formatting and the state dumps """
+import sys
+import unittest
+from StringIO import StringIO
+
+from stand_ins import requires_pox,install
+
+
+@requires_pox
+class EventJournalTest(unittest.TestCase):
+    def setUp(self):
+        install()
+        from event_journal import EventJournal
+        self.journal = EventJournal(size=4)
+
+    def messages(self, category=None, last=None):
+        return [line.split("] ", 1)[1] for line in self.journal.dump(category, last)]
+
+    def test_every_nth_record_is_kept(self):
+        self.journal.set_sample_rate("igmp", 3)
+        for index in xrange(7):
+            self.journal.record("igmp", "report %d", index)
+        self.assertEqual(self.messages(), ["report 2","report 5"])
+        self.assertEqual(self.journal.get_stats()["dropped"], {"igmp":5})
+
+    def test_zero_rate_drops_the_category(self):
+        self.journal.set_sample_rate("stream", 0)
+        self.journal.record("stream", "packet")
+        self.journal.record("route", "update")
+        self.assertEqual(self.messages(), ["update"])
+        self.assertEqual(self.journal.get_stats()["seen"], {"stream":1, "route":1})
+
+    def test_ring_buffer_keeps_the_last_records(self):
+        for index in xrange(6):
+            self.journal.record("route" if index % 2 else "igmp", "record %d", index)
+        self.assertEqual(self.messages(), ["record 2","record 3","record 4","record 5"])
+        self.assertEqual(self.messages("route", 1), ["record 5"])
+
+    def test_arguments_are_formatted_at_the_dump(self):
+        members = [1]
+        self.journal.record("group", "members %s", members)
+        members.append(2)
+        self.journal.record("group", "bad format %d", "x")
+        self.assertEqual(self.messages(), ["members [1, 2]","bad format %d ('x',)"])
+
+    def test_state_is_only_taken_when_dumped(self):
+        calls = []
+        def state():
+            calls.append(1)
+            return {"groups":1}
+        self.journal.state("group", "Groups", state)
+        self.assertEqual((calls,self.messages()), ([],[]))
+        self.journal.dump_state = True
+        self.journal.state("group", "Groups", state)
+        self.assertEqual(self.messages(), ["Groups: {'groups': 1}"])
+
+    def test_print_dump(self):
+        self.journal.record("igmp", "report")
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            self.journal.print_dump()
+            printed = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        self.assertTrue(printed.endswith("[igmp] report\n"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+""" Tests of the event trace format and of the offline replay """
+import os
+import shutil
+import tempfile
+import unittest
+
+import event_trace
+from event_trace import TraceWriter,read_trace,LINK_ADDED,LINK_REMOVED,PACKET_IN,CONFIG
+from stand_ins import requires_pox
+
+
+class _TraceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "test.trace")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+class TraceFormatTest(_TraceTestCase):
+    def write_records(self):
+        writer = TraceWriter(self.path)
+        writer.write_link(100.5, True, 1, 2, 0x10000000000, 3)
+        writer.write_packet_in(101.25, 2, 4, b"\x01\x02\x03")
+        writer.write_link(102.0, False, 1, 2, 0x10000000000, 3)
+        writer.close()
+        return writer
+
+    def test_round_trip(self):
+        writer = self.write_records()
+        self.assertEqual(list(read_trace(self.path)), [(LINK_ADDED,100.5,1,(2,0x10000000000,3)),
+                                                      (PACKET_IN,101.25,2,(4,b"\x01\x02\x03")),
+                                                      (LINK_REMOVED,102.0,1,(2,0x10000000000,3))])
+        self.assertEqual(writer.stats["records"], 3)
+        self.assertEqual(writer.stats["bytes"] + len(event_trace.MAGIC), os.path.getsize(self.path))
+
+    def test_append_writes_the_header_once(self):
+        self.write_records()
+        writer = TraceWriter(self.path)
+        writer.write_packet_in(103.0, 5, 1, b"")
+        writer.close()
+        records = list(read_trace(self.path))
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[-1], (PACKET_IN,103.0,5,(1,b"")))
+
+    def test_config_round_trip(self):
+        writer = TraceWriter(self.path)
+        writer.write_config(99.0, {"membership_interval":125.0, "rate_limit":0.5})
+        writer.close()
+        self.write_records()
+        records = list(read_trace(self.path))
+        self.assertEqual(records[0], (CONFIG,99.0,0,{"membership_interval":125.0, "rate_limit":0.5}))
+        self.assertEqual([record[0] for record in records[1:]], [LINK_ADDED,PACKET_IN,LINK_REMOVED])
+
+    def test_truncated_tail_is_skipped(self):
+        self.write_records()
+        size = os.path.getsize(self.path)
+        for cut in (1, 5, event_trace.LINK_BODY.size + 1):
+            with open(self.path, "r+b") as trace_file:
+                trace_file.truncate(size - cut)
+            self.assertEqual([record[0] for record in read_trace(self.path)], [LINK_ADDED,PACKET_IN])
+
+    def test_truncated_packet_data(self):
+        writer = TraceWriter(self.path)
+        writer.write_packet_in(1.0, 1, 1, b"\x00" * 10)
+        writer.close()
+        with open(self.path, "r+b") as trace_file:
+            trace_file.truncate(os.path.getsize(self.path) - 4)
+        self.assertEqual(list(read_trace(self.path)), [])
+
+    def test_not_a_trace(self):
+        with open(self.path, "wb") as trace_file:
+            trace_file.write(b"something else")
+        self.assertRaises(ValueError, list, read_trace(self.path))
+
+    def test_unknown_record_kind(self):
+        writer = TraceWriter(self.path)
+        writer.write(event_trace.RECORD_HEADER.pack(9, 1.0, 1))
+        writer.close()
+        self.assertRaises(ValueError, list, read_trace(self.path))
+
+
+@requires_pox
+class ReplayTest(_TraceTestCase):
+    def stream_packet(self):
+        import pox.lib.packet as pkt
+        from pox.lib.addresses import IPAddr,EthAddr
+        udp_packet = pkt.udp(srcport=5000, dstport=5001)
+        udp_packet.payload = b"stream"
+        ip_packet = pkt.ipv4(protocol=pkt.ipv4.UDP_PROTOCOL, srcip=IPAddr("10.0.0.1"), dstip=IPAddr("232.1.1.1"))
+        ip_packet.payload = udp_packet
+        eth_packet = pkt.ethernet(type=pkt.ethernet.IP_TYPE, src=EthAddr("00:00:00:00:00:01"), dst=EthAddr("01:00:5e:01:01:01"))
+        eth_packet.payload = ip_packet
+        return eth_packet.pack()
+
+    def write_trace(self, config=None):
+        writer = TraceWriter(self.path)
+        if config is not None:
+            writer.write_config(9.0, config)
+        writer.write_link(10.0, True, 1, 1, 2, 1)
+        writer.write_link(10.0, True, 2, 1, 1, 1)
+        writer.write_packet_in(11.0, 1, 2, self.stream_packet())
+        writer.close()
+
+    def replay(self, arguments=[]):
+        import benchmark_harness
+        options = benchmark_harness.parse_arguments(arguments)
+        options.speed = 0
+        options.flow_mods = os.path.join(self.directory, "flow_mods.txt")
+        return event_trace.replay(self.path, options),options
+
+    def test_replay(self):
+        self.write_trace()
+        result,options = self.replay()
+        self.assertEqual((result["events"],result["switches"],result["trace_seconds"]), (3,2,1.0))
+
+        """ The stream without members is blocked on its ingress switch """
+        self.assertEqual(result["flow_mods"], 1)
+        with open(options.flow_mods) as flow_mod_file:
+            lines = flow_mod_file.readlines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith("1 "))
+        self.assertEqual(result["config"], {})
+
+    def test_recorded_options_are_applied_unless_given(self):
+        """ The options of the first recording apply, the trace time is counted from the first event """
+        self.write_trace({"membership_interval":125.0, "query_interval":60.0, "aggregate_min_prefix":16})
+        with open(self.path, "ab") as trace_file:
+            trace_file.write(event_trace.RECORD_HEADER.pack(CONFIG, 12.0, 0) + event_trace.CONFIG_BODY.pack(2) + b"{}")
+        result,options = self.replay(["--query_interval", "30"])
+        self.assertEqual(result["config"], {"membership_interval":125.0, "aggregate_min_prefix":16})
+        self.assertEqual((result["events"],result["trace_seconds"]), (3,1.0))
+        self.assertEqual((options.membership_interval,options.query_interval), (125.0,30.0))
+
+
+@requires_pox
+class RecorderConfigTest(unittest.TestCase):
+    def test_options_of_the_registered_components(self):
+        from stand_ins import install
+        core = install()
+        from member_state_builder import MemberStateBuilder
+        from multicast_traffic_manager import MulticastTrafficManager
+        core.register("MemberStateBuilder", MemberStateBuilder(membership_interval=125, query_interval=60))
+        core.register("MulticastTrafficManager", MulticastTrafficManager(aggregate_min_prefix=16))
+        config = event_trace.component_config(core)
+        self.assertEqual((config["membership_interval"],config["query_interval"],config["aggregate_min_prefix"]), (125,60,16))
+        self.assertFalse("rate_limit" in config)
+
+if __name__ == "__main__":
+    unittest.main()
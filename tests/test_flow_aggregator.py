@@ -0,0 +1,120 @@
+""" Tests of the flow table aggregation: the exact, group and prefix rules, and the flow mod operations of the updates """
+import unittest
+
+from stand_ins import requires_pox,install
+
+
+@requires_pox
+class FlowAggregatorTest(unittest.TestCase):
+    def setUp(self):
+        import pox.openflow.libopenflow_01 as of
+        from pox.lib.addresses import IPAddr
+        from flow_aggregator import FlowAggregator,rule_priority,EXACT_PRIORITY,GROUP_PRIORITY,PREFIX_PRIORITY
+        self.of = of
+        self.IPAddr = IPAddr
+        self.aggregator = FlowAggregator(enabled=True, min_prefix=24)
+        self.rule_priority = rule_priority
+        self.priorities = (EXACT_PRIORITY,GROUP_PRIORITY,PREFIX_PRIORITY)
+
+    def addr(self, address):
+        return self.IPAddr(address).toUnsigned()
+
+    def update(self, group_addr, source, route, in_ports, aggregator=None):
+        return (aggregator or self.aggregator).update_group((group_addr,self.IPAddr(source)), route, in_ports)
+
+    def test_streamer_switch_gets_exact_rule_transit_switch_group_rule(self):
+        source = self.IPAddr("10.0.0.1")
+        operations = self.update("232.0.0.1", "10.0.0.1", {1:[5], 2:[2,3]}, {2:1})
+        self.assertEqual(sorted(operations), sorted([
+            (1,self.of.OFPFC_ADD,(self.addr("232.0.0.1"),32,source,None),(5,)),
+            (2,self.of.OFPFC_ADD,(self.addr("232.0.0.1"),32,None,1),(2,3))]))
+        self.assertEqual(self.rule_priority((self.addr("232.0.0.1"),32,source,None)), self.priorities[0])
+        self.assertEqual(self.rule_priority((self.addr("232.0.0.1"),32,None,1)), self.priorities[1])
+
+    def test_identical_siblings_are_merged(self):
+        self.update("232.0.0.0", "10.0.0.1", {2:[2,3]}, {2:1})
+        operations = self.update("232.0.0.1", "10.0.0.1", {2:[3,2]}, {2:1})
+        self.assertEqual(operations, [
+            (2,self.of.OFPFC_ADD,(self.addr("232.0.0.0"),31,None,1),(2,3)),
+            (2,self.of.OFPFC_DELETE_STRICT,(self.addr("232.0.0.0"),32,None,1),())])
+        self.assertEqual(self.aggregator.get_switch_rules(2), {(self.addr("232.0.0.0"),31,None,1):(2,3)})
+        self.assertEqual(self.aggregator.get_stats()["switches"][2], {"entries":2, "rules":1})
+
+    def test_diverging_trees_are_split(self):
+        self.update("232.0.0.0", "10.0.0.1", {2:[2,3]}, {2:1})
+        self.update("232.0.0.1", "10.0.0.1", {2:[2,3]}, {2:1})
+        self.update("232.0.0.1", "10.0.0.1", {2:[4]}, {2:1})
+        self.assertEqual(self.aggregator.get_switch_rules(2), {(self.addr("232.0.0.0"),32,None,1):(2,3),
+                                                              (self.addr("232.0.0.1"),32,None,1):(4,)})
+
+    def test_merging_stops_at_the_min_prefix(self):
+        for index in xrange(256):
+            self.update("232.0.0.%d" % index, "10.0.0.1", {2:[2]}, {2:1})
+        self.update("232.0.1.0", "10.0.0.1", {2:[2]}, {2:1})
+        self.assertEqual(self.aggregator.get_switch_rules(2), {(self.addr("232.0.0.0"),24,None,1):(2,),
+                                                              (self.addr("232.0.1.0"),32,None,1):(2,)})
+
+    def test_merged_rules_never_cover_an_absent_group(self):
+        """ 232.0.0.3 is not on the switch, so 232.0.0.2 can't be merged into a /30 """
+        for index in xrange(3):
+            self.update("232.0.0.%d" % index, "10.0.0.1", {2:[2]}, {2:1})
+        self.assertEqual(self.aggregator.get_switch_rules(2), {(self.addr("232.0.0.0"),31,None,1):(2,),
+                                                              (self.addr("232.0.0.2"),32,None,1):(2,)})
+
+    def test_prefix_rule_flow_mod(self):
+        install()
+        from multicast_traffic_manager import MulticastTrafficManager
+        rule_key = (self.addr("232.0.0.0"),31,None,1)
+        msg = MulticastTrafficManager().make_rule_flow_mod(rule_key, (2,3))
+        self.assertEqual(msg.match.get_nw_dst(), (self.IPAddr("232.0.0.0"),31))
+        self.assertEqual((msg.match.nw_src,msg.match.in_port,msg.priority), (None,1,self.priorities[2]))
+        self.assertEqual([action.port for action in msg.actions], [2,3])
+
+    def test_sources_on_different_in_ports_stay_exact(self):
+        self.update("232.0.0.1", "10.0.0.1", {2:[2]}, {2:1})
+        self.update("232.0.0.1", "10.0.0.2", {2:[2]}, {2:3})
+        self.assertEqual(sorted(self.aggregator.get_switch_rules(2).keys()), sorted([
+            (self.addr("232.0.0.1"),32,self.IPAddr("10.0.0.1"),None),
+            (self.addr("232.0.0.1"),32,self.IPAddr("10.0.0.2"),None)]))
+
+    def test_modify_and_remove(self):
+        self.update("232.0.0.1", "10.0.0.1", {1:[5], 2:[2]}, {2:1})
+        operations = self.update("232.0.0.1", "10.0.0.1", {1:[5], 2:[2,4]}, {2:1})
+        self.assertEqual(operations, [(2,self.of.OFPFC_MODIFY_STRICT,(self.addr("232.0.0.1"),32,None,1),(2,4))])
+
+        operations = self.update("232.0.0.1", "10.0.0.1", {}, {})
+        self.assertEqual(sorted(command for dpid,command,rule_key,out_ports in operations), [self.of.OFPFC_DELETE_STRICT] * 2)
+        self.assertEqual(self.aggregator.get_switch_rules(1), {})
+        self.assertEqual(self.aggregator.get_stats(), {"entries":0, "rules":0, "switches":{}, "forgotten":0})
+
+    def test_forgotten_rule_is_added_on_the_next_change(self):
+        from flow_aggregator import match_rule_key
+        self.update("232.0.0.1", "10.0.0.1", {1:[5], 2:[2]}, {2:1})
+        group_rule = (self.addr("232.0.0.1"),32,None,1)
+        match = self.of.ofp_match()
+        match.dl_type = 0x800
+        match.in_port = 1
+        match.nw_dst = self.IPAddr("232.0.0.1")
+        self.assertEqual(match_rule_key(match, 65534), group_rule)
+        self.assertIsNone(match_rule_key(match, 100))
+
+        self.assertTrue(self.aggregator.forget_rule(2, group_rule))
+        self.assertFalse(self.aggregator.forget_rule(2, group_rule))
+        self.assertIsNone(self.aggregator.get_rule(2, group_rule))
+        self.assertEqual(self.update("232.0.0.1", "10.0.0.1", {1:[5], 2:[2,4]}, {2:1}), [(2,self.of.OFPFC_ADD,group_rule,(2,4))])
+        self.assertEqual(self.aggregator.get_stats()["forgotten"], 1)
+
+    def test_unchanged_route_gives_no_operation(self):
+        self.update("232.0.0.1", "10.0.0.1", {1:[5], 2:[2]}, {2:1})
+        self.assertEqual(self.update("232.0.0.1", "10.0.0.1", {1:[5], 2:[2]}, {2:1}), [])
+
+    def test_disabled_aggregation_gives_exact_rules(self):
+        from flow_aggregator import FlowAggregator
+        aggregator = FlowAggregator(enabled=False)
+        self.update("232.0.0.0", "10.0.0.1", {2:[2]}, {2:1}, aggregator)
+        self.update("232.0.0.1", "10.0.0.1", {2:[2]}, {2:1}, aggregator)
+        self.assertEqual(sorted(rule_key[1:] for rule_key in aggregator.get_switch_rules(2)),
+                         [(32,self.IPAddr("10.0.0.1"),None)] * 2)
+
+if __name__ == "__main__":
+    unittest.main()
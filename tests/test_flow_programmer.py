@@ -0,0 +1,199 @@
+""" Tests of the flow programmer: the batches, the waves of the stages, the barrier confirmations, the retries, the replay
+  to reconnected switches and the bounds of the waiting messages """
+import time
+import unittest
+
+from stand_ins import requires_pox,install,record,RecordingConnection
+
+
+@requires_pox
+class FlowProgrammerTest(unittest.TestCase):
+    def setUp(self):
+        self.core = install()
+        import pox.openflow.libopenflow_01 as of
+        from flow_programmer import FlowProgrammer
+        self.of = of
+        self.connections = {}
+        for dpid in (1,2):
+            self.connect(dpid)
+        self.programmer = FlowProgrammer(barrier_timeout=5.0, max_retries=2)
+
+    def connect(self, dpid):
+        self.connections[dpid] = self.core.openflow.connections[dpid] = RecordingConnection(dpid)
+
+    def flow_mods(self, count):
+        return [self.of.ofp_flow_mod() for index in xrange(count)]
+
+    def sent_xids(self, dpid):
+        """ The xids of every message sent to the switch, without the barriers """
+        return [xid for messages in self.connections[dpid].sends for message_type,xid,raw in messages
+                if message_type != self.of.OFPT_BARRIER_REQUEST]
+
+    def barrier_xid(self, dpid, index=-1):
+        message_type,xid,raw = self.connections[dpid].sends[index][-1]
+        self.assertEqual(message_type, self.of.OFPT_BARRIER_REQUEST)
+        return xid
+
+    def reply(self, dpid, index=-1):
+        self.core.openflow.raiseEvent("BarrierIn", record(dpid=dpid, xid=self.barrier_xid(dpid, index)))
+
+    def age_unconfirmed(self, seconds):
+        for batch in self.programmer.unconfirmed.itervalues():
+            batch["sent"] -= seconds
+
+    def test_one_batch_per_switch(self):
+        first = self.flow_mods(3)
+        second = self.flow_mods(1)
+        for msg in first:
+            self.programmer.send(1, msg)
+        self.programmer.send(2, second[0])
+        self.assertEqual(self.connections[1].sends, [])
+        self.core.run_later()
+
+        self.assertEqual(len(self.connections[1].sends), 1)
+        self.assertEqual(self.sent_xids(1), [msg.xid for msg in first])
+        self.assertEqual(self.sent_xids(2), [second[0].xid])
+        self.assertEqual(self.programmer.get_stats()["batches"], 2)
+        self.assertEqual(self.programmer.get_stats()["unconfirmed"], 2)
+
+        self.reply(1)
+        self.reply(2)
+        stats = self.programmer.get_stats()
+        self.assertEqual((stats["confirmed"],stats["unconfirmed"],stats["replies"]), (2,0,2))
+
+    def test_stages_wait_for_the_barriers(self):
+        """ The later stage (the upstream switch) is only sent when the earlier one is confirmed """
+        downstream,upstream = self.flow_mods(2)
+        self.programmer.send(1, upstream, (0,-1))
+        self.programmer.send(2, downstream, (0,-2))
+        self.core.run_later()
+        self.assertEqual(self.sent_xids(2), [downstream.xid])
+        self.assertEqual(self.sent_xids(1), [])
+
+        self.reply(2)
+        self.assertEqual(self.sent_xids(1), [upstream.xid])
+        self.assertEqual(self.programmer.get_stats()["waves"], 2)
+
+    def test_later_round_waits_for_the_earlier(self):
+        first,second = self.flow_mods(2)
+        self.programmer.send(1, first, (1,0))
+        self.core.run_later()
+        self.programmer.send(1, second)
+        self.core.run_later()
+        self.assertEqual(self.sent_xids(1), [first.xid])
+        self.assertEqual(self.programmer.get_stats()["queued_waves"], 1)
+
+        self.reply(1)
+        self.assertEqual(self.sent_xids(1), [first.xid,second.xid])
+
+    def test_reply_confirms_the_earlier_batches(self):
+        first,second = self.flow_mods(2)
+        self.programmer.send_batch(1, [first])
+        self.programmer.send_batch(1, [second])
+        self.reply(1)
+        self.assertEqual(self.programmer.get_stats()["unconfirmed"], 0)
+        self.assertEqual(self.programmer.get_stats()["confirmed"], 2)
+
+    def test_retry_merges_the_batches_in_order(self):
+        first,second = self.flow_mods(2)
+        self.programmer.send_batch(1, [first])
+        self.programmer.send_batch(1, [second])
+        self.age_unconfirmed(10)
+        self.programmer.check_unconfirmed()
+
+        self.assertEqual(self.connections[1].xids()[:-1], [first.xid,second.xid])
+        stats = self.programmer.get_stats()
+        self.assertEqual((stats["retried"],stats["merged"],stats["unconfirmed"]), (1,1,1))
+
+    def test_retry_gives_up(self):
+        msg = self.flow_mods(1)[0]
+        self.programmer.send(1, msg)
+        self.core.run_later()
+        for retry in xrange(3):
+            self.age_unconfirmed(10)
+            self.programmer.check_unconfirmed()
+        self.assertEqual(self.sent_xids(1), [msg.xid] * 3)
+        self.assertEqual(self.programmer.get_stats()["unconfirmed"], 0)
+
+    def test_not_timed_out_batch_is_kept(self):
+        self.programmer.send_batch(1, self.flow_mods(1))
+        self.programmer.check_unconfirmed()
+        self.assertEqual(len(self.connections[1].sends), 1)
+
+    def test_replay_after_reconnect_keeps_the_order(self):
+        first,second = self.flow_mods(2)
+        self.programmer.send(1, first)
+        self.core.run_later()
+
+        self.core.openflow.connections.pop(1)
+        self.core.openflow.raiseEvent("ConnectionDown", record(dpid=1))
+        self.programmer.send(1, second)
+        self.core.run_later()
+        self.assertEqual(self.programmer.get_stats()["waiting"], 2)
+
+        self.connect(1)
+        self.core.openflow.raiseEvent("ConnectionUp", record(dpid=1))
+        self.assertEqual(self.sent_xids(1), [first.xid,second.xid])
+        stats = self.programmer.get_stats()
+        self.assertEqual((stats["replayed"],stats["waiting"],stats["unconfirmed"]), (2,0,1))
+
+    def test_disconnected_switch_does_not_hold_the_wave(self):
+        downstream,upstream = self.flow_mods(2)
+        self.programmer.send(2, downstream, (0,-2))
+        self.programmer.send(1, upstream, (0,-1))
+        self.core.run_later()
+        self.core.openflow.connections.pop(2)
+        self.core.openflow.raiseEvent("ConnectionDown", record(dpid=2))
+        self.assertEqual(self.sent_xids(1), [upstream.xid])
+
+    def disconnect(self, dpid):
+        self.core.openflow.connections.pop(dpid)
+        self.core.openflow.raiseEvent("ConnectionDown", record(dpid=dpid))
+
+    def test_too_many_waiting_messages_are_dropped(self):
+        self.programmer.max_waiting = 3
+        self.disconnect(1)
+        for msg in self.flow_mods(3):
+            self.programmer.send(1, msg)
+        self.core.run_later()
+        self.assertEqual(self.programmer.get_stats()["waiting"], 3)
+
+        self.programmer.send(1, self.of.ofp_flow_mod())
+        self.core.run_later()
+        stats = self.programmer.get_stats()
+        self.assertEqual((stats["waiting"],stats["dropped"]), (0,4))
+
+    def test_waiting_messages_are_dropped_after_the_timeout(self):
+        self.programmer.waiting_timeout = 30.0
+        first = self.of.ofp_flow_mod()
+        self.programmer.send(1, first)
+        self.core.run_later()
+        self.disconnect(1)
+        self.programmer.send(1, self.of.ofp_flow_mod())
+        self.programmer.send(2, self.of.ofp_flow_mod())
+        self.core.run_later()
+        self.programmer.check_unconfirmed()
+        self.assertEqual(self.programmer.get_stats()["waiting"], 2)
+
+        """ The unconfirmed batch of the disconnected switch waits with the rest, and goes with them """
+        self.programmer.waiting_since[1] -= 30.0
+        self.programmer.check_unconfirmed()
+        stats = self.programmer.get_stats()
+        self.assertEqual((stats["waiting"],stats["dropped"]), (0,2))
+        self.connect(1)
+        self.core.openflow.raiseEvent("ConnectionUp", record(dpid=1))
+        self.assertEqual(self.connections[1].sends, [])
+
+    def test_discard(self):
+        first,second = self.flow_mods(2)
+        self.programmer.send(1, first)
+        self.core.run_later()
+        self.programmer.send(1, second)
+        self.programmer.discard(1)
+        self.core.run_later()
+        stats = self.programmer.get_stats()
+        self.assertEqual((stats["unconfirmed"],stats["waiting"],stats["queued_waves"]), (0,0,0))
+        self.assertEqual(self.sent_xids(1), [first.xid])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+""" Tests of the FlowReconciler against the rules of the MulticastTrafficManager's flow aggregator and the streams of the
+  StreamerStateBuilder """
+import time
+import unittest
+
+from stand_ins import requires_pox,install,record,RecordingConnection
+
+GROUP = "232.1.1.1"
+SOURCE = "10.0.0.1"
+
+
+@requires_pox
+class FlowReconcilerTest(unittest.TestCase):
+    """ The stream enters on switch 1, switch 2 forwards it from port 1 to the member on port 2 """
+    def setUp(self):
+        self.core = install()
+        import pox.openflow.libopenflow_01 as of
+        from pox.lib.addresses import IPAddr
+        from multicast_traffic_manager import MulticastTrafficManager
+        from streamer_state_builder import StreamerStateBuilder,TEMPORARY_PRIORITY
+        from flow_aggregator import EXACT_PRIORITY,GROUP_PRIORITY
+        from flow_reconciler import FlowReconciler
+        self.of = of
+        self.IPAddr = IPAddr
+        self.priorities = (EXACT_PRIORITY,GROUP_PRIORITY,TEMPORARY_PRIORITY)
+
+        self.manager = MulticastTrafficManager()
+        self.streamer_state_builder = StreamerStateBuilder(temporary_timeout=2)
+        self.core.register("StreamerStateBuilder", self.streamer_state_builder)
+        self.core.register("FlowProgrammer", self.manager.flow_programmer)
+        self.reconciler = FlowReconciler(interval=0)
+        self.reconciler.multicast_traffic_manager = self.manager
+
+        self.group_key = (IPAddr(GROUP),IPAddr(SOURCE))
+        self.manager.flow_aggregator.update_group(self.group_key, {1:[1], 2:[2]}, {2:1})
+        self.group_rule = (IPAddr(GROUP).toUnsigned(),32,None,1)
+        self.connection = self.core.openflow.connections[2] = RecordingConnection(2)
+
+    def sent(self):
+        """ The flow mods sent to switch 2 """
+        flow_mods = []
+        for messages in self.connection.sends:
+            for message_type,xid,raw in messages:
+                if message_type == self.of.OFPT_FLOW_MOD:
+                    msg = self.of.ofp_flow_mod()
+                    msg.unpack(raw)
+                    flow_mods.append(msg)
+        return flow_mods
+
+    def check(self, stats):
+        self.reconciler._handle_FlowStatsReceived(record(connection=record(dpid=2), stats=stats))
+        self.core.run_later()
+        return sorted((msg.command,msg.priority) for msg in self.sent())
+
+    def flow_stats(self, msg):
+        return record(priority=msg.priority, match=msg.match, actions=msg.actions)
+
+    def test_connection_up_replays_the_rules_blocks_and_temporary_flows(self):
+        blocked_key = (self.IPAddr("232.2.2.2"),self.IPAddr(SOURCE))
+        self.streamer_state_builder.set_incomplete_group(blocked_key, {"members":{}, "streamer":2, "fingerprint":frozenset()})
+        new_key = (self.IPAddr("232.3.3.3"),self.IPAddr(SOURCE))
+        self.streamer_state_builder.temporary_flows[new_key] = (time.time() - 1.5, 2, 4)
+        """ A stale flow mod which waited for the switch is replaced by the replay """
+        self.manager.flow_programmer.add_waiting(2, [self.of.ofp_flow_mod()])
+
+        self.reconciler._handle_ConnectionUp(record(dpid=2))
+        self.core.run_later()
+        flow_mods = self.sent()
+        self.assertEqual(len(self.connection.sends), 1)
+        self.assertEqual(sorted((msg.command,msg.priority) for msg in flow_mods), [(self.of.OFPFC_ADD,priority) for priority in
+                         sorted(self.priorities)])
+        temporary = [msg for msg in flow_mods if msg.priority == self.priorities[2]][0]
+        self.assertEqual((temporary.match.nw_dst,temporary.match.in_port,temporary.hard_timeout), (new_key[0],4,1))
+        self.assertEqual(self.reconciler.get_stats()["replayed_rules"], 3)
+
+    def test_matching_table_is_not_touched(self):
+        stats = [self.flow_stats(self.manager.make_rule_flow_mod(self.group_rule, (2,)))]
+        self.assertEqual(self.check(stats), [])
+        self.assertEqual(self.reconciler.get_stats()["checks"], 1)
+
+    def test_missing_rule_is_added(self):
+        self.assertEqual(self.check([]), [(self.of.OFPFC_ADD,self.priorities[1])])
+        self.assertEqual(self.reconciler.get_stats()["missing"], 1)
+
+    def test_drifted_and_unknown_rules_are_fixed(self):
+        unknown_key = (self.IPAddr("232.9.9.9"),self.IPAddr("10.9.9.9"))
+        new_key = (self.IPAddr("232.3.3.3"),self.IPAddr(SOURCE))
+        self.streamer_state_builder.temporary_flows[new_key] = (time.time(), 2, 4)
+        stats = [self.flow_stats(self.manager.make_rule_flow_mod(self.group_rule, (3,))),
+                 self.flow_stats(self.manager.make_rule_flow_mod((unknown_key[0].toUnsigned(),32,unknown_key[1],None), (2,))),
+                 self.flow_stats(self.streamer_state_builder.make_temporary_flow_mod(unknown_key, 2, 1)),
+                 self.flow_stats(self.streamer_state_builder.make_temporary_flow_mod(new_key, 4, 1))]
+
+        """ The known temporary entry is left to expire """
+        self.assertEqual(self.check(stats), sorted([(self.of.OFPFC_MODIFY_STRICT,self.priorities[1]),
+                         (self.of.OFPFC_DELETE_STRICT,self.priorities[0]),(self.of.OFPFC_DELETE_STRICT,self.priorities[2])]))
+        reconciler_stats = self.reconciler.get_stats()
+        self.assertEqual((reconciler_stats["modified"],reconciler_stats["unexpected"],reconciler_stats["fix_flow_mods"]), (1,2,3))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+""" Tests of the GraphBuilder: the heap based PRIM engine against the original implementation, the indexed adjacency and the
+  coalescing of the link events """
+import random
+import unittest
+
+from stand_ins import requires_pox,install,record
+
+
+def add_link(graph_builder, dpid1, port1, dpid2, port2, distance=1):
+    """ Both directions of a switch link """
+    for from_node,from_port,to_node,to_port in [(dpid1,port1,dpid2,port2), (dpid2,port2,dpid1,port1)]:
+        graph_builder.add_node(from_node)
+        graph_builder.add_edge(from_node, from_port, to_node, to_port, distance)
+
+
+@requires_pox
+class PrimEngineTest(unittest.TestCase):
+    def setUp(self):
+        install()
+        import routing_engines
+        from graph_builder import GraphBuilder
+        self.graph_builder = GraphBuilder()
+        self.prim = routing_engines.PrimPruneEngine()
+        self.reference = routing_engines.ReferencePrimEngine()
+
+    def random_graph(self, rand, nodes):
+        """ Connected graph with distinct distances, so both PRIM implementations have one choice in every step """
+        distances = rand.sample(xrange(1, 10 * nodes * nodes), nodes * nodes)
+        links = set()
+        for node in xrange(1, nodes):
+            links.add((rand.randrange(node),node))
+        for index in xrange(nodes):
+            node,other = rand.sample(xrange(nodes), 2)
+            links.add((min(node,other),max(node,other)))
+        for port,(node,other) in enumerate(sorted(links)):
+            add_link(self.graph_builder, node, port + 1, other, port + 1, distances.pop())
+
+    def test_same_tree_as_the_reference(self):
+        rand = random.Random(4)
+        self.random_graph(rand, 30)
+        for index in xrange(20):
+            members = rand.sample(xrange(30), 6)
+            root = members.pop()
+            tree = self.prim.compute_tree(self.graph_builder, members, root)
+            self.assertEqual(sorted(tree), sorted(set(self.reference.compute_tree(self.graph_builder, members, root))))
+
+    def test_tree_is_pruned_to_the_member_paths(self):
+        """ PRIM reaches 2 first on the cheap 1-2 link, but only the path to the member 3 stays in the tree """
+        add_link(self.graph_builder, 1, 1, 2, 1, 1)
+        add_link(self.graph_builder, 1, 2, 3, 1, 5)
+        self.assertEqual(self.prim.compute_tree(self.graph_builder, [3], 1), [(1,3)])
+
+    def test_unreachable_members_are_left_out(self):
+        add_link(self.graph_builder, 1, 1, 2, 1)
+        add_link(self.graph_builder, 3, 1, 4, 1)
+        self.assertEqual(self.prim.compute_tree(self.graph_builder, [2,4,5], 1), [(1,2)])
+
+
+@requires_pox
+class AdjacencyTest(unittest.TestCase):
+    def setUp(self):
+        install()
+        from graph_builder import AdjacencyStore,GraphBuilder
+        self.adjacency = AdjacencyStore()
+        self.graph_builder = GraphBuilder()
+
+    def test_degrees_follow_the_edges(self):
+        self.adjacency.add_edge(1, 2)
+        self.adjacency.add_edge(1, 3)
+        self.adjacency.add_edge(3, 2)
+        self.assertEqual((self.adjacency.out_degree(1),self.adjacency.in_degree(2)), (2,2))
+        self.assertEqual(sorted(self.adjacency.predecessors(2)), [1,3])
+        self.assertTrue(self.adjacency.del_edge(1, 2))
+        self.assertFalse(self.adjacency.del_edge(1, 2))
+        self.assertEqual((self.adjacency.out_degree(1),self.adjacency.in_degree(2)), (1,1))
+
+    def test_empty_sets_are_dropped(self):
+        self.adjacency.add_edge(1, 2)
+        self.adjacency.del_edge(1, 2)
+        self.assertEqual((self.adjacency.succ,self.adjacency.pred), ({},{}))
+        self.assertEqual(list(self.adjacency.successors(1)), [])
+
+    def test_node_without_incoming_links_is_removed(self):
+        add_link(self.graph_builder, 1, 1, 2, 1)
+        add_link(self.graph_builder, 1, 2, 3, 1)
+        self.assertTrue(self.graph_builder.del_edge(1, 1, 2, 1))
+        self.assertFalse(self.graph_builder.has_node(2))
+        self.assertTrue(self.graph_builder.has_node(3))
+        self.assertEqual(self.graph_builder.get_link_by_port(1, 1), None)
+        self.assertEqual(self.graph_builder.get_link_by_port(1, 2), (1,3))
+
+    def test_version_only_changes_with_the_topology(self):
+        add_link(self.graph_builder, 1, 1, 2, 1)
+        version = self.graph_builder.get_version()
+        self.assertFalse(self.graph_builder.add_edge(1, 1, 2, 1, 1))
+        self.assertFalse(self.graph_builder.del_edge(1, 3, 3, 1))
+        self.assertEqual(self.graph_builder.get_version(), version)
+        self.assertTrue(self.graph_builder.add_edge(1, 1, 2, 1, 2))
+        self.assertEqual(self.graph_builder.get_version(), version + 1)
+
+
+@requires_pox
+class SettleWindowTest(unittest.TestCase):
+    def setUp(self):
+        self.core = install()
+        import benchmark_harness
+        from graph_builder import GraphBuilder,GraphStructureChanged
+        self.timers = benchmark_harness.StandInTimer.timers
+        del self.timers[:]
+        self.graph_builder = GraphBuilder()
+        self.changes = []
+        self.graph_builder.addListener(GraphStructureChanged, lambda event: self.changes.append(event.get_changed_links()))
+
+    def link_event(self, added, dpid1, port1, dpid2, port2):
+        self.graph_builder._handle_LinkEvent(record(added=added, link=record(dpid1=dpid1, port1=port1, dpid2=dpid2, port2=port2)))
+
+    def live_timers(self):
+        return [timer for timer in self.timers if not timer.cancelled]
+
+    def test_zero_window_applies_the_batch_when_idle(self):
+        self.graph_builder.settle_window = 0
+        self.link_event(True, 1, 1, 2, 1)
+        self.link_event(True, 2, 1, 1, 1)
+        self.link_event(True, 2, 2, 3, 1)
+        self.assertEqual((self.changes,len(self.core.later)), ([],1))
+        self.core.run_later()
+        self.assertEqual(self.changes, [set([(1,2),(2,1),(2,3)])])
+
+    def test_flapping_link_keeps_its_last_state(self):
+        add_link(self.graph_builder, 1, 1, 2, 1)
+        version = self.graph_builder.get_version()
+        self.graph_builder.settle_window = 0.5
+        self.link_event(False, 1, 1, 2, 1)
+        self.link_event(True, 1, 1, 2, 1)
+        self.assertEqual(len(self.live_timers()), 1)
+        self.live_timers()[0].fire()
+        self.assertEqual((self.changes,self.graph_builder.get_version()), ([],version))
+
+    def test_batch_waits_at_most_the_max_delay(self):
+        self.graph_builder.settle_window = 10
+        self.graph_builder.settle_max_delay = 1.0
+        self.link_event(True, 1, 1, 2, 1)
+        self.link_event(True, 2, 1, 1, 1)
+        timer, = self.live_timers()
+        self.assertLessEqual(timer.interval, 1.0)
+        timer.fire()
+        self.assertEqual(self.changes, [set([(1,2),(2,1)])])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+""" Tests of the CSR graph snapshot against the dict topology it is built from """
+import cPickle as pickle
+import unittest
+
+from graph_snapshot import GraphSnapshot
+
+
+class _Adjacency(object):
+    def __init__(self):
+        self.succ = {}
+
+
+class _Topology(object):
+    """ The fields of the GraphBuilder which GraphSnapshot.build reads """
+
+    def __init__(self):
+        self.nodes = set()
+        self.adjacency = _Adjacency()
+        self.distances = {}
+        self.ports = {}
+        self.version = 0
+
+    def add_link(self, from_node, from_port, to_node, to_port, distance=1):
+        self.nodes.update([from_node,to_node])
+        self.adjacency.succ.setdefault(from_node, set()).add(to_node)
+        self.distances[(from_node,to_node)] = distance
+        self.ports[(from_node,to_node)] = (from_port,to_port)
+        self.version += 1
+
+    def remove_link(self, from_node, to_node):
+        self.adjacency.succ[from_node].discard(to_node)
+        self.distances.pop((from_node,to_node))
+        self.ports.pop((from_node,to_node))
+        self.version += 1
+
+
+def _make_topology():
+    topology = _Topology()
+    topology.add_link(0x30, 1, 0x10, 2, 5)
+    topology.add_link(0x30, 2, 0x20, 1, 2)
+    topology.add_link(0x10, 3, 0x20, 3, 1)
+    topology.add_link(0x20, 4, 0x30, 2, 2)
+    return topology
+
+
+class GraphSnapshotTest(unittest.TestCase):
+    def assert_same_graph(self, snapshot, topology):
+        self.assertEqual(snapshot.version, topology.version)
+        self.assertEqual(snapshot.num_edges(), len(topology.distances))
+        for node in topology.nodes:
+            self.assertTrue(snapshot.has_node(node))
+            expected = sorted(topology.adjacency.succ.get(node,()))
+            self.assertEqual(sorted(snapshot.successors(node)), expected)
+            self.assertEqual(sorted(snapshot.successor_distances(node)),
+                             sorted((to_node,topology.distances[(node,to_node)]) for to_node in expected))
+            for to_node in expected:
+                self.assertEqual(snapshot.get_distance(node, to_node), topology.distances[(node,to_node)])
+                self.assertEqual(snapshot.get_port_pair(node, to_node), topology.ports[(node,to_node)])
+
+    def test_build(self):
+        topology = _make_topology()
+        snapshot = GraphSnapshot.build(topology)
+        self.assert_same_graph(snapshot, topology)
+        self.assertFalse(snapshot.has_node(0x40))
+        self.assertEqual(snapshot.successors(0x40), ())
+        self.assertEqual(snapshot.successor_distances(0x40), ())
+        self.assertRaises(KeyError, snapshot.get_distance, 0x10, 0x30)
+
+    def test_rows_are_sorted_by_id(self):
+        snapshot = GraphSnapshot.build(_make_topology())
+        for node_id in xrange(len(snapshot.node_dpids)):
+            row = list(snapshot.targets[snapshot.offsets[node_id]:snapshot.offsets[node_id+1]])
+            self.assertEqual(row, sorted(row))
+
+    def test_incremental_build(self):
+        topology = _make_topology()
+        previous = GraphSnapshot.build(topology)
+        topology.remove_link(0x30, 0x10)
+        topology.add_link(0x10, 4, 0x40, 1, 7)
+        snapshot = GraphSnapshot.build(topology, previous, set([0x30,0x10]))
+        self.assert_same_graph(snapshot, topology)
+        """ The ids of the known nodes are kept """
+        for node,node_id in previous.node_ids.iteritems():
+            self.assertEqual(snapshot.node_ids[node], node_id)
+
+    def test_pickle(self):
+        topology = _make_topology()
+        snapshot = pickle.loads(pickle.dumps(GraphSnapshot.build(topology), pickle.HIGHEST_PROTOCOL))
+        self.assert_same_graph(snapshot, topology)
+
+    def test_target_dpids_are_flat(self):
+        """ 48 bit dpids fit into the target array, it is left out of the pickle and rebuilt on load """
+        topology = _make_topology()
+        topology.add_link(0x10, 5, 0xffffffffffff, 1, 3)
+        snapshot = GraphSnapshot.build(topology)
+        self.assertEqual(snapshot.target_dpids.typecode, 'l')
+        self.assertEqual(list(snapshot.target_dpids), [snapshot.node_dpids[to_id] for to_id in snapshot.targets])
+        self.assertNotIn("target_dpids", snapshot.__getstate__())
+        self.assertEqual(sorted(pickle.loads(pickle.dumps(snapshot)).successors(0x10)), [0x20,0xffffffffffff])
+
+if __name__ == "__main__":
+    unittest.main()
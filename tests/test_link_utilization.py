@@ -0,0 +1,65 @@
+""" Tests of the LinkUtilizationMonitor: the load levels with hysteresis and the link weights in the GraphBuilder """
+import time
+import unittest
+
+from stand_ins import requires_pox,install,record
+
+
+@requires_pox
+class LinkUtilizationTest(unittest.TestCase):
+    """ The 1-2 link leaves switch 1 on port 1. A capacity of 800 bit/s is used up by 100 bytes in a second, and without
+      smoothing the utilization is the one of the last poll. """
+    def setUp(self):
+        install()
+        from graph_builder import GraphBuilder,GraphStructureChanged
+        from link_utilization import LinkUtilizationMonitor
+        self.graph_builder = GraphBuilder()
+        self.monitor = LinkUtilizationMonitor(capacity_mbps=0.0008, smoothing=1.0)
+        self.monitor.graph_builder = self.graph_builder
+        self.graph_builder.weight_function = self.monitor.link_weight
+        for from_node,from_port,to_node,to_port in [(1,1,2,1), (2,1,1,1)]:
+            self.graph_builder.add_node(from_node)
+            self.graph_builder.add_edge(from_node, from_port, to_node, to_port, 1)
+        self.changes = []
+        self.graph_builder.addListener(GraphStructureChanged, lambda event: self.changes.append(event.get_changed_links()))
+        self.tx_bytes = 0
+        self.port_stats()
+
+    def port_stats(self, utilization=0.0):
+        """ One poll of switch 1 which reports utilization * 100 more bytes on port 1, one second after the previous poll """
+        if (1,1) in self.monitor.samples:
+            self.monitor.samples[(1,1)]["time"] = time.time() - 1.0
+        self.tx_bytes += int(utilization * 100)
+        self.monitor._handle_PortStatsReceived(record(connection=record(dpid=1), stats=[record(port_no=1, tx_bytes=self.tx_bytes)]))
+
+    def test_next_level(self):
+        self.assertEqual(self.monitor.next_level(0, 0.5), 1)
+        self.assertEqual(self.monitor.next_level(0, 0.9), 3)
+        self.assertEqual(self.monitor.next_level(1, 0.25), 1)
+        self.assertEqual(self.monitor.next_level(1, 0.15), 0)
+        self.assertEqual(self.monitor.next_level(3, 0.45), 1)
+
+    def test_level_change_updates_the_link_weight(self):
+        self.port_stats(0.5)
+        self.assertEqual(self.changes, [set([(1,2)])])
+        self.assertEqual((self.graph_builder.get_distance(1, 2),self.graph_builder.get_distance(2, 1)), (2,1))
+        self.assertEqual(self.monitor.get_utilizations()[(1,2)]["level"], 1)
+
+    def test_utilization_within_the_hysteresis_keeps_the_weight(self):
+        self.port_stats(0.5)
+        version = self.graph_builder.get_version()
+        self.port_stats(0.25)
+        self.port_stats(0.35)
+        self.assertEqual((len(self.changes),self.graph_builder.get_version()), (1,version))
+        self.port_stats(0.15)
+        self.assertEqual(len(self.changes), 2)
+        self.assertEqual(self.graph_builder.get_distance(1, 2), 1)
+
+    def test_unknown_port_changes_no_weight(self):
+        self.monitor._handle_PortStatsReceived(record(connection=record(dpid=1), stats=[record(port_no=7, tx_bytes=0)]))
+        self.monitor.samples[(1,7)]["time"] = time.time() - 1.0
+        self.monitor._handle_PortStatsReceived(record(connection=record(dpid=1), stats=[record(port_no=7, tx_bytes=90)]))
+        self.assertEqual((self.changes,self.monitor.levels), ([],{}))
+
+if __name__ == "__main__":
+    unittest.main()
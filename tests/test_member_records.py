@@ -0,0 +1,80 @@
+""" Tests of the compact member records """
+import unittest
+
+from member_records import INCLUDE,EXCLUDE,EMPTY_SOURCES,BITMAP_PORTS,MemberState,GroupRecord,make_source_set
+
+
+class MemberStateTest(unittest.TestCase):
+    def test_empty_source_sets_are_shared(self):
+        self.assertIs(make_source_set(set()), EMPTY_SOURCES)
+        self.assertIs(MemberState(EXCLUDE).source_set, EMPTY_SOURCES)
+        self.assertIs(MemberState(INCLUDE, ()).source_set, EMPTY_SOURCES)
+        self.assertEqual(make_source_set(["a","b"]), frozenset(["a","b"]))
+
+    def test_accepts(self):
+        include = MemberState(INCLUDE, ["a"])
+        exclude = MemberState(EXCLUDE, ["a"])
+        self.assertTrue(include.accepts("a"))
+        self.assertFalse(include.accepts("b"))
+        self.assertFalse(exclude.accepts("a"))
+        self.assertTrue(exclude.accepts("b"))
+        self.assertTrue(MemberState(EXCLUDE).accepts("a"))
+
+    def test_same_state(self):
+        member_state = MemberState(INCLUDE, ["a","b"])
+        self.assertTrue(member_state.same_state(INCLUDE, frozenset(["b","a"])))
+        self.assertFalse(member_state.same_state(EXCLUDE, frozenset(["a","b"])))
+        self.assertFalse(member_state.same_state(INCLUDE, frozenset(["a"])))
+
+    def test_no_instance_dict(self):
+        self.assertRaises(AttributeError, setattr, MemberState(INCLUDE), "other", 1)
+
+
+class GroupRecordTest(unittest.TestCase):
+    def test_members(self):
+        group_rec = GroupRecord()
+        self.assertTrue(group_rec.is_empty())
+        for dpid,port in [(1,3), (1,1), (2,0), (1,BITMAP_PORTS - 1)]:
+            group_rec.set_member(dpid, port, MemberState(EXCLUDE))
+        self.assertEqual(group_rec.members, {1:(1 << 1) | (1 << 3) | (1 << BITMAP_PORTS - 1), 2:1})
+        self.assertIsNone(group_rec.high_ports)
+        self.assertTrue(group_rec.has_member(1, 3))
+        self.assertFalse(group_rec.has_member(1, 2))
+        self.assertFalse(group_rec.has_member(3, 3))
+        self.assertEqual(len(group_rec.member_states), 4)
+
+    def test_remove_member(self):
+        group_rec = GroupRecord()
+        group_rec.set_member(1, 3, MemberState(EXCLUDE))
+        group_rec.set_member(1, 4, MemberState(EXCLUDE))
+        self.assertFalse(group_rec.remove_member(1, 5))
+        self.assertFalse(group_rec.remove_member(2, 3))
+        self.assertTrue(group_rec.remove_member(1, 3))
+        self.assertEqual(group_rec.members, {1:1 << 4})
+        self.assertFalse(group_rec.has_member(1, 3))
+        self.assertTrue(group_rec.remove_member(1, 4))
+        self.assertTrue(group_rec.is_empty())
+        self.assertEqual(group_rec.members, {})
+        self.assertEqual(group_rec.member_states, {})
+
+    def test_high_ports_stay_out_of_the_bitmap(self):
+        """ OFPP_LOCAL and the other high port numbers would make the bitmap a huge integer """
+        group_rec = GroupRecord()
+        group_rec.set_member(1, 0xfffe, MemberState(EXCLUDE))
+        group_rec.set_member(1, BITMAP_PORTS, MemberState(EXCLUDE))
+        group_rec.set_member(1, 2, MemberState(EXCLUDE))
+        self.assertEqual(group_rec.members, {1:1 << 2})
+        self.assertEqual(group_rec.high_ports, {1:set([BITMAP_PORTS,0xfffe])})
+        self.assertTrue(group_rec.has_member(1, 0xfffe))
+        self.assertFalse(group_rec.has_member(2, 0xfffe))
+
+        self.assertTrue(group_rec.remove_member(1, 2))
+        self.assertFalse(group_rec.is_empty())
+        self.assertTrue(group_rec.remove_member(1, 0xfffe))
+        self.assertFalse(group_rec.remove_member(1, 0xfffe))
+        self.assertTrue(group_rec.remove_member(1, BITMAP_PORTS))
+        self.assertTrue(group_rec.is_empty())
+        self.assertIsNone(group_rec.high_ports)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,278 @@
+""" Tests of the MemberStateBuilder, driven by IGMP PacketIn events """
+import random
+import unittest
+
+from stand_ins import requires_pox,install,report_v2,report_v3
+
+GROUP = "232.1.1.1"
+SOURCES = ["10.0.0.1","10.0.0.2","10.0.0.3"]
+
+
+class _MemberTestCase(unittest.TestCase):
+    def setUp(self):
+        self.core = install()
+        from pox.lib.addresses import IPAddr
+        import member_state_builder
+        self.igmp = member_state_builder
+        self.IPAddr = IPAddr
+        self.group = IPAddr(GROUP)
+        self.sources = [IPAddr(source) for source in SOURCES]
+        self.events = []
+        self.builder = self.make_builder()
+
+    def make_builder(self, *args, **kw):
+        from member_state_builder import MemberStateBuilder,PassiveGroupStateChanged,PassiveGroupDeleted
+        builder = MemberStateBuilder(*args, **kw)
+        builder.addListener(PassiveGroupStateChanged, lambda event: self.events.append(("changed",event.get_group_addr(),event.get_changed_members())))
+        builder.addListener(PassiveGroupDeleted, lambda event: self.events.append(("deleted",event.get_group_addr(),None)))
+        return builder
+
+    def report_v2(self, dpid, port, leave=False):
+        self.builder._handle_PacketIn(report_v2(dpid, port, self.group, leave))
+
+    def report_v3(self, dpid, port, *records):
+        """ records: (record type,[sources]) of the test group, or (record type,group,[sources]) """
+        records = [record if len(record) == 3 else (record[0],self.group,record[1]) for record in records]
+        self.builder._handle_PacketIn(report_v3(dpid, port, records))
+
+
+@requires_pox
+class RefreshSuppressionTest(_MemberTestCase):
+    def test_refresh_only_updates_the_last_seen_time(self):
+        self.report_v2(1, 2)
+        member_state = self.builder.groups[self.group].member_states[(1,2)]
+        member_state.last_seen -= 100
+        last_seen = member_state.last_seen
+        del self.events[:]
+        self.report_v2(1, 2)
+        self.assertIs(self.builder.groups[self.group].member_states[(1,2)], member_state)
+        self.assertGreater(member_state.last_seen, last_seen)
+        self.assertEqual(self.events, [])
+        update_stats = self.builder.get_update_stats()
+        self.assertEqual((update_stats["effective"],update_stats["suppressed"],update_stats["cancelled"]), (1,1,0))
+
+    def test_same_source_set_in_another_order_is_a_refresh(self):
+        s1,s2,s3 = self.sources
+        self.report_v3(1, 1, (self.igmp.MODE_IS_INCLUDE,[s1,s2]))
+        del self.events[:]
+        self.report_v3(1, 1, (self.igmp.MODE_IS_INCLUDE,[s2,s1]))
+        self.assertEqual(self.events, [])
+        self.report_v3(1, 1, (self.igmp.MODE_IS_INCLUDE,[s2]))
+        self.assertEqual(self.events, [("changed",self.group,set([(1,1)]))])
+
+    def test_changed_mode_is_not_a_refresh(self):
+        s1,s2,s3 = self.sources
+        self.report_v3(1, 1, (self.igmp.MODE_IS_EXCLUDE,[s1]))
+        del self.events[:]
+        self.report_v3(1, 1, (self.igmp.MODE_IS_INCLUDE,[s1]))
+        self.assertEqual(self.events, [("changed",self.group,set([(1,1)]))])
+        self.assertEqual(self.builder.get_update_stats()["suppressed"], 0)
+
+    def test_leave_of_unknown_member(self):
+        self.report_v2(1, 1, leave=True)
+        self.assertEqual(self.events, [])
+        self.assertEqual(self.builder.get_update_stats()["suppressed"], 1)
+
+
+@requires_pox
+class SourceIndexTest(_MemberTestCase):
+    def expected_members(self, source):
+        """ The member dict computed from the member states, without the index """
+        group_members = {}
+        group_rec = self.builder.groups.get(self.group)
+        if group_rec is None:
+            return group_members
+        for (dpid,port),member_state in group_rec.member_states.iteritems():
+            if member_state.accepts(source):
+                group_members.setdefault(dpid, []).append(port)
+        for ports in group_members.itervalues():
+            ports.sort()
+        return group_members
+
+    def test_include_and_exclude_members(self):
+        s1,s2,s3 = self.sources
+        self.report_v3(1, 1, (self.igmp.MODE_IS_INCLUDE,[s1]))
+        self.report_v2(1, 2)
+        self.report_v3(2, 1, (self.igmp.CHANGE_TO_EXCLUDE_MODE,[s1]))
+
+        self.assertEqual(self.builder.get_valid_group_members(self.group, s1), {1:[1,2]})
+        self.assertEqual(self.builder.get_valid_group_members(self.group, s2), {1:[2], 2:[1]})
+        self.assertEqual(self.builder.get_member_fingerprint(self.group, s1), frozenset([(1,1),(1,2)]))
+        self.assertEqual(self.builder.get_any_source_members(self.group), set([(1,2),(2,1)]))
+
+        self.report_v2(1, 2, leave=True)
+        self.assertEqual(self.builder.get_valid_group_members(self.group, s1), {1:[1]})
+        self.assertEqual(self.builder.get_valid_group_members(self.group, s3), {2:[1]})
+
+    def test_unchanged_view_is_the_same_object(self):
+        s1,s2,s3 = self.sources
+        self.report_v3(1, 1, (self.igmp.MODE_IS_INCLUDE,[s1]))
+        view = self.builder.get_valid_group_members(self.group, s1)
+        self.report_v3(2, 1, (self.igmp.MODE_IS_INCLUDE,[s2]))
+        self.assertIs(self.builder.get_valid_group_members(self.group, s1), view)
+
+        self.report_v3(2, 2, (self.igmp.MODE_IS_INCLUDE,[s1]))
+        self.assertIsNot(self.builder.get_valid_group_members(self.group, s1), view)
+        self.assertEqual(self.builder.get_valid_group_members(self.group, s1), {1:[1], 2:[2]})
+
+    def test_random_reports_match_the_member_states(self):
+        rand = random.Random(7)
+        record_types = [self.igmp.MODE_IS_INCLUDE,self.igmp.MODE_IS_EXCLUDE,self.igmp.CHANGE_TO_INCLUDE_MODE,
+                        self.igmp.CHANGE_TO_EXCLUDE_MODE,self.igmp.ALLOW_NEW_SOURCES,self.igmp.BLOCK_OLD_SOURCES]
+        for index in xrange(300):
+            dpid = rand.choice([1,2])
+            port = rand.choice([1,2,3])
+            if rand.random() < 0.2:
+                self.report_v2(dpid, port, leave=rand.random() < 0.5)
+            else:
+                self.report_v3(dpid, port, (rand.choice(record_types),rand.sample(self.sources, rand.randint(0, 2))))
+            if self.group not in self.builder.groups:
+                continue
+            for source in self.sources:
+                self.assertEqual(self.builder.get_valid_group_members(self.group, source), self.expected_members(source))
+
+
+@requires_pox
+class AgingTest(_MemberTestCase):
+    """ The members are aged by a MemberStateBuilder with a membership interval, its wheel is advanced by hand """
+    def setUp(self):
+        _MemberTestCase.setUp(self)
+        import time
+        self.start = time.time()
+        self.builder = self.make_builder(membership_interval=10)
+
+    def test_unrefreshed_members_expire_in_one_batch(self):
+        self.report_v2(1, 1)
+        self.report_v2(2, 1)
+        del self.events[:]
+        self.builder.expire_members(self.start + 5)
+        self.assertEqual(self.events, [])
+
+        self.builder.expire_members(self.start + 12)
+        self.assertEqual(self.events, [("deleted",self.group,None)])
+        self.assertNotIn(self.group, self.builder.groups)
+        aging_stats = self.builder.get_aging_stats()
+        self.assertEqual((aging_stats["expired"],aging_stats["expiry_batches"],aging_stats["scheduled"]), (2,1,0))
+
+    def test_refreshed_member_is_rescheduled(self):
+        self.report_v2(1, 1)
+        self.report_v2(2, 1)
+        del self.events[:]
+        self.builder.groups[self.group].member_states[(1,1)].last_seen = self.start + 8
+        self.builder.expire_members(self.start + 12)
+        self.assertEqual(self.events, [("changed",self.group,set([(2,1)]))])
+        self.assertEqual(self.builder.get_aging_stats()["rescheduled"], 1)
+
+        self.builder.expire_members(self.start + 20)
+        self.assertEqual(self.events[-1], ("deleted",self.group,None))
+
+    def test_refresh_report_keeps_one_timer(self):
+        self.report_v2(1, 1)
+        self.report_v2(1, 1)
+        self.assertEqual(self.builder.get_aging_stats()["scheduled"], 1)
+        self.assertEqual(self.builder.get_update_stats()["suppressed"], 1)
+
+
+@requires_pox
+class QuerierTest(_MemberTestCase):
+    """ Switch 1 has the host ports 1 to 4 and the link port 5 to switch 2, the querier has a query interval of 4 seconds """
+    def setUp(self):
+        _MemberTestCase.setUp(self)
+        from stand_ins import record
+        from graph_builder import GraphBuilder
+        import pox.openflow.libopenflow_01 as of
+        self.of = of
+        graph_builder = GraphBuilder()
+        for from_node,from_port,to_node,to_port in [(1,5,2,1), (2,1,1,5)]:
+            graph_builder.add_node(from_node)
+            graph_builder.add_edge(from_node, from_port, to_node, to_port, 1)
+        self.core.register("GraphBuilder", graph_builder)
+        self.sent = []
+        self.core.openflow.sendToDPID = lambda dpid, msg: self.sent.append((dpid,msg))
+        self.builder = self.make_builder(query_interval=4, query_response_time=5)
+        ports = [record(port_no=port) for port in [1,2,3,4,5]] + [record(port_no=of.OFPP_MAX)]
+        self.builder._handle_ConnectionUp(record(dpid=1, ofp=record(ports=ports)))
+
+    def queried_ports(self):
+        """ The output ports of the packet outs sent since the last call """
+        ports = [msg.actions[0].port for dpid,msg in self.sent]
+        del self.sent[:]
+        return ports
+
+    def test_queries_are_spread_over_the_interval(self):
+        self.assertEqual(self.builder.query_ports, [(1,1),(1,2),(1,3),(1,4),(1,5)])
+        """ 5 ports in 4 seconds: one port per second, and two in the fourth, where the link port is skipped """
+        queried = []
+        for second in xrange(4):
+            self.builder.send_queries()
+            queried.append(self.queried_ports())
+        self.assertEqual(queried, [[1],[2],[3],[4]])
+        self.builder.send_queries()
+        self.assertEqual(self.queried_ports(), [1])
+        self.assertEqual(self.builder.get_aging_stats()["queries"], 5)
+
+    def test_query_is_a_general_query(self):
+        import pox.lib.packet as pkt
+        self.builder.send_general_query(1, 3)
+        (dpid,msg), = self.sent
+        ip_packet = pkt.ethernet(raw=msg.data).payload
+        self.assertEqual((dpid,ip_packet.dstip,ip_packet.ttl), (1,self.IPAddr("224.0.0.1"),1))
+        igmp_packet = ip_packet.payload
+        self.assertEqual((igmp_packet.ver_and_type,igmp_packet.max_response_time), (self.igmp.MEMBERSHIP_QUERY,50))
+        self.assertEqual(igmp_packet.address, self.IPAddr("0.0.0.0"))
+
+    def test_disconnected_switch_is_not_queried(self):
+        from stand_ins import record
+        self.builder._handle_ConnectionDown(record(dpid=1))
+        self.builder.send_queries()
+        self.assertEqual((self.builder.query_ports,self.queried_ports()), ([],[]))
+
+
+@requires_pox
+class TransactionTest(_MemberTestCase):
+    def test_records_which_cancel_out_raise_no_event(self):
+        s1,s2,s3 = self.sources
+        self.report_v3(1, 1, (self.igmp.MODE_IS_INCLUDE,[s2]))
+        del self.events[:]
+        self.report_v3(1, 1, (self.igmp.ALLOW_NEW_SOURCES,[s1]), (self.igmp.BLOCK_OLD_SOURCES,[s1]))
+        self.assertEqual(self.events, [])
+        self.assertEqual(self.builder.get_update_stats()["cancelled"], 1)
+        self.assertEqual(self.builder.get_valid_group_members(self.group, s1), {})
+
+    def test_one_event_per_group(self):
+        s1,s2,s3 = self.sources
+        other_group = self.IPAddr("232.1.1.2")
+        self.report_v3(1, 1, (self.igmp.MODE_IS_INCLUDE,[s1]), (self.igmp.ALLOW_NEW_SOURCES,[s2]),
+                       (self.igmp.CHANGE_TO_EXCLUDE_MODE,other_group,[]))
+        self.assertEqual(sorted(self.events), sorted([("changed",self.group,set([(1,1)])), ("changed",other_group,set([(1,1)]))]))
+        self.assertEqual(self.builder.get_valid_group_members(self.group, s2), {1:[1]})
+
+    def test_report_of_many_channels_raises_one_event_per_channel(self):
+        s1,s2,s3 = self.sources
+        groups = [self.IPAddr("232.1.2.%d" % index) for index in xrange(1, 21)]
+        records = []
+        for group in groups:
+            records.extend([(self.igmp.ALLOW_NEW_SOURCES,group,[s1]), (self.igmp.ALLOW_NEW_SOURCES,group,[s2])])
+        self.report_v3(1, 1, *records)
+        self.assertEqual(sorted(self.events), sorted(("changed",group,set([(1,1)])) for group in groups))
+        self.assertEqual(self.builder.get_valid_group_members(groups[-1], s2), {1:[1]})
+
+    def test_new_member_which_cancels_out_leaves_no_group(self):
+        s1,s2,s3 = self.sources
+        self.report_v3(1, 1, (self.igmp.ALLOW_NEW_SOURCES,[s1]), (self.igmp.BLOCK_OLD_SOURCES,[s1]))
+        self.assertEqual(self.events, [])
+        self.assertNotIn(self.group, self.builder.groups)
+        self.assertNotIn(self.group, self.builder.source_index)
+
+    def test_leave_of_the_last_member_deletes_the_group(self):
+        self.report_v2(1, 1)
+        self.report_v2(2, 1)
+        del self.events[:]
+        self.report_v2(1, 1, leave=True)
+        self.assertEqual(self.events, [("changed",self.group,set([(1,1)]))])
+        self.report_v2(2, 1, leave=True)
+        self.assertEqual(self.events[-1], ("deleted",self.group,None))
+        self.assertNotIn(self.group, self.builder.groups)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,225 @@
+""" Tests of the MulticastTrafficManager on a GraphBuilder which is filled directly: the groups repaired after a topology
+  change, the make before break order of the route updates, the trees kept on member deltas and the idle streams """
+import unittest
+
+from stand_ins import requires_pox,install
+
+
+@requires_pox
+class AffectedGroupsTest(unittest.TestCase):
+    """ The stream enters on 1, the member is behind 7 on the chain 1-2-3-4-7, the 1-5 and 6-7 links are off the tree """
+    def setUp(self):
+        install()
+        from graph_builder import GraphBuilder
+        from multicast_traffic_manager import MulticastTrafficManager
+        self.graph_builder = GraphBuilder()
+        self.manager = MulticastTrafficManager()
+        self.manager.graph_builder = self.graph_builder
+        for dpid1,dpid2 in [(1,2), (2,3), (3,4), (4,7), (1,5), (6,7)]:
+            self.add_link(dpid1, dpid2)
+        self.add_group("chain", {7:[1]})
+
+    def add_link(self, dpid1, dpid2, distance=1):
+        for from_node,to_node in [(dpid1,dpid2), (dpid2,dpid1)]:
+            self.graph_builder.add_node(from_node)
+            self.graph_builder.add_edge(from_node, 10 + to_node, to_node, 10 + from_node, distance)
+        return set([(dpid1,dpid2), (dpid2,dpid1)])
+
+    def add_group(self, group_key, members):
+        self.manager.index_group_tree(group_key, self.manager.compute_group_tree(members, 1)[2])
+
+    def test_removed_tree_link(self):
+        self.graph_builder.del_edge(3, 14, 4, 13)
+        self.assertEqual(self.manager.get_affected_groups(set([(3,4)])), set(["chain"]))
+
+    def test_up_link_from_a_tree_node_which_gives_a_shorter_path(self):
+        self.assertEqual(self.manager.get_affected_groups(self.add_link(2, 7)), set(["chain"]))
+
+    def test_heavy_up_link_from_a_tree_node(self):
+        self.assertEqual(self.manager.get_affected_groups(self.add_link(2, 7, 5)), set())
+
+    def test_any_up_link_for_unreached_members(self):
+        self.add_group("unreached", {7:[1], 8:[1]})
+        self.assertEqual(self.manager.get_affected_groups(self.add_link(5, 6, 9)), set(["unreached"]))
+
+    def test_up_link_off_the_tree_is_skipped_by_the_bound(self):
+        """ 1-5-6-7 is shorter than the chain, but neither end of the new link is a tree node """
+        self.assertEqual(self.manager.get_affected_groups(self.add_link(5, 6)), set())
+
+    def test_full_repair_recomputes_on_every_up_link(self):
+        self.manager.full_repair = True
+        self.assertEqual(self.manager.get_affected_groups(self.add_link(5, 6)), set(["chain"]))
+
+
+class _RouteTestCase(unittest.TestCase):
+    """ The stream enters on 1, the member is behind port 9 of 3, the tree is the chain 1-2-3 until the 2-3 link goes down
+      and 1-4-3 takes over. Every rule is sent alone, without aggregation. """
+    def setUp(self):
+        install()
+        from graph_builder import GraphBuilder
+        from multicast_traffic_manager import MulticastTrafficManager
+        from pox.lib.addresses import IPAddr
+        import pox.openflow.libopenflow_01 as of
+        self.of = of
+        self.graph_builder = GraphBuilder()
+        self.manager = MulticastTrafficManager(aggregate=False)
+        self.manager.graph_builder = self.graph_builder
+        for dpid1,dpid2,distance in [(1,2,1), (2,3,1), (1,4,2), (4,3,2)]:
+            for from_node,to_node in [(dpid1,dpid2), (dpid2,dpid1)]:
+                self.graph_builder.add_node(from_node)
+                self.graph_builder.add_edge(from_node, 10 + to_node, to_node, 10 + from_node, distance)
+        self.group_key = (IPAddr("232.1.1.1"),IPAddr("10.0.0.1"))
+
+    def sent_stages(self):
+        """ The (stage,dpid,command) of the pending flow mods, in the order of the waves """
+        pending = self.manager.flow_programmer.pending
+        self.manager.flow_programmer.pending = {}
+        return [(stage,dpid,msg.command) for stage in sorted(pending.keys()) for dpid,messages in pending[stage].iteritems()
+                for msg in messages]
+
+
+
+@requires_pox
+class RouteUpdateOrderTest(_RouteTestCase):
+    def test_new_route_is_written_from_the_deepest_level(self):
+        self.manager.update_group_route(self.group_key, {3:[9]}, 1)
+        self.assertEqual([(stage,dpid) for stage,dpid,command in self.sent_stages()], [((0,-2),3), ((0,-1),2), ((0,0),1)])
+
+    def test_removed_route_is_deleted_from_the_root(self):
+        self.manager.update_group_route(self.group_key, {3:[9]}, 1)
+        self.sent_stages()
+        self.manager.remove_old_route(self.group_key)
+        self.assertEqual(self.sent_stages(), [((1,0),1,self.of.OFPFC_DELETE_STRICT), ((1,1),2,self.of.OFPFC_DELETE_STRICT),
+                                              ((1,2),3,self.of.OFPFC_DELETE_STRICT)])
+
+    def test_moved_route_is_made_before_the_old_one_is_broken(self):
+        self.manager.update_group_route(self.group_key, {3:[9]}, 1)
+        self.sent_stages()
+        self.graph_builder.del_edge(2, 13, 3, 12)
+        self.graph_builder.del_edge(3, 12, 2, 13)
+        self.manager.update_group_route(self.group_key, {3:[9]}, 1)
+        sent = self.sent_stages()
+        commands = [command for stage,dpid,command in sent]
+        self.assertEqual(commands.count(self.of.OFPFC_DELETE_STRICT), 1)
+        """ The rule of 3 doesn't change, 4 is written before 1 turns to it, and 2 is only deleted after that """
+        self.assertEqual([dpid for stage,dpid,command in sent], [4,1,2])
+        self.assertEqual(commands[-1], self.of.OFPFC_DELETE_STRICT)
+
+
+@requires_pox
+class MemberDeltaTest(_RouteTestCase):
+    """ Membership updates of the group on the same graph, with the switches of the changed members """
+    def member_update(self, members, changed_switches):
+        from streamer_state_builder import ActiveGroupStateChanged
+        event = ActiveGroupStateChanged(self.group_key, {"members":members, "streamer":1}, None, changed_switches)
+        self.manager._handle_StreamerStateBuilder_ActiveGroupStateChanged(event)
+        return self.manager.get_tree_stats()["reused_trees"]
+
+    def test_port_change_on_a_member_switch_keeps_the_tree(self):
+        self.member_update({3:[9]}, None)
+        self.assertEqual(self.member_update({3:[8,9], 2:[7]}, frozenset([3,2])), 0)
+        tree_info = self.manager.group_trees[self.group_key]
+        self.assertEqual(self.member_update({3:[8], 2:[7]}, frozenset([3])), 1)
+        self.assertIs(self.manager.group_trees[self.group_key], tree_info)
+        self.assertEqual(self.manager.flow_entries[self.group_key], {1:[12], 2:[7,13], 3:[8]})
+
+    def test_only_the_changed_rule_is_written(self):
+        self.member_update({3:[9]}, None)
+        self.sent_stages()
+        self.assertEqual(self.member_update({3:[8,9]}, frozenset([3])), 1)
+        self.assertEqual(self.sent_stages(), [((0,-2),3,self.of.OFPFC_MODIFY_STRICT)])
+
+    def test_new_member_switch_or_topology_computes_the_tree(self):
+        self.member_update({3:[9]}, None)
+        self.assertEqual(self.member_update({3:[9], 4:[9]}, frozenset([4])), 0)
+        self.graph_builder.del_edge(2, 13, 3, 12)
+        self.assertEqual(self.member_update({3:[9], 4:[8]}, frozenset([4])), 0)
+        self.assertEqual(self.manager.flow_entries[self.group_key][4], [8,13])
+
+
+@requires_pox
+class StreamLivenessTest(unittest.TestCase):
+    """ The chain 3-1-2 with a member behind port 9 of 2, the components are bound through the stand-in core, the flow mods
+      wait for the switches, which are not connected """
+    def setUp(self):
+        self.core = install()
+        from graph_builder import GraphBuilder
+        from streamer_state_builder import StreamerStateBuilder
+        from multicast_traffic_manager import MulticastTrafficManager
+        from flow_aggregator import EXACT_PRIORITY
+        from pox.lib.addresses import IPAddr
+        import pox.openflow.libopenflow_01 as of
+        self.of = of
+        self.exact_priority = EXACT_PRIORITY
+        self.graph_builder = GraphBuilder()
+        for dpid1,dpid2 in [(3,1), (1,2)]:
+            for from_node,to_node in [(dpid1,dpid2), (dpid2,dpid1)]:
+                self.graph_builder.add_node(from_node)
+                self.graph_builder.add_edge(from_node, 10 + to_node, to_node, 10 + from_node, 1)
+        self.streamer_state_builder = StreamerStateBuilder(temporary_timeout=0)
+        self.manager = MulticastTrafficManager(aggregate=False, stream_idle_timeout=30)
+        self.core.register("GraphBuilder", self.graph_builder)
+        self.core.register("StreamerStateBuilder", self.streamer_state_builder)
+        self.core.register("MulticastTrafficManager", self.manager)
+        self.manager.graph_builder = self.graph_builder
+        self.group_key = (IPAddr("232.1.1.1"),IPAddr("10.0.0.1"))
+
+    def set_stream(self, streamer, members):
+        self.streamer_state_builder.set_group(self.group_key, {"members":members, "streamer":streamer, "fingerprint":None})
+        self.streamer_state_builder.last_handled[self.group_key] = 0
+        self.streamer_state_builder.raise_event_modified(self.group_key)
+
+    def flow_mods(self):
+        """ {dpid:[(command,idle timeout,out ports)]} of the flow mods sent since the last call """
+        self.core.run_later()
+        flow_mods = {}
+        for dpid,messages in self.manager.flow_programmer.waiting.items():
+            flow_mods[dpid] = [(msg.command,msg.idle_timeout,[action.port for action in msg.actions]) for msg in messages]
+            self.manager.flow_programmer.pop_waiting(dpid)
+        return flow_mods
+
+    def idle_timeout(self, dpid, rule_key):
+        from stand_ins import record
+        msg = self.manager.make_rule_flow_mod(rule_key, ())
+        self.core.openflow.raiseEvent("FlowRemoved", record(dpid=dpid, ofp=record(reason=self.of.OFPRR_IDLE_TIMEOUT,
+                                      priority=msg.priority, match=msg.match)))
+
+    def stream_rule(self):
+        return (self.group_key[0].toUnsigned(),32,self.group_key[1],None)
+
+    def test_stream_without_reachable_member_is_retired(self):
+        self.set_stream(1, {9:[1]})
+        self.assertEqual(self.flow_mods(), {1:[(self.of.OFPFC_ADD,30,[])]})
+        self.idle_timeout(1, self.stream_rule())
+        self.assertEqual(self.flow_mods(), {})
+        self.assertEqual((self.streamer_state_builder.groups,self.streamer_state_builder.last_handled), ({},{}))
+        self.assertEqual((self.manager.group_trees,self.manager.flow_entries), ({},{}))
+        self.assertEqual(self.manager.flow_aggregator.get_stats()["rules"], 0)
+        self.assertEqual(self.streamer_state_builder.get_retire_stats()["retired"], 1)
+
+    def test_moved_streamer_rules_get_their_timeouts_again(self):
+        self.set_stream(1, {2:[9]})
+        self.assertEqual(self.flow_mods(), {1:[(self.of.OFPFC_ADD,30,[12])], 2:[(self.of.OFPFC_ADD,0,[9])]})
+        self.set_stream(3, {2:[9]})
+        self.assertEqual(self.flow_mods(), {1:[(self.of.OFPFC_ADD,0,[12])], 3:[(self.of.OFPFC_ADD,30,[11])]})
+
+    def test_expired_rule_of_the_old_streamer_is_forgotten(self):
+        self.set_stream(1, {2:[9]})
+        self.set_stream(3, {2:[9]})
+        self.flow_mods()
+        """ The old rule expired before it was added again without the idle timeout """
+        self.idle_timeout(1, self.stream_rule())
+        self.core.run_later()
+        self.assertIn(self.group_key, self.streamer_state_builder.groups)
+        self.assertEqual(self.manager.flow_aggregator.get_switch_rules(1), {})
+        self.assertEqual(self.manager.flow_aggregator.get_stats()["forgotten"], 1)
+        """ The next change of the switch's entries adds it again, the retirement doesn't delete it """
+        self.set_stream(3, {2:[8]})
+        self.assertEqual(self.flow_mods(), {2:[(self.of.OFPFC_MODIFY_STRICT,0,[8])]})
+        self.set_stream(3, {1:[7], 2:[8]})
+        self.assertEqual(self.flow_mods(), {1:[(self.of.OFPFC_ADD,0,[7,12])]})
+        self.idle_timeout(3, self.stream_rule())
+        self.assertEqual(self.flow_mods(), {1:[(self.of.OFPFC_DELETE_STRICT,0,[])], 2:[(self.of.OFPFC_DELETE_STRICT,0,[])]})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+""" Tests of the worker processes of the parallel tree computation, against the trees computed in process """
+import os
+import random
+import signal
+import unittest
+
+import routing_engines
+from graph_snapshot import GraphSnapshot
+from parallel_routes import ParallelRouteComputer
+
+
+class _Adjacency(object):
+    def __init__(self, succ):
+        self.succ = succ
+
+
+class _Topology(object):
+    """ A random Waxman graph with the fields of the GraphBuilder which GraphSnapshot.build reads """
+
+    def __init__(self, nodes, version, rand):
+        graph = routing_engines._RandomGraph(nodes, rand=rand)
+        self.nodes = set(graph.succ.keys())
+        self.adjacency = _Adjacency(graph.succ)
+        self.distances = graph.distances
+        self.ports = dict(((from_node,to_node),(to_node + 1,from_node + 1)) for from_node,to_node in graph.distances)
+        self.version = version
+
+
+class ParallelRouteComputerTest(unittest.TestCase):
+    def setUp(self):
+        self.computer = ParallelRouteComputer(2, threshold=4)
+
+    def tearDown(self):
+        self.computer.close()
+
+    def make_jobs(self, rand, count, nodes):
+        jobs = []
+        for index in xrange(count):
+            switches = rand.sample(xrange(nodes), 5)
+            group_members = dict((switch,[100 + index]) for switch in switches[1:])
+            jobs.append((index,group_members,switches[0]))
+        return jobs
+
+    def test_same_trees_as_in_process(self):
+        rand = random.Random(5)
+        snapshot = GraphSnapshot.build(_Topology(30, 1, rand))
+        jobs = self.make_jobs(rand, 10, 30)
+        results = self.computer.compute(snapshot, "prim", jobs)
+
+        engine = routing_engines.get_engine("prim")
+        self.assertEqual(sorted(results.keys()), range(10))
+        for job_key,group_members,root in jobs:
+            """ The member dicts are unpickled in the workers, so the edges may come in another order """
+            min_cost_tree,constructed_route = results[job_key]
+            expected_tree = engine.compute_tree(snapshot, group_members.keys(), root)
+            expected_route = routing_engines.construct_routes(snapshot, expected_tree, group_members)
+            self.assertEqual(sorted(min_cost_tree), sorted(expected_tree))
+            self.assertEqual(dict((node,sorted(ports)) for node,ports in constructed_route.iteritems()),
+                             dict((node,sorted(ports)) for node,ports in expected_route.iteritems()))
+
+    def test_snapshot_sent_once_per_version(self):
+        rand = random.Random(6)
+        snapshot = GraphSnapshot.build(_Topology(20, 1, rand))
+        self.computer.compute(snapshot, "tm", self.make_jobs(rand, 8, 20))
+        self.computer.compute(snapshot, "tm", self.make_jobs(rand, 8, 20))
+        self.assertEqual(self.computer.stats["snapshots_sent"], 2)
+
+        snapshot = GraphSnapshot.build(_Topology(20, 2, rand))
+        self.computer.compute(snapshot, "tm", self.make_jobs(rand, 8, 20))
+        self.assertEqual(self.computer.stats["snapshots_sent"], 4)
+        self.assertEqual(self.computer.stats["rounds"], 3)
+
+    def test_worker_killed_in_the_middle_of_a_batch(self):
+        rand = random.Random(7)
+        snapshot = GraphSnapshot.build(_Topology(20, 1, rand))
+        jobs = self.make_jobs(rand, 8, 20)
+        killed = self.computer.workers[1]
+        send = killed.send
+        def send_and_kill(message):
+            """ The worker is stopped before it can read its chunk, and killed after the chunk is sent """
+            if message[0] == "jobs":
+                os.kill(killed.process.pid, signal.SIGSTOP)
+                send(message)
+                killed.process.kill()
+            else:
+                send(message)
+        killed.send = send_and_kill
+
+        results = self.computer.compute(snapshot, "prim", jobs)
+        self.assertEqual(sorted(results.keys()), range(4))
+        self.assertEqual((self.computer.stats["worker_failures"],self.computer.stats["lost_jobs"]), (1,4))
+        self.assertIsNot(self.computer.workers[1], killed)
+        self.assertIsNotNone(killed.process.poll())
+
+        """ The new worker gets the snapshot with its next chunk """
+        self.assertEqual(sorted(self.computer.compute(snapshot, "prim", jobs).keys()), range(8))
+        self.assertEqual(self.computer.stats["snapshots_sent"], 3)
+
+    def test_dead_worker_before_the_send(self):
+        rand = random.Random(8)
+        snapshot = GraphSnapshot.build(_Topology(20, 1, rand))
+        jobs = self.make_jobs(rand, 8, 20)
+        self.computer.workers[0].process.kill()
+        self.computer.workers[0].process.wait()
+        results = self.computer.compute(snapshot, "prim", jobs)
+        self.assertEqual(sorted(results.keys()), range(4, 8))
+        self.assertEqual(self.computer.stats["worker_failures"], 1)
+        self.assertEqual(self.computer.workers[0].process.poll(), None)
+
+    def test_should_use(self):
+        self.assertFalse(self.computer.should_use(3, routing_engines.get_engine("prim")))
+        self.assertTrue(self.computer.should_use(4, routing_engines.get_engine("prim")))
+        self.assertFalse(self.computer.should_use(100, routing_engines.get_engine("reference")))
+        """ The compare engine logs through POX, only its name is needed here """
+        self.assertFalse(self.computer.should_use(100, routing_engines.ENGINES["compare"]))
+
+if __name__ == "__main__":
+    unittest.main()
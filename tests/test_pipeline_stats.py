@@ -0,0 +1,90 @@
+""" Tests of the pipeline stats: the histogram percentiles, the disabled stats and the HTTP endpoint """
+import json
+import threading
+import unittest
+import urllib2
+from BaseHTTPServer import HTTPServer
+
+import pipeline_stats
+from pipeline_stats import Histogram,PipelineStats
+
+
+class HistogramTest(unittest.TestCase):
+    def test_percentiles_are_bucket_bounds(self):
+        histogram = Histogram()
+        for index in xrange(90):
+            histogram.add(0.001)
+        for index in xrange(10):
+            histogram.add(0.1)
+        self.assertTrue(0.001 <= histogram.percentile(0.5) < 0.001 * Histogram.BASE)
+        self.assertTrue(0.001 <= histogram.percentile(0.9) < 0.001 * Histogram.BASE)
+        self.assertEqual(histogram.percentile(0.99), 0.1)
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 100)
+        self.assertAlmostEqual(summary["avg_ms"], 10.9)
+
+    def test_tiny_values_go_to_the_first_bucket(self):
+        histogram = Histogram()
+        histogram.add(0.0)
+        self.assertEqual((histogram.buckets,histogram.percentile(1.0)), ({0:1},0.0))
+
+
+class PipelineStatsTest(unittest.TestCase):
+    def test_disabled_stats_record_nothing(self):
+        stats = PipelineStats()
+        timer = stats.start("tree")
+        stats.stop(timer)
+        stats.count("flow_mods")
+        self.assertIsNone(timer)
+        self.assertEqual((stats.snapshot()["stages"],stats.snapshot()["counters"]), ({},{}))
+
+    def test_stages_and_counters(self):
+        stats = PipelineStats()
+        stats.enabled = True
+        stats.stop(stats.start("tree"))
+        stats.count("flow_mods", 3)
+        snapshot = stats.snapshot()
+        self.assertEqual((snapshot["stages"]["tree"]["count"],snapshot["counters"]), (1,{"flow_mods":3}))
+        self.assertIn("flow_mods", stats.report())
+        stats.reset()
+        self.assertEqual(stats.snapshot()["counters"], {})
+
+
+class StatsEndpointTest(unittest.TestCase):
+    """ The endpoint serves the shared stats object, its state is restored after the tests """
+    def setUp(self):
+        self.stats = pipeline_stats.stats
+        self.saved = (self.stats.enabled,self.stats.counters)
+        self.stats.enabled = True
+        self.stats.counters = {}
+        self.server = HTTPServer(("127.0.0.1", 0), pipeline_stats._StatsRequestHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.stats.enabled,self.stats.counters = self.saved
+
+    def get(self, path):
+        return urllib2.urlopen("http://127.0.0.1:%d%s" % (self.server.server_port,path), timeout=5)
+
+    def test_stats(self):
+        self.stats.count("stream_packets", 2)
+        response = self.get("/stats")
+        self.assertEqual(response.info()["Content-Type"], "application/json")
+        self.assertEqual(json.loads(response.read())["counters"], {"stream_packets":2})
+
+    def test_reset(self):
+        self.stats.count("stream_packets")
+        self.assertEqual(json.loads(self.get("/reset").read())["counters"], {})
+        self.assertEqual(self.stats.counters, {})
+
+    def test_unknown_path(self):
+        with self.assertRaises(urllib2.HTTPError) as context:
+            self.get("/other")
+        self.assertEqual(context.exception.code, 404)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+""" Tests of the route cache of the MulticastTrafficManager, alone and on the trees which the manager computes """
+import unittest
+
+from stand_ins import requires_pox,install
+
+
+@requires_pox
+class RouteCacheTest(unittest.TestCase):
+    def setUp(self):
+        install()
+        from multicast_traffic_manager import RouteCache
+        self.RouteCache = RouteCache
+
+    def test_key_ignores_the_member_order(self):
+        cache = self.RouteCache()
+        self.assertEqual(cache.make_key(1, {2:[3,4], 5:[1]}, 7), cache.make_key(1, {5:[1], 2:[4,3]}, 7))
+        self.assertNotEqual(cache.make_key(1, {2:[3]}, 7), cache.make_key(1, {2:[3]}, 8))
+        self.assertNotEqual(cache.make_key(1, {2:[3]}, 7), cache.make_key(2, {2:[3]}, 7))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = self.RouteCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"),cache.get("c")), (1,3))
+        self.assertEqual(cache.get_stats(), {"size":2, "max_size":2, "hits":3, "misses":1})
+
+    def test_zero_size_disables_the_cache(self):
+        cache = self.RouteCache(0)
+        cache.put("a", 1)
+        self.assertIsNone(cache.get("a"))
+
+
+@requires_pox
+class CachedTreeTest(unittest.TestCase):
+    """ Triangle of the switches 1, 2 and 3, the streamer is on 1, the members on 2 """
+    def setUp(self):
+        install()
+        from graph_builder import GraphBuilder
+        from multicast_traffic_manager import MulticastTrafficManager
+        self.graph_builder = GraphBuilder()
+        for dpid1,port1,dpid2,port2 in [(1,1,2,1), (1,2,3,1), (2,2,3,2)]:
+            self.add_link(dpid1, port1, dpid2, port2, 1)
+        self.manager = MulticastTrafficManager()
+        self.manager.graph_builder = self.graph_builder
+
+    def add_link(self, dpid1, port1, dpid2, port2, distance):
+        for from_node,from_port,to_node,to_port in [(dpid1,port1,dpid2,port2), (dpid2,port2,dpid1,port1)]:
+            self.graph_builder.add_node(from_node)
+            self.graph_builder.add_edge(from_node, from_port, to_node, to_port, distance)
+
+    def test_same_root_and_members_share_the_tree(self):
+        constructed_route = self.manager.compute_group_tree({2:[3,4]}, 1)[1]
+        self.assertIs(self.manager.compute_group_tree({2:[4,3]}, 1)[1], constructed_route)
+        self.assertEqual(self.manager.route_cache.get_stats()["hits"], 1)
+
+    def test_other_members_or_root_are_computed(self):
+        self.manager.compute_group_tree({2:[3]}, 1)
+        self.manager.compute_group_tree({2:[4]}, 1)
+        self.manager.compute_group_tree({2:[3]}, 3)
+        cache_stats = self.manager.route_cache.get_stats()
+        self.assertEqual((cache_stats["hits"],cache_stats["misses"],cache_stats["size"]), (0,3,3))
+
+    def test_new_topology_version_is_computed(self):
+        self.assertEqual(self.manager.compute_group_tree({2:[3]}, 1)[0], [(1,2)])
+        self.add_link(1, 1, 2, 1, 5)
+        min_cost_tree,constructed_route,tree_info = self.manager.compute_group_tree({2:[3]}, 1)
+        self.assertEqual(sorted(min_cost_tree), [(1,3),(3,2)])
+        self.assertEqual(self.manager.route_cache.get_stats()["hits"], 0)
+        self.assertEqual(tree_info["cost"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+""" Tests of the routing engines on small hand made graphs and on random Waxman graphs.
+  Run from the repository root: python -m unittest discover tests
+  """
+import random
+import unittest
+
+import routing_engines
+from stand_ins import requires_pox,install
+
+
+class _Graph(object):
+    """ Undirected weighted graph with the interface of the GraphBuilder which the engines use """
+
+    def __init__(self, links, nodes=()):
+        self.succ = {}
+        self.distances = {}
+        self.ports = {}
+        for node in nodes:
+            self.succ.setdefault(node, set())
+        for from_node,to_node,distance in links:
+            self.succ.setdefault(from_node, set()).add(to_node)
+            self.succ.setdefault(to_node, set()).add(from_node)
+            self.distances[(from_node,to_node)] = self.distances[(to_node,from_node)] = distance
+            self.ports[(from_node,to_node)] = (to_node,from_node)
+            self.ports[(to_node,from_node)] = (from_node,to_node)
+
+    def has_node(self, node):
+        return node in self.succ
+
+    def successors(self, node):
+        return self.succ.get(node,())
+
+    def get_distance(self, from_node, to_node):
+        return self.distances[(from_node,to_node)]
+
+    def get_port_pair(self, from_node, to_node):
+        return self.ports[(from_node,to_node)]
+
+    def successor_distances(self, node):
+        return [(to_node,self.distances[(node,to_node)]) for to_node in self.succ.get(node,())]
+
+
+""" Root 1 and members 2 and 3: the shortest path tree uses both root links (cost 6), a Steiner tree goes 1-2-3 (cost 4) """
+TRIANGLE = [(1,2,3), (1,3,3), (2,3,1)]
+
+STEINER_ENGINES = ["prim","kmb","tm"]
+TREE_ENGINES = ["prim","spt","kmb","tm"]
+
+
+class RoutingEngineTest(unittest.TestCase):
+    def assert_tree(self, graph, tree, members, root):
+        """ The edges exist, every node has one parent, every member is reached from the root, and every leaf is a member """
+        parents = {}
+        for from_node,to_node in tree:
+            self.assertIn(to_node, graph.successors(from_node))
+            self.assertNotIn(to_node, parents)
+            parents[to_node] = from_node
+        self.assertNotIn(root, parents)
+
+        for member in members:
+            node = member
+            hops = 0
+            while node != root:
+                node = parents[node]
+                hops += 1
+                self.assertLessEqual(hops, len(parents))
+        leaves = set(parents.keys()).difference(from_node for from_node,to_node in tree)
+        self.assertTrue(leaves.issubset(members))
+
+    def test_triangle_costs(self):
+        graph = _Graph(TRIANGLE)
+        for name in STEINER_ENGINES:
+            tree = routing_engines.get_engine(name).compute_tree(graph, [2,3], 1)
+            self.assert_tree(graph, tree, [2,3], 1)
+            self.assertEqual(routing_engines.tree_cost(graph, tree), 4, name)
+        tree = routing_engines.get_engine("spt").compute_tree(graph, [2,3], 1)
+        self.assertEqual(sorted(tree), [(1,2),(1,3)])
+
+    def test_unreachable_and_unknown_members_are_left_out(self):
+        graph = _Graph(TRIANGLE + [(4,5,1)], nodes=[6])
+        for name in TREE_ENGINES:
+            tree = routing_engines.get_engine(name).compute_tree(graph, [2,5,6,7], 1)
+            self.assert_tree(graph, tree, [2], 1)
+            self.assertEqual(set(to_node for from_node,to_node in tree), set([2]), name)
+
+    def test_root_only_group(self):
+        graph = _Graph(TRIANGLE)
+        for name in TREE_ENGINES:
+            self.assertEqual(routing_engines.get_engine(name).compute_tree(graph, [1], 1), [], name)
+
+    def test_random_graphs(self):
+        rand = random.Random(3)
+        for index in xrange(5):
+            graph = routing_engines._RandomGraph(40, rand=rand)
+            members = rand.sample(xrange(40), 8)
+            root = members.pop()
+            for name in TREE_ENGINES:
+                tree = routing_engines.get_engine(name).compute_tree(graph, members, root)
+                self.assert_tree(graph, tree, members, root)
+
+    def test_steiner_engines_use_a_hub_switch(self):
+        """ The hub 5 is not a member, the tree through it costs 4, the direct member links would cost 9 """
+        graph = _Graph([(1,2,3), (1,3,3), (1,4,3), (1,5,1), (5,2,1), (5,3,1), (5,4,1)])
+        for name in STEINER_ENGINES:
+            tree = routing_engines.get_engine(name).compute_tree(graph, [2,3,4], 1)
+            self.assertEqual(sorted(tree), [(1,5),(5,2),(5,3),(5,4)], name)
+
+    def test_shortest_path_tree_depths(self):
+        rand = random.Random(5)
+        graph = routing_engines._RandomGraph(40, rand=rand)
+        members = rand.sample(xrange(1, 40), 10)
+        distances,before_edges = routing_engines.dijkstra(graph, [0])
+        tree = routing_engines.get_engine("spt").compute_tree(graph, members, 0)
+        parents = dict((to_node,from_node) for from_node,to_node in tree)
+        for member in members:
+            depth = 0
+            node = member
+            while node != 0:
+                depth += graph.get_distance(parents[node], node)
+                node = parents[node]
+            self.assertAlmostEqual(depth, distances[member])
+
+    def test_construct_routes(self):
+        graph = _Graph(TRIANGLE + [(3,4,1)])
+        tree = routing_engines.get_engine("prim").compute_tree(graph, [2,3], 1)
+        routes = routing_engines.construct_routes(graph, tree, {2:[10], 3:[11], 4:[12]})
+        self.assertEqual(sorted(routes[1]), [2])
+        self.assertEqual(sorted(routes[2]), [3,10])
+        self.assertEqual(routes[3], [11])
+        """ 4 is not on the tree, but it is a member switch of the graph """
+        self.assertEqual(routes[4], [12])
+
+    @requires_pox
+    def test_compare_engine_counts_heavier_trees(self):
+        install()
+        graph = _Graph(TRIANGLE)
+        engine = routing_engines.CompareEngine(routing_engines.ShortestPathTreeEngine(), routing_engines.PrimPruneEngine())
+        engine.log.disabled = True
+        try:
+            tree = engine.compute_tree(graph, [2,3], 1)
+        finally:
+            engine.log.disabled = False
+        self.assertEqual(sorted(tree), [(1,2),(1,3)])
+        self.assertEqual(engine.stats, {"trees":1, "heavier":1})
+
+    def test_unknown_engine(self):
+        self.assertRaises(ValueError, routing_engines.get_engine, "nope")
+
+if __name__ == "__main__":
+    unittest.main()
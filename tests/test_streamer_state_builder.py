@@ -0,0 +1,195 @@
+""" Tests of the StreamerStateBuilder, driven by the events of a MemberStateBuilder and by stream PacketIn events """
+import unittest
+
+from stand_ins import requires_pox,install,report_v2,report_v3,stream_packet_in
+
+GROUP = "232.1.1.1"
+SOURCE = "10.0.0.1"
+
+
+class _StreamerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.core = install()
+        from pox.lib.addresses import IPAddr
+        from member_state_builder import MemberStateBuilder,PassiveGroupStateChanged,PassiveGroupDeleted
+        from streamer_state_builder import StreamerStateBuilder,ActiveGroupStateChanged,ActiveGroupDeleted,IncompleteGroupStateChanged
+        self.group = IPAddr(GROUP)
+        self.source = IPAddr(SOURCE)
+        self.group_key = (self.group,self.source)
+        self.member_state_builder = MemberStateBuilder()
+        self.streamer_state_builder = StreamerStateBuilder(temporary_timeout=0)
+        self.member_state_builder.addListener(PassiveGroupStateChanged,
+                                              self.streamer_state_builder._handle_MemberStateBuilder_PassiveGroupStateChanged)
+        self.member_state_builder.addListener(PassiveGroupDeleted,
+                                              self.streamer_state_builder._handle_MemberStateBuilder_PassiveGroupDeleted)
+        self.events = []
+        self.streamer_state_builder.addListener(ActiveGroupStateChanged, lambda event: self.events.append(("changed",
+                                                event.get_group_data()[0],event.get_changed_switches())))
+        self.streamer_state_builder.addListener(ActiveGroupDeleted, lambda event: self.events.append(("deleted",
+                                                event.get_group_key(),None)))
+        self.streamer_state_builder.addListener(IncompleteGroupStateChanged, lambda event: self.events.append((event.flag,
+                                                event.group_key,None)))
+
+    def report_v2(self, dpid, port, leave=False):
+        self.member_state_builder._handle_PacketIn(report_v2(dpid, port, self.group, leave))
+
+    def report_v3(self, dpid, port, record_type, sources):
+        self.member_state_builder._handle_PacketIn(report_v3(dpid, port, [(record_type,self.group,sources)]))
+
+
+@requires_pox
+class MemberDeltaTest(_StreamerTestCase):
+    def setUp(self):
+        _StreamerTestCase.setUp(self)
+        self.report_v2(2, 1)
+        self.streamer_state_builder.set_group(self.group_key, {"members":{2:[1]}, "streamer":1,
+                                              "fingerprint":self.member_state_builder.get_member_fingerprint(*self.group_key)})
+
+    def test_switches_of_the_changed_members_are_passed_on(self):
+        self.report_v2(3, 1)
+        self.report_v2(2, 4)
+        self.assertEqual(self.events, [("changed",self.group_key,frozenset([3])), ("changed",self.group_key,frozenset([2]))])
+        self.assertEqual(self.streamer_state_builder.groups[self.group_key]["members"], {2:[1,4], 3:[1]})
+
+    def test_change_of_another_source_is_not_passed_on(self):
+        import member_state_builder
+        from pox.lib.addresses import IPAddr
+        self.report_v3(3, 1, member_state_builder.MODE_IS_INCLUDE, [IPAddr("10.9.9.9")])
+        self.assertEqual(self.events, [])
+        self.assertEqual(self.member_state_builder.get_valid_group_members(self.group, IPAddr("10.9.9.9")), {2:[1], 3:[1]})
+
+    def test_report_with_many_records_updates_every_stream_once(self):
+        import member_state_builder
+        from pox.lib.addresses import IPAddr
+        other_key = (self.group,IPAddr("10.0.0.2"))
+        self.streamer_state_builder.set_group(other_key, {"members":{2:[1]}, "streamer":1,
+                                              "fingerprint":self.member_state_builder.get_member_fingerprint(*other_key)})
+        self.report_v3(3, 1, member_state_builder.ALLOW_NEW_SOURCES, [self.source])
+        del self.events[:]
+        self.member_state_builder._handle_PacketIn(report_v3(3, 2, [(member_state_builder.ALLOW_NEW_SOURCES,self.group,[self.source]),
+                                                                    (member_state_builder.ALLOW_NEW_SOURCES,self.group,[other_key[1]]),
+                                                                    (member_state_builder.BLOCK_OLD_SOURCES,self.group,[self.source])]))
+        self.assertEqual(self.events, [("changed",other_key,frozenset([3]))])
+
+
+@requires_pox
+class AddressIndexTest(_StreamerTestCase):
+    def incomplete(self, group_key):
+        self.streamer_state_builder.set_incomplete_group(group_key, {"members":{}, "streamer":1, "fingerprint":frozenset()})
+
+    def test_incomplete_streams_are_found_by_the_group_address_only(self):
+        from pox.lib.addresses import IPAddr
+        reversed_key = (IPAddr("232.9.9.9"),self.group)
+        self.incomplete(self.group_key)
+        self.incomplete(reversed_key)
+        self.report_v2(2, 1)
+        self.assertEqual(self.events, [("UNBLOCK",self.group_key,None), ("changed",self.group_key,None)])
+        self.assertEqual(self.streamer_state_builder.groups[self.group_key]["members"], {2:[1]})
+        self.assertEqual(self.streamer_state_builder.incomplete_keys, {reversed_key[0]:set([reversed_key])})
+        self.assertEqual(self.streamer_state_builder.get_group_keys(self.group), [self.group_key])
+
+    def test_deleted_group_retires_only_its_streams(self):
+        from pox.lib.addresses import IPAddr
+        other_key = (IPAddr("232.9.9.9"),self.source)
+        self.report_v2(2, 1)
+        self.member_state_builder._handle_PacketIn(report_v2(2, 1, other_key[0]))
+        for group_key in [self.group_key,other_key]:
+            self.streamer_state_builder.set_group(group_key, {"members":{2:[1]}, "streamer":1,
+                                                  "fingerprint":self.member_state_builder.get_member_fingerprint(*group_key)})
+        del self.events[:]
+        self.report_v2(2, 1, leave=True)
+        self.assertEqual(self.events, [("deleted",self.group_key,None)])
+        self.assertEqual(self.streamer_state_builder.group_keys, {other_key[0]:set([other_key])})
+        self.assertEqual(self.streamer_state_builder.groups.keys(), [other_key])
+
+    def test_same_member_set_raises_no_event(self):
+        """ The stored member dict is not the view of the member state builder, the fingerprints are compared """
+        self.report_v2(2, 1)
+        self.streamer_state_builder.set_group(self.group_key, {"members":{2:[1]}, "streamer":1,
+                                              "fingerprint":frozenset([(2,1)])})
+        del self.events[:]
+        import member_state_builder
+        from pox.lib.addresses import IPAddr
+        self.report_v3(2, 1, member_state_builder.MODE_IS_EXCLUDE, [IPAddr("10.9.9.9")])
+        self.assertEqual(self.events, [])
+        self.report_v3(2, 1, member_state_builder.MODE_IS_EXCLUDE, [self.source])
+        self.assertEqual(self.events, [("changed",self.group_key,frozenset([2]))])
+
+
+@requires_pox
+class PacketInSuppressionTest(_StreamerTestCase):
+    """ The stream enters on port 5 of switch 1, its tree is 1-2 to the member on switch 2, switch 3 is off the tree """
+    def setUp(self):
+        _StreamerTestCase.setUp(self)
+        from flow_programmer import FlowProgrammer
+        from multicast_traffic_manager import MulticastTrafficManager
+        import pox.openflow.libopenflow_01 as of
+        self.of = of
+        self.streamer_state_builder.temporary_timeout = 2
+        self.flow_programmer = FlowProgrammer()
+        self.core.register("FlowProgrammer", self.flow_programmer)
+        self.manager = MulticastTrafficManager()
+        self.core.register("MulticastTrafficManager", self.manager)
+        self.report_v2(2, 1)
+        del self.events[:]
+
+    def packet_in(self, dpid, port=5):
+        return self.streamer_state_builder._handle_PacketIn(stream_packet_in(dpid, port, self.group, self.source))
+
+    def temporary_flows(self):
+        """ (dpid,in port,hard timeout) of the temporary flow mods given to the flow programmer since the last call """
+        flows = [(dpid,msg.match.in_port,msg.hard_timeout) for batches in self.flow_programmer.pending.values()
+                 for dpid,messages in batches.iteritems() for msg in messages]
+        self.flow_programmer.pending = {}
+        return flows
+
+    def new_stream(self):
+        self.packet_in(1)
+        self.manager.index_group_tree(self.group_key, {"edges":frozenset([(1,2)]), "depths":{1:0, 2:1}, "unreached":False})
+
+    def test_new_stream_is_handled_once(self):
+        from pox.lib.revent import EventHalt
+        self.new_stream()
+        self.assertIs(self.packet_in(1), EventHalt)
+        self.packet_in(1)
+        self.assertEqual(self.events, [("changed",self.group_key,None)])
+        self.assertEqual(self.temporary_flows(), [(1,5,2)])
+        packet_in_stats = self.streamer_state_builder.get_packet_in_stats()
+        self.assertEqual((packet_in_stats["handled"],packet_in_stats["suppressed"],packet_in_stats["temporary_flows"]), (1,2,1))
+
+    def test_temporary_flow_is_installed_again_after_its_timeout(self):
+        self.new_stream()
+        self.temporary_flows()
+        installed,dpid,in_port = self.streamer_state_builder.temporary_flows[self.group_key]
+        self.streamer_state_builder.temporary_flows[self.group_key] = (installed - 2,dpid,in_port)
+        self.packet_in(1)
+        self.assertEqual(self.temporary_flows(), [(1,5,2)])
+        self.assertEqual(self.events, [("changed",self.group_key,None)])
+
+    def test_packets_from_the_tree_are_suppressed(self):
+        self.new_stream()
+        self.packet_in(2, 1)
+        self.assertEqual(self.events, [("changed",self.group_key,None)])
+        self.assertEqual(self.streamer_state_builder.get_packet_in_stats()["rate_limited"], 0)
+
+    def test_packets_from_another_switch_are_rate_limited(self):
+        self.new_stream()
+        self.packet_in(3)
+        self.assertEqual(self.streamer_state_builder.get_packet_in_stats()["rate_limited"], 1)
+        self.assertEqual(self.streamer_state_builder.get_streamer(self.group_key), 1)
+        """ After the rate limit the packet is handled as a moved streamer """
+        self.streamer_state_builder.last_handled[self.group_key] -= 1
+        self.packet_in(3)
+        self.assertEqual(self.streamer_state_builder.get_streamer(self.group_key), 3)
+        self.assertEqual(self.events, [("changed",self.group_key,None)] * 2)
+
+    def test_blocked_stream_is_suppressed_on_its_streamer(self):
+        from pox.lib.addresses import IPAddr
+        blocked_key = (IPAddr("232.2.2.2"),self.source)
+        self.streamer_state_builder._handle_PacketIn(stream_packet_in(1, 5, blocked_key[0], self.source))
+        self.streamer_state_builder._handle_PacketIn(stream_packet_in(1, 5, blocked_key[0], self.source))
+        self.assertEqual(self.events, [("BLOCK",blocked_key,None)])
+        self.assertEqual(self.temporary_flows(), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+""" Tests of the hierarchical timer wheel against a sorted list of deadlines """
+import random
+import unittest
+
+from timer_wheel import TimerWheel
+
+
+class TimerWheelTest(unittest.TestCase):
+    def test_expiry_order(self):
+        wheel = TimerWheel(tick=1.0, slots=4, levels=3)
+        for item,deadline in [("c",9), ("a",2), ("b",5)]:
+            wheel.schedule(item, deadline)
+        self.assertEqual(len(wheel), 3)
+        self.assertEqual(wheel.advance(1), [])
+        self.assertEqual(wheel.advance(5), ["a","b"])
+        self.assertEqual(wheel.advance(20), ["c"])
+        self.assertEqual(len(wheel), 0)
+
+    def test_deadline_is_rounded_up_to_the_next_tick(self):
+        wheel = TimerWheel(tick=1.0, now=10.0)
+        wheel.schedule("past", 3.0)
+        wheel.schedule("fraction", 11.5)
+        self.assertEqual(wheel.advance(11.0), ["past"])
+        self.assertEqual(wheel.advance(12.0), ["fraction"])
+
+    def test_beyond_the_wheel_range(self):
+        """ The timers further than the range of the highest level wait there, and are cascaded down in time """
+        wheel = TimerWheel(tick=1.0, slots=4, levels=2)
+        wheel.schedule("far", 50)
+        self.assertEqual(wheel.advance(49), [])
+        self.assertEqual(wheel.advance(50), ["far"])
+
+    def test_random_deadlines(self):
+        rand = random.Random(11)
+        wheel = TimerWheel(tick=0.5, slots=8, levels=3, now=100.0)
+        expected = []
+        now = 100.0
+        for index in xrange(2000):
+            deadline = now + rand.uniform(0, 300)
+            wheel.schedule(index, deadline)
+            expected.append((deadline,index))
+            if index % 50 == 0:
+                now += rand.uniform(0, 20)
+                due = sorted(item for item in expected if item[0] <= int(now / 0.5) * 0.5)
+                expired = wheel.advance(now)
+                self.assertEqual(sorted(expired), sorted(index for deadline,index in due))
+                expected = [item for item in expected if item not in due]
+        self.assertEqual(len(wheel), len(expected))
+
+if __name__ == "__main__":
+    unittest.main()
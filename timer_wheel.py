@@ -0,0 +1,71 @@
+""" Hierarchical timer wheel for the aging of many timers with a coarse resolution.
+
+  Level 0 has one slot per tick, and every higher level has slots which are <slots> times longer than the slots of the
+  level below. A timer is put into the lowest level whose range covers it; when the wheel reaches the start of a higher
+  level slot, the timers of that slot are cascaded down into the lower levels. Scheduling is O(1), and advancing the wheel
+  touches only the due slots, so there is no periodic scan of every timer.
+
+  Timers are not cancelled: the owner checks the expired items and schedules them again if they were refreshed meanwhile.
+  """
+import math
+
+class TimerWheel(object):
+    def __init__(self, tick=1.0, slots=64, levels=4, now=0.0):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.current = int(now / tick)
+        self.wheels = [[[] for slot in xrange(slots)] for level in xrange(levels)]
+        self.count = 0
+
+    def schedule(self, item, deadline):
+        """ The item expires at the first tick at or after the deadline (at the next tick at the earliest) """
+        expiry = max(int(math.ceil(deadline / self.tick)), self.current + 1)
+        self._insert(item, expiry)
+        self.count += 1
+
+    def _insert(self, item, expiry):
+        delta = expiry - self.current
+        level = 0
+        span = self.slots
+        while delta >= span and level < self.levels - 1:
+            level += 1
+            span *= self.slots
+        slot = (expiry // (span // self.slots)) % self.slots
+        self.wheels[level][slot].append((expiry,item))
+
+    def advance(self, now):
+        """ Moves the wheel to the given time, and returns the expired items in the order of their expiry """
+        target = int(now / self.tick)
+        expired = []
+        while self.current < target:
+            self.current += 1
+            self._cascade()
+            slot = self.wheels[0][self.current % self.slots]
+            if len(slot) != 0:
+                self.wheels[0][self.current % self.slots] = []
+                expired.extend(item for expiry,item in slot)
+        self.count -= len(expired)
+        return expired
+
+    def _cascade(self):
+        """ Moves down the timers of the higher level slots which start at the current tick, the highest level first """
+        cascaded = []
+        span = 1
+        for level in xrange(1, self.levels):
+            span *= self.slots
+            if self.current % span != 0:
+                break
+            cascaded.append((level,span))
+
+        for level,span in reversed(cascaded):
+            index = (self.current // span) % self.slots
+            timers = self.wheels[level][index]
+            if len(timers) == 0:
+                continue
+            self.wheels[level][index] = []
+            for expiry,item in timers:
+                self._insert(item, max(expiry, self.current))
+
+    def __len__(self):
+        return self.count